@@ -0,0 +1,125 @@
+# Benchmarks for the One Piece scraper.
+# Usage: python bench.py [cardlist.html] [--cards 3000] [--workers 1 2 4]
+#        python bench.py --query-cards 100000
+# Without a file, a synthetic card list is generated.
+
+# Imports
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from time import perf_counter
+from cardparser import ParallelCardParser, available_backends, parse_cards, resolve_backend
+from cardquery import CardQuery, card_matches
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from benchmarks.fixtures import make_cardlist_html
+
+route_home: str = "https://en.onepiece-cardgame.com"
+
+# Methods
+def bench_parsers(contents_html: str, repeat: int = 3):
+    print(f"Parser backends ({len(contents_html) // 1024} KB HTML)")
+    expected = None
+    for backend in available_backends():
+        best: float = 0.0
+        for _ in range(repeat):
+            start = perf_counter()
+            cards = parse_cards(contents_html, route_home, backend)
+            elapsed = perf_counter() - start
+            best = elapsed if best == 0.0 else min(best, elapsed)
+        if expected is None:
+            expected = cards
+        status: str = "identical" if cards == expected else "MISMATCH"
+        print(f"{backend:>12} | {len(cards):>6} cards | {best:8.4f}s | {status}")
+
+def bench_parallel(contents_html: str, workers_list: list[int], backend: str = "auto", repeat: int = 3):
+    backend = resolve_backend(backend)
+    print(f"Parser workers ({backend}, {os.cpu_count()} CPUs)")
+    expected = parse_cards(contents_html, route_home, backend)
+    baseline: float = 0.0
+    for workers in workers_list:
+        card_parser = ParallelCardParser(backend, workers)
+        card_parser.parse(contents_html, route_home) # Start the pool outside of timing
+        best: float = 0.0
+        for _ in range(repeat):
+            start = perf_counter()
+            cards = card_parser.parse(contents_html, route_home)
+            elapsed = perf_counter() - start
+            best = elapsed if best == 0.0 else min(best, elapsed)
+        card_parser.close()
+        baseline = baseline or best
+        status: str = "identical" if cards == expected else "MISMATCH"
+        print(f"{workers:>12} | {len(cards):>6} cards | {best:8.4f}s | x{baseline / best:5.2f} | {status}")
+
+def bench_query(card_count: int, repeat: int = 5):
+    # Indexed queries against a full scan of the database file
+    queries: list[str] = [
+        'color:red type:character cost<=3 feature:"straw hat crew"',
+        "power>=9000 counter:2000",
+        "series:op02 draw opponent's",
+        "attribute:wisdom rarity:sec"
+    ]
+    folder = tempfile.mkdtemp(prefix = "bench_query_")
+    try:
+        cards = parse_cards(make_cardlist_html(card_count), route_home, resolve_backend("auto"))
+        file_database: str = os.path.join(folder, "cards.jsonl")
+        with open(file_database, 'w', encoding = 'utf8') as file:
+            for index, card in enumerate(cards):
+                file.write(json.dumps({ **card, "Id": card["Id"] or f"{card['Set']}_{index}" }, separators = (",", ":")) + "\n")
+        print(f"Card queries ({len(cards)} cards, {os.path.getsize(file_database) // 1024} KB database)")
+
+        start = perf_counter()
+        CardQuery(file_database).build()
+        print(f"{'build':>12} | {perf_counter() - start:8.4f}s")
+        # cold: ids from a new instance, loading the indexes it needs. ids/cards: warm, best of 'repeat'.
+        for query in queries:
+            start = perf_counter()
+            card_query = CardQuery(file_database)
+            conditions = card_query.parse_query(query)
+            card_query.find_ids(*conditions)
+            cold = perf_counter() - start
+            ids_time = best_time(lambda: card_query.find_ids(*conditions), repeat)
+            cards_time = best_time(lambda: card_query.find(*conditions), repeat)
+            matched = card_query.find(*conditions)
+            start = perf_counter()
+            scanned = scan_query(file_database, *conditions)
+            scan = perf_counter() - start
+            status: str = "identical" if matched == scanned else "MISMATCH"
+            print(f"{len(matched):>8} | cold {cold:7.4f}s | ids {ids_time:7.4f}s | cards {cards_time:7.4f}s | scan {scan:7.4f}s | {status} | {query}")
+    finally:
+        shutil.rmtree(folder, ignore_errors = True)
+
+def best_time(action, repeat: int) -> float:
+    best: float = 0.0
+    for _ in range(repeat):
+        start = perf_counter()
+        action()
+        elapsed = perf_counter() - start
+        best = elapsed if best == 0.0 else min(best, elapsed)
+    return best
+
+def scan_query(file_database: str, filters: dict[str, str], ranges: dict[str, tuple[int, int]], text: str) -> list[dict[str, str]]:
+    # Same query without indexes, parsing every card
+    with open(file_database, encoding = 'utf8') as file:
+        return [card for card in map(json.loads, file) if card_matches(card, filters, ranges, text)]
+
+# Main
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark card list parsing, or card queries.")
+    parser.add_argument("file", nargs = "?", help = "recorded card list html (default: synthetic card list)")
+    parser.add_argument("--cards", type = int, default = 3000, help = "cards in the synthetic card list (default: 3000)")
+    parser.add_argument("--workers", type = int, nargs = "+", default = [1, 2, 4], help = "parser worker counts to compare (default: 1 2 4)")
+    parser.add_argument("--query-cards", type = int, default = 0, help = "benchmark card queries over this many synthetic cards, instead of parsing")
+    args = parser.parse_args()
+    if args.query_cards > 0:
+        bench_query(args.query_cards)
+        sys.exit(0)
+    if args.file:
+        with open(args.file, 'r', encoding = 'utf8') as file:
+            contents_html = file.read()
+    else:
+        contents_html = make_cardlist_html(args.cards)
+    bench_parsers(contents_html)
+    bench_parallel(contents_html, args.workers)
@@ -0,0 +1,258 @@
+# Card list parsers for the One Piece EN site.
+# Each backend locates all card fields in a single traversal per 'dl.modalCol' card.
+# Backends: selectolax (lexbor) and lxml if installed, html.parser (BeautifulSoup) always.
+# Large card lists can be split into chunks of cards, and parsed in a process pool.
+
+# Imports
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from bs4 import BeautifulSoup, Tag
+
+# Field classes looked up in each card, first matching div wins (same as BeautifulSoup 'find')
+FIELD_CLASSES: tuple[str, ...] = ("infoCol", "frontCol", "cardName", "cost", "power", "color", "counter", "attribute", "feature", "text")
+
+def make_card(route_home: str, info: list[str], image_src: str, name: str, cost: str, power: str, color: str,
+              counter: str, attribute: str, feature: str, text: str, card_id: str = "") -> dict[str, str]:
+    # 'Id' is the site's ID of the print ('dl.modalCol' id, e.g. 'OP01-120_p1'), empty if the page has none
+    #-- Card Set, Rarity, and Type
+    card_set: str = ""
+    card_rarity: str = ""
+    card_type: str = ""
+    if len(info) == 3:
+        card_set, card_rarity, card_type = info
+
+    #-- Card Image
+    card_image: str = route_home + "/" + str(image_src).strip().lstrip('.').lstrip('\\').lstrip('/')
+
+    return {
+        "Id": str(card_id or "").strip(),
+        "Name": name.strip(),
+        "Set": card_set,
+        "Rarity": card_rarity,
+        "Type": card_type,
+        "Image": card_image,
+        "Cost": cost.strip(),
+        "Power": power.strip(),
+        "Color": color.strip(),
+        "Counter": counter.strip(),
+        "Attribute": attribute.strip(),
+        "Feature": feature.strip(),
+        "Text": text.strip()
+    }
+
+# html.parser
+def bs4_last_text(el: Tag) -> str:
+    # Text after the heading, e.g. '<div class="cost"><h3>Cost</h3>5</div>' => '5'
+    last = el.contents[-1] if el.contents else ""
+    return last.text if isinstance(last, Tag) else str(last)
+
+def parse_cards_bs4(contents_html: str, route_home: str, features: str = "html.parser") -> list[dict[str, str]]:
+    cards: list[dict[str, str]] = []
+    soup = BeautifulSoup(contents_html, features)
+    soup_main = soup.find("div", class_="resultCol")
+    if soup_main is None:
+        return cards
+
+    for soup_card_div in soup_main.find_all("dl", class_="modalCol"):
+        fields: dict[str, Tag] = {}
+        for el in soup_card_div.find_all("div"):
+            for name in el.get("class", []):
+                if name in FIELD_CLASSES and name not in fields:
+                    fields[name] = el
+
+        cards.append(make_card(
+            route_home,
+            [x.text for x in fields["infoCol"].find_all("span")],
+            fields["frontCol"].find("img")["src"],
+            fields["cardName"].text,
+            bs4_last_text(fields["cost"]),
+            bs4_last_text(fields["power"]),
+            bs4_last_text(fields["color"]),
+            bs4_last_text(fields["counter"]),
+            fields["attribute"].find("i").text,
+            bs4_last_text(fields["feature"]),
+            fields["text"].text,
+            soup_card_div.get("id", "")
+        ))
+
+    return cards
+
+# lxml
+def lxml_last_text(el) -> str:
+    if len(el) == 0:
+        return el.text or ""
+    if el[-1].tail is None:
+        return el[-1].text_content()
+    return el[-1].tail
+
+def lxml_has_class(el, name: str) -> bool:
+    return name in str(el.get("class", "")).split()
+
+def parse_cards_lxml(contents_html: str, route_home: str) -> list[dict[str, str]]:
+    import lxml.html
+
+    cards: list[dict[str, str]] = []
+    root = lxml.html.fromstring(contents_html)
+    soup_main = next((x for x in root.iter("div") if lxml_has_class(x, "resultCol")), None)
+    if soup_main is None:
+        return cards
+
+    for card_div in soup_main.iter("dl"):
+        if not lxml_has_class(card_div, "modalCol"):
+            continue
+        fields: dict[str, any] = {}
+        for el in card_div.iter("div"):
+            for name in str(el.get("class", "")).split():
+                if name in FIELD_CLASSES and name not in fields:
+                    fields[name] = el
+
+        cards.append(make_card(
+            route_home,
+            [x.text_content() for x in fields["infoCol"].iter("span")],
+            next(fields["frontCol"].iter("img")).get("src"),
+            fields["cardName"].text_content(),
+            lxml_last_text(fields["cost"]),
+            lxml_last_text(fields["power"]),
+            lxml_last_text(fields["color"]),
+            lxml_last_text(fields["counter"]),
+            next(fields["attribute"].iter("i")).text_content(),
+            lxml_last_text(fields["feature"]),
+            fields["text"].text_content(),
+            card_div.get("id", "")
+        ))
+
+    return cards
+
+# selectolax
+def lexbor_last_text(el) -> str:
+    last = el.last_child
+    if last is None:
+        return ""
+    return last.text(deep = last.tag != "-text")
+
+def parse_cards_selectolax(contents_html: str, route_home: str) -> list[dict[str, str]]:
+    from selectolax.lexbor import LexborHTMLParser
+
+    cards: list[dict[str, str]] = []
+    tree = LexborHTMLParser(contents_html)
+    soup_main = tree.css_first("div.resultCol")
+    if soup_main is None:
+        return cards
+
+    for card_div in soup_main.css("dl.modalCol"):
+        fields: dict[str, any] = {}
+        for el in card_div.traverse():
+            if el.tag != "div":
+                continue
+            for name in str(el.attributes.get("class") or "").split():
+                if name in FIELD_CLASSES and name not in fields:
+                    fields[name] = el
+
+        cards.append(make_card(
+            route_home,
+            [x.text() for x in fields["infoCol"].css("span")],
+            fields["frontCol"].css_first("img").attributes.get("src"),
+            fields["cardName"].text(),
+            lexbor_last_text(fields["cost"]),
+            lexbor_last_text(fields["power"]),
+            lexbor_last_text(fields["color"]),
+            lexbor_last_text(fields["counter"]),
+            fields["attribute"].css_first("i").text(),
+            lexbor_last_text(fields["feature"]),
+            fields["text"].text(),
+            card_div.attributes.get("id")
+        ))
+
+    return cards
+
+# Fastest first
+BACKENDS: dict[str, any] = {
+    "selectolax": parse_cards_selectolax,
+    "lxml": parse_cards_lxml,
+    "html.parser": parse_cards_bs4
+}
+
+def is_backend_available(backend: str) -> bool:
+    try:
+        if backend == "selectolax":
+            import selectolax.lexbor
+        elif backend == "lxml":
+            import lxml.html
+        return backend in BACKENDS
+    except ImportError:
+        return False
+
+def available_backends() -> list[str]:
+    return [x for x in BACKENDS if is_backend_available(x)]
+
+def resolve_backend(backend: str = "auto") -> str:
+    # 'auto' picks the fastest installed backend. Unavailable backends fall back to html.parser.
+    if backend == "auto":
+        return available_backends()[0]
+    return backend if is_backend_available(backend) else "html.parser"
+
+def parse_cards(contents_html: str, route_home: str, backend: str = "auto") -> list[dict[str, str]]:
+    return BACKENDS[resolve_backend(backend)](contents_html, route_home)
+
+# Process pool
+RE_RESULT_COL = re.compile(r"""<div\b[^>]*\bclass\s*=\s*["'][^"']*\bresultCol\b""", re.IGNORECASE)
+RE_DL_TAG = re.compile(r"<(/?)dl\b[^>]*>", re.IGNORECASE)
+RE_MODAL_COL = re.compile(r"""\bclass\s*=\s*["'][^"']*\bmodalCol\b""", re.IGNORECASE)
+
+def split_card_blocks(contents_html: str) -> list[str]:
+    # HTML of each 'dl.modalCol' card in the result column, in page order
+    blocks: list[str] = []
+    result_col = RE_RESULT_COL.search(contents_html)
+    if result_col is None:
+        return blocks
+    depth: int = 0
+    block_start: int = -1
+    for tag in RE_DL_TAG.finditer(contents_html, result_col.end()):
+        if tag.group(1):
+            depth = max(0, depth - 1)
+            if depth == 0 and block_start >= 0:
+                blocks.append(contents_html[block_start:tag.end()])
+                block_start = -1
+        else:
+            if depth == 0 and RE_MODAL_COL.search(tag.group(0)):
+                block_start = tag.start()
+            depth += 1
+    return blocks
+
+def parse_card_chunk(args: tuple[list[str], str, str]) -> list[dict[str, str]]:
+    # Runs in a worker process
+    blocks, route_home, backend = args
+    return parse_cards('<div class="resultCol">' + "".join(blocks) + "</div>", route_home, backend)
+
+class ParallelCardParser:
+    """Parse card lists in a process pool, by chunks of cards. Cards keep page order.
+    Small card lists, or a single worker, are parsed in this process."""
+
+    def __init__(self, backend: str = "auto", workers: int = 1, min_chunk_cards: int = 250):
+        self.backend = resolve_backend(backend)
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1) # 0 for one per CPU
+        self.min_chunk_cards = max(1, min_chunk_cards)
+        self.pool: ProcessPoolExecutor = None
+
+    def parse(self, contents_html: str, route_home: str) -> list[dict[str, str]]:
+        if self.workers <= 1:
+            return parse_cards(contents_html, route_home, self.backend)
+        blocks = split_card_blocks(contents_html)
+        if len(blocks) < self.min_chunk_cards * 2:
+            return parse_cards(contents_html, route_home, self.backend)
+
+        # Two chunks per worker evens out uneven chunks
+        chunk_size: int = max(self.min_chunk_cards, -(-len(blocks) // (self.workers * 2)))
+        chunks = [(blocks[i:i + chunk_size], route_home, self.backend) for i in range(0, len(blocks), chunk_size)]
+        if self.pool is None:
+            self.pool = ProcessPoolExecutor(max_workers = self.workers)
+        cards: list[dict[str, str]] = []
+        for chunk_cards in self.pool.map(parse_card_chunk, chunks):
+            cards.extend(chunk_cards)
+        return cards
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
@@ -0,0 +1,325 @@
+# Indexed queries over the scraped card database.
+# Secondary indexes on card fields, and an inverted index of 'Text' words, are built once from the
+# database file and kept in an index folder next to it. Each index file is only loaded by the first query that needs it.
+# Usage: python cardquery.py 'color:red type:character cost<=3 feature:"straw hat crew" draw' [--database database/cards.jsonl]
+
+# Imports
+import argparse
+import json
+import os
+import re
+import shlex
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.hashing import hash_file
+
+# Bump when the index layout changes
+INDEX_VERSION: int = 2
+# Fields matched by value, case-insensitive. Values are split on the separator, if any ('Red/Green').
+KEYWORD_FIELDS: dict[str, str] = { "Color": "/", "Type": "", "Rarity": "", "Attribute": "/", "Feature": "/", "Series": "" }
+# Fields compared as numbers. Cards without a number ('-') never match a range.
+NUMERIC_FIELDS: tuple[str, ...] = ("Cost", "Power", "Counter")
+TEXT_FIELD: str = "Text"
+RE_WORD = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+RE_CONDITION = re.compile(r"^(\w+)(<=|>=|<|>|=|:)(.*)$")
+
+def tokenize(text: str) -> list[str]:
+    return RE_WORD.findall(text.lower())
+
+def card_series(card: dict[str, str]) -> str:
+    # 'OP01-001' => 'OP01'
+    return card.get("Set", "").split("-", 1)[0]
+
+def keyword_values(card: dict[str, str], field: str) -> list[str]:
+    value: str = card_series(card) if field == "Series" else card.get(field, "")
+    separator: str = KEYWORD_FIELDS[field]
+    parts = value.split(separator) if separator else [value]
+    return [x.strip().lower() for x in parts if x.strip()]
+
+def parse_number(value: str) -> int:
+    # None if not a number
+    try:
+        return int(value.strip())
+    except (AttributeError, ValueError):
+        return None
+
+def card_matches(card: dict[str, str], filters: dict[str, str] = None, ranges: dict[str, tuple[int, int]] = None, text: str = "") -> bool:
+    # Same conditions as CardQuery.match_rows, tested on one card without indexes. Field names as in the card.
+    for field, value in (filters or {}).items():
+        if field in NUMERIC_FIELDS:
+            if parse_number(card.get(field)) != int(value):
+                return False
+        elif field == TEXT_FIELD:
+            text = f"{text} {value}"
+        elif value.strip().lower() not in keyword_values(card, field):
+            return False
+    for field, (low, high) in (ranges or {}).items():
+        number = parse_number(card.get(field))
+        if number is None or (low is not None and number < low) or (high is not None and number > high):
+            return False
+    card_words = set(tokenize(card.get(TEXT_FIELD, "")))
+    return all(x in card_words for x in tokenize(text))
+
+class CardQuery:
+    """Filter and search cards of a database file ('.jsonl' or '.json', as written by CardWriter).
+    Indexes are kept in 'index_folder', and rebuilt when the database changes."""
+
+    def __init__(self, file_database: str, index_folder: str = ""):
+        self.file_database = file_database
+        self.index_folder = index_folder or os.path.join(os.path.dirname(file_database) or ".", "index")
+        self.meta: dict[str, any] = None
+        self.keyword_indexes: dict[str, dict[str, list[int]]] = {} # Field => value => rows
+        self.numeric_indexes: dict[str, tuple[array, array]] = {} # Field => sorted values, rows in the same order
+        self.text_index: dict[str, list[int]] = None # Word => rows
+        self.ids: list[str] = None # Row => Card Id
+        self.offsets: array = None # Row => byte offset of its line, for '.jsonl' databases
+        self.cards: list[dict[str, str]] = None # Every card, for '.json' databases
+
+    def index_file(self, name: str) -> str:
+        return os.path.join(self.index_folder, f"{name}.json")
+
+    def read_index(self, name: str) -> any:
+        with open(self.index_file(name), encoding = 'utf8') as file:
+            return json.load(file)
+
+    def write_index(self, name: str, contents: any):
+        with open(self.index_file(name) + ".tmp", 'w', encoding = 'utf8') as file:
+            json.dump(contents, file, separators = (",", ":"))
+        os.replace(self.index_file(name) + ".tmp", self.index_file(name))
+
+    def read_cards(self) -> tuple[list[dict[str, str]], list[int]]:
+        # Cards of the database in file order, with line offsets for '.jsonl'
+        cards: list[dict[str, str]] = []
+        offsets: list[int] = []
+        with open(self.file_database, 'rb') as file:
+            if self.file_database.endswith(".jsonl"):
+                offset: int = 0
+                for line in file:
+                    if line.strip():
+                        cards.append(json.loads(line))
+                        offsets.append(offset)
+                    offset += len(line)
+            else:
+                cards = json.load(file)
+        return cards, offsets
+
+    def database_stat(self) -> list[int]:
+        stat = os.stat(self.file_database)
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def is_stamp_current(self, database_stat: list[int], database_hash: str) -> bool:
+        # The local stamp records the database stat the index was last checked at. It is not committed (gitignored),
+        # as mtime differs per checkout, and only spares hashing the database while the stat stays the same.
+        try:
+            return self.read_index("stamp") == { "stat": database_stat, "hash": database_hash }
+        except (OSError, ValueError):
+            return False
+
+    def write_stamp(self, database_stat: list[int], database_hash: str):
+        try:
+            self.write_index("stamp", { "stat": database_stat, "hash": database_hash })
+        except OSError:
+            pass
+
+    def build(self) -> dict[str, any]:
+        # Build and save every index. Returns the index meta.
+        database_stat = self.database_stat()
+        database_size = database_stat[0]
+        database_hash = hash_file(self.file_database)
+        cards, offsets = self.read_cards()
+        keyword_indexes: dict[str, dict[str, list[int]]] = { x: {} for x in KEYWORD_FIELDS }
+        numeric_rows: dict[str, list[tuple[int, int]]] = { x: [] for x in NUMERIC_FIELDS }
+        text_index: dict[str, list[int]] = {}
+        for row, card in enumerate(cards):
+            for field, index in keyword_indexes.items():
+                for value in dict.fromkeys(keyword_values(card, field)):
+                    index.setdefault(value, []).append(row)
+            for field, values in numeric_rows.items():
+                number = parse_number(card.get(field))
+                if number is not None:
+                    values.append((number, row))
+            for word in dict.fromkeys(tokenize(card.get(TEXT_FIELD, ""))):
+                text_index.setdefault(word, []).append(row)
+
+        os.makedirs(self.index_folder, exist_ok = True)
+        for field, index in keyword_indexes.items():
+            self.write_index(f"keyword_{field}", index)
+        for field, values in numeric_rows.items():
+            values.sort()
+            self.write_index(f"numeric_{field}", [[x[0] for x in values], [x[1] for x in values]])
+        self.write_index("text", text_index)
+        self.write_index("rows", { "ids": [x.get("Id", "") for x in cards], "offsets": offsets })
+        # Meta last, an interrupted build is rebuilt on next open.
+        # No mtime in it: the index is committed with the database, and must stay the same while the database does.
+        meta: dict[str, any] = { "version": INDEX_VERSION, "size": database_size, "hash": database_hash, "count": len(cards) }
+        self.write_index("meta", meta)
+        self.write_stamp(database_stat, database_hash)
+        self.reset(meta)
+        return meta
+
+    def reset(self, meta: dict[str, any]):
+        self.meta = meta
+        self.keyword_indexes = {}
+        self.numeric_indexes = {}
+        self.text_index = None
+        self.ids = None
+        self.offsets = None
+        self.cards = None
+
+    def open(self) -> "CardQuery":
+        # Check the index against the database, rebuilding it if stale. Index files are loaded later, on use.
+        if self.meta is not None:
+            return self
+        try:
+            meta = self.read_index("meta")
+            if meta.get("version") == INDEX_VERSION:
+                # The content hash in the meta decides. The database is only hashed if its stat differs from the local stamp.
+                database_stat = self.database_stat()
+                if self.is_stamp_current(database_stat, meta["hash"]):
+                    self.reset(meta)
+                    return self
+                if meta["size"] == database_stat[0] and meta["hash"] == hash_file(self.file_database):
+                    self.write_stamp(database_stat, meta["hash"])
+                    self.reset(meta)
+                    return self
+        except (OSError, ValueError, KeyError):
+            pass
+        self.build()
+        return self
+
+    def keyword_index(self, field: str) -> dict[str, list[int]]:
+        if field not in self.keyword_indexes:
+            self.keyword_indexes[field] = self.read_index(f"keyword_{field}")
+        return self.keyword_indexes[field]
+
+    def numeric_index(self, field: str) -> tuple[array, array]:
+        if field not in self.numeric_indexes:
+            values, rows = self.read_index(f"numeric_{field}")
+            self.numeric_indexes[field] = (array('q', values), array('I', rows))
+        return self.numeric_indexes[field]
+
+    def words(self) -> dict[str, list[int]]:
+        if self.text_index is None:
+            self.text_index = self.read_index("text")
+        return self.text_index
+
+    def field_name(self, name: str) -> str:
+        # Case-insensitive field name => field, e.g. 'color' => 'Color'
+        for field in (*KEYWORD_FIELDS, *NUMERIC_FIELDS, TEXT_FIELD):
+            if field.lower() == name.lower():
+                return field
+        raise ValueError(f"Unknown card field => {name}")
+
+    def match_rows(self, filters: dict[str, str] = None, ranges: dict[str, tuple[int, int]] = None, text: str = "") -> list[int]:
+        # Rows matching every condition, in database order.
+        # filters: field => value. ranges: field => (min, max), either can be None. text: words that must all appear in 'Text'.
+        self.open()
+        candidates: list[set[int]] = []
+        for name, value in (filters or {}).items():
+            field = self.field_name(name)
+            if field in NUMERIC_FIELDS:
+                ranges = { **(ranges or {}), field: (int(value), int(value)) }
+                continue
+            if field == TEXT_FIELD:
+                text = f"{text} {value}"
+                continue
+            candidates.append(set(self.keyword_index(field).get(value.strip().lower(), [])))
+        for name, (low, high) in (ranges or {}).items():
+            values, rows = self.numeric_index(self.field_name(name))
+            start = 0 if low is None else bisect_left(values, low)
+            end = len(values) if high is None else bisect_right(values, high)
+            candidates.append(set(rows[start:end]))
+        words = self.words() if text.strip() else {}
+        for word in dict.fromkeys(tokenize(text)):
+            candidates.append(set(words.get(word, [])))
+        if not candidates:
+            return list(range(self.meta["count"]))
+        # Intersect from the smallest set
+        candidates.sort(key = len)
+        matched = candidates[0]
+        for rows in candidates[1:]:
+            if not matched:
+                break
+            matched = matched.intersection(rows)
+        return sorted(matched)
+
+    def load_rows(self):
+        if self.ids is None:
+            contents = self.read_index("rows")
+            self.ids = contents["ids"]
+            self.offsets = array('Q', contents["offsets"])
+
+    def cards_at(self, rows: list[int]) -> list[dict[str, str]]:
+        # '.jsonl' cards are read by line offset, '.json' databases are loaded whole once
+        if not self.file_database.endswith(".jsonl"):
+            if self.cards is None:
+                self.cards = self.read_cards()[0]
+            return [self.cards[x] for x in rows]
+        self.load_rows()
+        cards: list[dict[str, str]] = []
+        with open(self.file_database, 'rb') as file:
+            for row in rows:
+                file.seek(self.offsets[row])
+                cards.append(json.loads(file.readline()))
+        return cards
+
+    def find_ids(self, filters: dict[str, str] = None, ranges: dict[str, tuple[int, int]] = None, text: str = "") -> list[str]:
+        # Card Ids of matching cards, without reading the cards
+        rows = self.match_rows(filters, ranges, text)
+        self.load_rows()
+        return [self.ids[x] for x in rows]
+
+    def find(self, filters: dict[str, str] = None, ranges: dict[str, tuple[int, int]] = None, text: str = "", limit: int = 0) -> list[dict[str, str]]:
+        # Matching cards, in database order. 'limit' 0 for all.
+        rows = self.match_rows(filters, ranges, text)
+        return self.cards_at(rows[:limit] if limit > 0 else rows)
+
+    def parse_query(self, expression: str) -> tuple[dict[str, str], dict[str, tuple[int, int]], str]:
+        # 'color:red type:character cost<=3 feature:"straw hat crew" draw'
+        # field:value or field=value to match, <, <=, >, >= on numeric fields, other words are searched in 'Text'.
+        # Returns filters, ranges and text for 'find'.
+        filters: dict[str, str] = {}
+        ranges: dict[str, tuple[int, int]] = {}
+        words: list[str] = []
+        lexer = shlex.shlex(expression, posix = True)
+        lexer.quotes = '"' # Words like "opponent's" stay whole
+        lexer.whitespace_split = True
+        for term in lexer:
+            condition = RE_CONDITION.match(term)
+            if condition is None:
+                words.append(term)
+                continue
+            name, operator, value = condition.groups()
+            field = self.field_name(name)
+            if operator in (":", "="):
+                filters[field] = value
+                continue
+            if field not in NUMERIC_FIELDS:
+                raise ValueError(f"Not a numeric field => {name}")
+            number = int(value)
+            low, high = ranges.get(field, (None, None))
+            if operator in ("<", "<="):
+                high = number - 1 if operator == "<" else number
+            else:
+                low = number + 1 if operator == ">" else number
+            ranges[field] = (low, high)
+        return filters, ranges, " ".join(words)
+
+    def query(self, expression: str, limit: int = 0) -> list[dict[str, str]]:
+        return self.find(*self.parse_query(expression), limit = limit)
+
+# Main
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Query the scraped card database.")
+    parser.add_argument("query", nargs = "?", default = "", help = "e.g. 'color:red type:character cost<=3 feature:\"straw hat crew\" draw'")
+    parser.add_argument("--database", default = os.path.join("database", "cards.jsonl"), help = "card database file (default: database/cards.jsonl)")
+    parser.add_argument("--limit", type = int, default = 0, help = "max cards to print, 0 for all")
+    parser.add_argument("--rebuild", action = "store_true", help = "rebuild the indexes first")
+    args = parser.parse_args()
+    card_query = CardQuery(args.database)
+    if args.rebuild:
+        card_query.build()
+    for card in card_query.query(args.query, args.limit):
+        print(json.dumps(card, ensure_ascii = False))
@@ -0,0 +1,105 @@
+# Per-series crawler for the One Piece card list.
+# Fetches series concurrently over a pooled client, with retries and a politeness delay.
+
+# Imports
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import monotonic, sleep
+from bs4 import BeautifulSoup
+from common.httpclient import HttpClient
+
+class CardlistResponse:
+    """Result of fetching the card list of one series."""
+
+    def __init__(self, series_id: str, status_code: int = 0, text: str = "", etag: str = "", last_modified: str = "", error: Exception = None):
+        self.series_id = series_id
+        self.status_code = status_code
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300
+
+    @property
+    def not_modified(self) -> bool:
+        return self.status_code == 304
+
+class CardlistCrawler:
+    """Discover series from the card list page, and fetch each series' card list.
+    Requests go through `client`, or a pooled client of its own."""
+
+    def __init__(self, route_cardlist: str, max_workers: int = 4, delay: float = 0.5,
+                 retries: int = 3, backoff: float = 1.0, timeout: float = 60.0, client: HttpClient = None):
+        self.route_cardlist = route_cardlist
+        self.max_workers = max(1, int(max_workers))
+        self.delay = delay
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.timeout = timeout
+        self.client = HttpClient(pool_maxsize = self.max_workers) if client is None else client
+        self.lock = threading.Lock()
+        self.next_request_at = 0.0
+
+    def wait_turn(self):
+        # Space out requests across all workers by 'delay' seconds
+        with self.lock:
+            now = monotonic()
+            wait = self.next_request_at - now
+            self.next_request_at = max(now, self.next_request_at) + self.delay
+        if wait > 0:
+            sleep(wait)
+
+    def discover_series(self) -> list[str]:
+        # Series IDs from the series dropdown of the card list page
+        self.wait_turn()
+        req_object = self.client.get(self.route_cardlist, timeout = self.timeout)
+        req_object.raise_for_status()
+        soup = BeautifulSoup(req_object.text, "html.parser")
+        soup_select = soup.find("select", attrs = { "name": "series" })
+        if soup_select is None:
+            return []
+        series_ids: list[str] = []
+        for soup_option in soup_select.find_all("option"):
+            series_id = str(soup_option.get("value", "")).strip()
+            if series_id and series_id not in series_ids:
+                series_ids.append(series_id)
+        return series_ids
+
+    def fetch(self, series_id: str, series_state: dict[str, any] = None) -> CardlistResponse:
+        # POST request to fetch card list, with conditional headers from previous run
+        series_state = series_state or {}
+        req_body = {
+            "series": str(series_id),
+            "freewords": ""
+        }
+        req_headers: dict[str, str] = {}
+        if series_state.get("etag"):
+            req_headers["If-None-Match"] = series_state["etag"]
+        if series_state.get("last_modified"):
+            req_headers["If-Modified-Since"] = series_state["last_modified"]
+
+        # Retries are spaced out by the politeness delay too
+        try:
+            req_object = self.client.request_with_retries("POST", self.route_cardlist, retries = self.retries, backoff = self.backoff, wait = self.wait_turn,
+                                                          metric = "cardlist_request", json = req_body, headers = req_headers, timeout = self.timeout)
+        except requests.RequestException as e:
+            return CardlistResponse(series_id, error = e)
+        return CardlistResponse(
+            series_id,
+            req_object.status_code,
+            req_object.text,
+            req_object.headers.get("ETag", ""),
+            req_object.headers.get("Last-Modified", "")
+        )
+
+    def crawl(self, series_ids: list[str], scrape_state: dict[str, any] = None):
+        # Yield responses as they arrive
+        scrape_state = scrape_state or {}
+        with ThreadPoolExecutor(max_workers = min(self.max_workers, max(1, len(series_ids)))) as pool:
+            futures = [pool.submit(self.fetch, series_id, scrape_state.get(series_id)) for series_id in series_ids]
+            for future in as_completed(futures):
+                yield future.result()
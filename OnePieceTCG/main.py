@@ -2,39 +2,28 @@
 # https://en.onepiece-cardgame.com/cardlist/
 
 # Imports
-import requests
 #import csv
+import argparse
 import json
 import os
+import sys
+import hashlib
 from pathlib import Path
-#from time import sleep
-from datetime import datetime
-from bs4 import BeautifulSoup
+from time import perf_counter
+from itertools import chain
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from common.applog import INFO, clear_logs, setup_logger, log, log_err
+from common.cardpack import write_cardpack
+from common.httpclient import HttpClient, ResponseCache
+from common.imagemirror import ImageMirror
+from common.metrics import metrics
+from crawler import CardlistCrawler, CardlistResponse
+from cardparser import ParallelCardParser, resolve_backend
+from cardquery import CardQuery
+from writer import CardWriter
 
 
 # Methods
-def write_to_log(content: str) -> bool:
-    try:
-        Path("logs").mkdir(parents=True, exist_ok=True)
-        currentdate: str = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
-        filename: str = f"applog.log"
-        filepath: str = os.path.join("logs", filename)
-        with open(filepath, 'a') as f:
-            f.write(f"[{currentdate}] {content}\n")
-        return True
-    except Exception as e:
-        #log_err("Error", e)
-        return False
-
-def log(content: str):
-    print(f"{content}")
-    write_to_log(content)
-
-def log_err(content: str, err: Exception):
-    to_write: str = f"{content} => {err}"
-    print(to_write)
-    write_to_log(to_write)
-
 def write_file(filename: str, content: str) -> bool:
     try:
         with open(filename, 'w', encoding = 'utf8') as f:
@@ -75,127 +64,185 @@ def read_json(filename: str) -> any:
         log_err("Error", e)
         return None
 
-def main():
+def hash_content(content: str) -> str:
+    return hashlib.sha256(content.encode('utf8')).hexdigest()
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description = "Scrape card info from the One Piece EN card list.")
+    parser.add_argument("--parser-workers", type = int, default = int(os.environ.get("ONEPIECE_PARSER_WORKERS", "1")),
+                        help = "processes parsing large card lists, 0 for one per CPU (default: 1, no process pool)")
+    parser.add_argument("--mirror-images", action = "store_true", help = "download every card image into the 'images' folder")
+    parser.add_argument("--thumbnails", type = int, default = 0, metavar = "SIZE", help = "also make thumbnails of mirrored images, SIZE pixels on the longest side (needs Pillow)")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] = None):
+    args = parse_args(argv)
     try:
-        route_home: str = "https://en.onepiece-cardgame.com"
+        route_home: str = os.environ.get("ONEPIECE_HOME", "https://en.onepiece-cardgame.com") # Override to use a local stand-in server
         route_cardlist: str = f"{route_home}/cardlist/"
 
-        cardlist_id: str = ""#569001
-        file_cardlist_html: str = f"list_{cardlist_id}.html"
-        file_output_card: str = ""
+        cardlist_ids: list[str] = [] # Series to fetch, e.g. ["569001"]. Empty to discover all series from the card list page.
         contents_html: str = None
 
-        is_use_cache: bool = False
+        is_use_cache: bool = False # Read 'list_<series>.html' instead of requesting, if available
+        is_incremental: bool = True # Skip parsing and writing if card list is unchanged since last run
+        file_scrape_state: str = "scrape_state.json" # ETag, Last-Modified and content hash per series
+        scrape_state: dict[str, any] = {}
+        series_state: dict[str, any] = {}
+        is_output_compact: bool = False # Write card files without indentation
+        file_metrics: str = os.environ.get("METRICS_FILE", "metrics.jsonl") # Run metrics, one line appended per run. Empty to skip.
+        file_database: str = os.path.join("database", "cards.jsonl") # All cards in one file ('.json' or '.jsonl'). Empty to skip.
+        is_build_query_index: bool = True # Rebuild the query indexes ('database/index') when the database changes
+        file_database_pack: str = os.path.join("database", "cards.cardpack") # Memory-mapped copy of the database, read with common.cardpack. Empty to skip.
+        count_failed: int = 0
+
+        crawler_max_workers: int = 4 # concurrent series requests
+        crawler_delay: float = float(os.environ.get("ONEPIECE_CRAWLER_DELAY", "0.5")) # seconds between requests
+        crawler_retries: int = 3 # retries on 429/5xx responses
+        file_http_cache: str = "http_cache.db" # Responses kept between runs, per Cache-Control/ETag. Empty to skip.
+        http_cache_max_mb: float = 32.0 # Least recently used responses are evicted past this size
+        is_mirror_images: bool = args.mirror_images # Download card images, content-addressed, into folder_images
+        folder_images: str = "images"
+        image_max_workers: int = 8 # concurrent image downloads
+        image_thumbnail_size: int = args.thumbnails # Longest thumbnail side in pixels. 0 for no thumbnails.
+        log_level: int = INFO
+        parser_backend: str = resolve_backend("auto") # 'auto', 'selectolax', 'lxml' or 'html.parser'
+        parser_workers: int = args.parser_workers # Parse card lists in chunks, in a process pool. 1 to parse in this process.
 
         #-- Create Folders
         Path("output").mkdir(parents=True, exist_ok=True)
+        if file_database:
+            Path(os.path.dirname(file_database) or ".").mkdir(parents=True, exist_ok=True)
 
-        #-- Clear log files
-        log("Starting deletion of log files..")
-        log_path: str = "logs"
-        log_path_files = os.listdir(log_path)
-        for item in log_path_files:
-            if item.endswith(".log"):
-                logfile: str = os.path.join(log_path, item)
-                if os.path.isfile(logfile):
-                    os.remove(logfile)
-
+        #-- Clear log files, and start logging
+        clear_logs("logs")
+        setup_logger(os.path.join("logs", "applog.log"), level = log_level)
         log("Done deleting old log files.")
+        log(f"Parser backend => {parser_backend}")
+        card_parser = ParallelCardParser(parser_backend, parser_workers)
+        if card_parser.workers > 1:
+            log(f"Parser workers => {card_parser.workers}")
+
+        #-- Load state from previous run
+        if is_incremental and os.path.exists(file_scrape_state):
+            scrape_state = read_json(file_scrape_state) or {}
+
+        card_writer = CardWriter("output", compact = is_output_compact)
+        http_client = HttpClient(pool_maxsize = max(crawler_max_workers, image_max_workers),
+                                 cache = ResponseCache(file_http_cache, int(http_cache_max_mb * 1024 * 1024)) if file_http_cache else None)
+        crawler = CardlistCrawler(route_cardlist, max_workers = crawler_max_workers, delay = crawler_delay, retries = crawler_retries, client = http_client)
+
+        #-- Discover series
+        if not cardlist_ids:
+            try:
+                log("Discovering series..")
+                with metrics.stage("discover"):
+                    cardlist_ids = crawler.discover_series()
+                log(f"Found {len(cardlist_ids)} series.")
+            except Exception as e:
+                log_err("Issue found on discovering series", e)
+            if not cardlist_ids:
+                # Fetch whole card list in one request
+                cardlist_ids = [""]
 
         #-- Load from cache if available
-        if os.path.exists(file_cardlist_html) and is_use_cache:
-            log(f"Reading cached file : {file_cardlist_html}")
-            contents_html = read_file(file_cardlist_html).strip()
-        else:
-            log("Requesting card list..")
-            # POST request to fetch card list
-            req_body = {
-                "series": str(cardlist_id),
-                "freewords": ""
+        responses: list[CardlistResponse] = []
+        series_to_crawl: list[str] = []
+        for cardlist_id in cardlist_ids:
+            file_cardlist_html: str = f"list_{cardlist_id}.html"
+            if os.path.exists(file_cardlist_html) and is_use_cache:
+                log(f"Reading cached file : {file_cardlist_html}")
+                responses.append(CardlistResponse(cardlist_id, 200, read_file(file_cardlist_html)))
+            else:
+                series_to_crawl.append(cardlist_id)
+
+        #-- Request card lists, and parse each as it arrives
+        log(f"Requesting card list for {len(series_to_crawl)} series..")
+        # Responses arrive in completion order; cards are added in series order after the loop, so output does not depend on timing
+        parsed_cards: dict[str, list[dict[str, str]]] = {}
+        for response in chain(responses, crawler.crawl(series_to_crawl, scrape_state if is_incremental else None)):
+            cardlist_id = response.series_id
+            series_state = scrape_state.get(cardlist_id, {})
+            metrics.count(f"series.status_{response.status_code}")
+            if response.not_modified:
+                metrics.cache("series", True)
+                log(f"[{cardlist_id}] Card list not modified since last run. Skipped parsing.")
+                continue
+            if not response.ok:
+                count_failed += 1
+                if response.error is not None:
+                    log_err(f"[{cardlist_id}] Failed to fetch card list", response.error)
+                else:
+                    log(f"[{cardlist_id}] Failed to fetch card list. Status code: {response.status_code}")
+                continue
+
+            contents_html = response.text.strip()
+            contents_hash: str = hash_content(contents_html)
+            metrics.cache("series", is_incremental and contents_hash == series_state.get("hash"))
+            if is_incremental and contents_hash == series_state.get("hash"):
+                log(f"[{cardlist_id}] Card list content unchanged since last run. Skipped parsing.")
+                continue
+
+            log(f"[{cardlist_id}] Parsing card list..")
+            parse_started = perf_counter()
+            cards = card_parser.parse(contents_html, route_home)
+            metrics.add_time("html_parse", perf_counter() - parse_started, len(cards))
+            parsed_cards[cardlist_id] = cards
+            log(f"[{cardlist_id}] Parsed {len(cards)} cards.")
+
+            scrape_state[cardlist_id] = {
+                "etag": response.etag,
+                "last_modified": response.last_modified,
+                "hash": contents_hash
             }
-            req_object = requests.post(
-                url = route_cardlist,
-                json = req_body
-            )
-
-            if req_object.ok:
-                #write_file(file_cardlist_html, req_object.text)
-                #log("Done writing HTMl content.")
-                contents_html = req_object.text.strip()
-
-        if contents_html != "":
-            soup = BeautifulSoup(contents_html, "html.parser")
-            log("Parsing soup...")
-
-            soup_main = soup.find("div", class_="resultCol")
-            soup_cards = soup_main.find_all("dl", class_="modalCol")
-
-            log("Parsing card list..")
-            for soup_card_div in soup_cards:
-                #-- Card Set, Rarity, and Type
-                soup_setrarity = soup_card_div.find("div", class_="infoCol").find_all("span")
-                soup_setrarity_len = len(soup_setrarity)
-                card_set_full = soup_card_div.find("div", class_="getInfo").text
-                card_set: str = ""
-                card_rarity: str = ""
-                card_type: str = ""
-                #log(f"Card Info len: {soup_setrarity_len}")
-                if soup_setrarity_len == 3:
-                    card_set = soup_setrarity[0].text
-                    card_rarity = soup_setrarity[1].text
-                    card_type = soup_setrarity[2].text
-                    #log(f"Card Info => Set: {card_set}. Rarity: {card_rarity}. Type: {card_type}. Full set name: {card_set_full}")
-
-                #-- Card Image
-                soup_card_image = soup_card_div.find("div", class_="frontCol").find("img")
-                card_image: str = route_home + "/" + str(soup_card_image["src"]).strip().lstrip('.').lstrip('\\').lstrip('/')
-                #log(f"Card image => {card_image}")
-
-                #-- Card other text info
-                card_name = soup_card_div.find("div", class_="cardName").text.strip()
-                card_cost = soup_card_div.find("div", class_="cost").contents[-1].strip()
-                card_power = soup_card_div.find("div", class_="power").contents[-1].strip()
-                card_color = soup_card_div.find("div", class_="color").contents[-1].strip()
-                card_counter = soup_card_div.find("div", class_="counter").contents[-1].strip()
-                card_attribute = soup_card_div.find("div", class_="attribute").find("i").text.strip()
-                card_feature = soup_card_div.find("div", class_="feature").contents[-1].strip()
-                card_text = soup_card_div.find("div", class_="text").text.strip()
-                """
-                log(f'''Other card info => 
-                    Cost: {card_cost} 
-                    Power: {card_power}  
-                    Color: {card_color} 
-                    Counter: {card_counter} 
-                    Attribute: {card_attribute} 
-                    Feature: {card_feature} 
-                    Text: {card_text} 
-                    '''
-                )
-                """
-
-                #-- Setup output file
-                file_output_card = os.path.join("output", f"{card_set}.json")
-                card_contents = {
-                    "Name": card_name,
-                    "Set": card_set,
-                    "Rarity": card_rarity,
-                    "Type": card_type,
-                    "Image": card_image,
-                    "Cost": card_cost,
-                    "Power": card_power,
-                    "Color": card_color,
-                    "Counter": card_counter,
-                    "Attribute": card_attribute,
-                    "Feature": card_feature,
-                    "Text": card_text
-                }
-
-                #-- Save to JSON file
-                write_json(file_output_card, card_contents)
-
-        else:
-            raise Exception(f"Failed to fetch card list. Status code: {req_object.status_code}. Reason: {req_object.reason}")
 
+        card_parser.close()
+        for cardlist_id in cardlist_ids:
+            card_writer.add_many(parsed_cards.get(cardlist_id, []))
+
+        #-- Save to JSON files, if changed
+        with metrics.stage("json_write", len(card_writer.cards)):
+            count_written, count_unchanged = card_writer.flush()
+        metrics.count("cards.written", count_written)
+        metrics.count("cards.unchanged", count_unchanged)
+        log(f"Cards written: {count_written}. Unchanged: {count_unchanged}.")
+        if file_database and card_writer.cards:
+            with metrics.stage("database_write"):
+                is_database_updated = card_writer.write_database(file_database)
+            if is_database_updated:
+                log(f"Card database updated => {file_database}")
+            if is_build_query_index:
+                # Rebuilt only if the database changed since the indexes were built
+                with metrics.stage("query_index"):
+                    card_query = CardQuery(file_database).open()
+                log(f"Query indexes ready for {card_query.meta['count']} cards.")
+            if file_database_pack and (is_database_updated or not os.path.exists(file_database_pack)):
+                database_cards = card_writer.read_database(file_database)
+                with metrics.stage("database_pack", len(database_cards)):
+                    pack_size = write_cardpack(file_database_pack, [{ "Id": card_id, **database_cards[card_id] } for card_id in sorted(database_cards)], "Id", "Set")
+                log(f"Card pack updated => {file_database_pack} ({pack_size // 1024} KB)")
+
+        #-- Mirror card images, of every card in the database
+        if is_mirror_images:
+            mirror_cards = card_writer.read_database(file_database) if file_database else card_writer.cards
+            image_urls: list[str] = list(dict.fromkeys(card["Image"] for card in mirror_cards.values()))
+            image_mirror = ImageMirror(folder_images, http_client, max_workers = image_max_workers, thumbnail_size = image_thumbnail_size)
+            with metrics.stage("image_mirror", len(image_urls)):
+                mirror_result = image_mirror.mirror(image_urls)
+            log(f"Mirrored {len(image_urls)} card images => {mirror_result}")
+        http_client.close()
+
+        #-- Save state for next run
+        if is_incremental:
+            write_json(file_scrape_state, scrape_state)
+
+        #-- Report where time went
+        log(f"Run summary:\n{metrics.summary()}")
+        if file_metrics:
+            metrics.write_json(file_metrics)
+
+        if count_failed > 0 and count_failed == len(cardlist_ids):
+            raise Exception("Failed to fetch card list for all series.")
 
         log("Done!")
 
@@ -0,0 +1,95 @@
+# Buffered output writer for scraped cards.
+# Collects cards in memory, then writes each output file once.
+
+# Imports
+import json
+import os
+
+class CardWriter:
+    """Buffer cards per output file, and write them in one go.
+
+    Cards are saved under the site's ID of the print ('Id', e.g. 'OP01-120_p1'), so file names do not
+    depend on the order cards are added in. Cards without one fall back to their set code: the first one
+    goes to '<set>.json', following ones (alternate arts) to '<set>_p1.json', '<set>_p2.json', ...
+    """
+
+    def __init__(self, folder: str = "output", compact: bool = False):
+        self.folder = folder
+        self.compact = compact
+        self.cards: dict[str, dict[str, str]] = {} # Card Id (file name without extension) -> card
+
+    def encode(self, content: any) -> str:
+        if self.compact:
+            return json.dumps(content, separators = (",", ":"))
+        return json.dumps(content, indent = 4)
+
+    def add(self, card: dict[str, str]) -> str:
+        # Returns Card Id the card is saved as. Identical reprints are only kept once.
+        site_id: str = card.get("Id", "")
+        card = { key: value for key, value in card.items() if key != "Id" }
+        if site_id:
+            self.cards[site_id] = card
+            return site_id
+        card_set: str = card["Set"]
+        card_id: str = card_set
+        index: int = 0
+        while card_id in self.cards:
+            if self.cards[card_id] == card:
+                return card_id
+            index += 1
+            card_id = f"{card_set}_p{index}"
+        self.cards[card_id] = card
+        return card_id
+
+    def add_many(self, cards: list[dict[str, str]]):
+        for card in cards:
+            self.add(card)
+
+    def write_if_changed(self, filename: str, contents: str) -> bool:
+        # Returns True if file was written
+        if os.path.exists(filename):
+            with open(filename, 'r', encoding = 'utf8') as file:
+                if file.read() == contents:
+                    return False
+        with open(filename, 'w', encoding = 'utf8') as file:
+            file.write(contents)
+        return True
+
+    def flush(self) -> tuple[int, int]:
+        # Write every buffered card to its own file. Returns counts of written and unchanged files.
+        count_written: int = 0
+        count_unchanged: int = 0
+        for card_id in sorted(self.cards):
+            filename: str = os.path.join(self.folder, f"{card_id}.json")
+            if self.write_if_changed(filename, self.encode(self.cards[card_id])):
+                count_written += 1
+            else:
+                count_unchanged += 1
+        return count_written, count_unchanged
+
+    def read_database(self, filename: str) -> dict[str, dict[str, str]]:
+        # Load an existing database file, keyed by Card Id
+        cards: dict[str, dict[str, str]] = {}
+        if not os.path.exists(filename):
+            return cards
+        with open(filename, 'r', encoding = 'utf8') as file:
+            if filename.endswith(".jsonl"):
+                records = [json.loads(line) for line in file if line.strip()]
+            else:
+                records = json.load(file)
+        for record in records:
+            card_id = record.pop("Id")
+            cards[card_id] = record
+        return cards
+
+    def write_database(self, filename: str) -> bool:
+        # Merge buffered cards into a single database file ('.json' or '.jsonl'), sorted by Card Id.
+        # Cards from series skipped on this run are kept from the existing file.
+        cards = self.read_database(filename)
+        cards.update(self.cards)
+        records: list[dict[str, str]] = [{ "Id": card_id, **cards[card_id] } for card_id in sorted(cards)]
+        if filename.endswith(".jsonl"):
+            contents: str = "".join(json.dumps(record, separators = (",", ":")) + "\n" for record in records)
+        else:
+            contents = self.encode(records)
+        return self.write_if_changed(filename, contents)
@@ -0,0 +1,5 @@
+# DragonShield export to Edopro banlist converter.
+# Import it from the repository root: from Yugioh_Exporter import ExportConfig, run
+
+# Imports
+from .main import CsvFileError, ExportConfig, Exporter, run
@@ -0,0 +1,30 @@
+# Card quantity aggregation keyed by passcode.
+
+class CardQtyAggregator:
+    """Merge card quantities by passcode in O(1) per card, keeping first-seen order."""
+
+    def __init__(self):
+        self.cards: dict[any, dict] = {}
+
+    def add(self, card_id: int, card_name: str, qty: int) -> tuple[dict, bool]:
+        # Returns the card object, and whether it was already in the list.
+        # Cards without passcode are never merged.
+        key: any = card_id if card_id else ("no-id", len(self.cards))
+        card_object = self.cards.get(key)
+        if card_object is not None:
+            card_object["qty"] = int(card_object["qty"]) + qty
+            return card_object, True
+
+        card_object = {
+            "id": card_id,
+            "name": card_name,
+            "qty": qty
+        }
+        self.cards[key] = card_object
+        return card_object, False
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def to_list(self) -> list[dict]:
+        return list(self.cards.values())
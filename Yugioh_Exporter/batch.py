@@ -0,0 +1,204 @@
+# Batch mode. Convert many DragonShield exports in one run, each into its own output folder.
+# Setcodes of all files are read first and resolved once, then the files are exported by a process pool.
+# Usage: python batch.py exports/ other.csv [--output output] [--workers 4] [export options]
+
+# Imports
+import copy
+import json
+import os
+import sys
+from collections import Counter
+from contextlib import closing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from time import perf_counter
+if not __package__:
+    # Run as a script ('python batch.py'): make the repository root importable, and import as the Yugioh_Exporter package
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    __package__ = "Yugioh_Exporter"
+from common.applog import setup_logger, log, log_err
+from common.metrics import metrics
+from .csvstream import read_csv_rows
+from .main import ExportConfig, Exporter, config_from_args, export_argument_parser, folder_skip, index_cardnumber, index_folder_name, normalize_setcode
+
+# Exporter of a worker process, with the setcodes resolved for the whole batch
+worker_exporter: Exporter = None
+
+# Methods
+def find_input_files(paths: list[str]) -> list[str]:
+    # Csv files given, and the csv files in folders given
+    input_files: list[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            input_files += sorted(os.path.join(path, x) for x in os.listdir(path) if x.lower().endswith(".csv"))
+        else:
+            input_files.append(path)
+    return list(dict.fromkeys(input_files))
+
+def output_folders(input_files: list[str], folder_outputs: str) -> list[str]:
+    # One folder per input, named after the file. Same names get a number: 'export', 'export_2', ..
+    folders: list[str] = []
+    used: set[str] = set()
+    for input_file in input_files:
+        name = os.path.splitext(os.path.basename(input_file))[0]
+        folder_name, index = name, 1
+        while folder_name.lower() in used:
+            index += 1
+            folder_name = f"{name}_{index}"
+        used.add(folder_name.lower())
+        folders.append(os.path.join(folder_outputs, folder_name))
+    return folders
+
+def read_setcodes(task: tuple[str, str]) -> list[str]:
+    # Unique normalized setcodes of an export, empty if it cannot be read. Skipped folders are left out, as in read_cards.
+    input_file, encoding = task
+    try:
+        with closing(read_csv_rows(input_file, encoding)) as csv_reader:
+            next(csv_reader, None)
+            rows = (row for row in csv_reader if len(row) > index_cardnumber and str(row[index_folder_name]) not in folder_skip)
+            return list(dict.fromkeys(normalize_setcode(str(row[index_cardnumber])) for row in rows))
+    except Exception:
+        return []
+
+def init_worker(config: ExportConfig, passcode_map: dict[str, dict], failed_setcodes: dict[str, float], is_worker_process: bool = False):
+    # Worker exporters never request setcodes, they use the passcodes resolved by the batch.
+    # Failed setcodes are skipped the same way, going straight to their fallback forms.
+    global worker_exporter
+    if is_worker_process:
+        # One log file per process
+        setup_logger(os.path.join("logs", f"batch_{datetime.today().strftime('%Y-%m-%d')}_{os.getpid()}.log"), level = config.log_level, console = False)
+    metrics.reset()
+    worker_exporter = Exporter(config)
+    worker_exporter.passcode_map = passcode_map
+    worker_exporter.stale_setcodes = set()
+    worker_exporter.failed_setcodes = failed_setcodes
+    worker_exporter.database_index = {}
+
+def export_file(task: tuple[str, str]) -> dict[str, any]:
+    input_file, folder_outputs = task
+    started = perf_counter()
+    try:
+        summary = worker_exporter.export(input_file, folder_outputs)
+    except Exception as e:
+        log_err(f"Issue found on exporting => {input_file}", e)
+        summary = { "input_file": input_file, "folder_outputs": folder_outputs, "error": str(e) }
+    summary["seconds"] = perf_counter() - started
+    return summary
+
+class BatchExporter:
+    """Convert many exports with one setcode lookup per unique setcode, and a pool of export processes."""
+
+    def __init__(self, config: ExportConfig, workers: int = 0):
+        self.config = config
+        self.workers = workers or os.cpu_count() or 1 # 0 for one per CPU
+
+    def worker_config(self) -> ExportConfig:
+        config = copy.copy(self.config)
+        config.is_cache_only = True
+        config.is_prefetch_database = False
+        config.is_mirror_images = False # Mirrored once for the batch
+        config.file_metrics = ""
+        return config
+
+    def run(self, input_files: list[str]) -> dict[str, any]:
+        # Export every file into its own folder under config.folder_outputs. Returns the batch summary.
+        config = self.config
+        started = perf_counter()
+        folders: list[str] = output_folders(input_files, config.folder_outputs)
+        workers: int = max(1, min(self.workers, len(input_files)))
+        log(f"Batch of {len(input_files)} exports, {workers} workers.")
+
+        #-- Setcodes of every file, resolved once
+        with metrics.stage("batch_read_setcodes", len(input_files)):
+            tasks = [(x, config.csv_text_encoding) for x in input_files]
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers = workers) as pool:
+                    file_setcodes: list[list[str]] = list(pool.map(read_setcodes, tasks))
+            else:
+                file_setcodes = list(map(read_setcodes, tasks))
+        unique_setcodes: list[str] = list(dict.fromkeys(x for setcodes in file_setcodes for x in setcodes))
+        lookups: int = sum(len(x) for x in file_setcodes)
+        log(f"Setcodes => {len(unique_setcodes)} unique, {lookups} across files.")
+        resolver = Exporter(config)
+        fallbacks: dict[str, tuple[str, str]] = {}
+        try:
+            passcode_table = resolver.resolve_setcodes(unique_setcodes, fallbacks)
+            if config.is_mirror_images:
+                resolver.mirror_images(passcode_table.values())
+        finally:
+            resolver.close()
+        # Resolved setcodes, under the form they resolved as
+        passcode_map: dict[str, dict] = { fallbacks.get(k, (None, k))[1]: v for k, v in passcode_table.items() if v is not None }
+        failed_setcodes: dict[str, float] = resolver.failed_setcodes
+
+        #-- Export files
+        tasks = list(zip(input_files, folders))
+        worker_config = self.worker_config()
+        with metrics.stage("batch_export", len(input_files)):
+            if workers > 1:
+                with ProcessPoolExecutor(max_workers = workers, initializer = init_worker, initargs = (worker_config, passcode_map, failed_setcodes, True)) as pool:
+                    results: list[dict[str, any]] = []
+                    for result in pool.map(export_file, tasks):
+                        self.log_result(result)
+                        results.append(result)
+            else:
+                init_worker(worker_config, passcode_map, failed_setcodes)
+                results = [export_file(x) for x in tasks]
+                for result in results:
+                    self.log_result(result)
+
+        seconds: float = perf_counter() - started
+        cards: int = sum(x.get("cards", 0) for x in results)
+        summary: dict[str, any] = {
+            "files": len(input_files),
+            "failed": sum(1 for x in results if "error" in x),
+            "cards": cards,
+            "listings": sum(x.get("listings", 0) for x in results),
+            "setcodes": len(unique_setcodes),
+            "setcodes_resolved": sum(1 for x in passcode_table.values() if x is not None),
+            "setcodes_fallback": dict(Counter(x[0] for x in fallbacks.values())),
+            "setcode_lookups_saved": lookups - len(unique_setcodes),
+            "workers": workers,
+            "seconds": seconds,
+            "files_per_second": len(input_files) / seconds if seconds > 0 else 0.0,
+            "cards_per_second": cards / seconds if seconds > 0 else 0.0,
+            "results": results
+        }
+        with open(os.path.join(config.folder_outputs, "batch_summary.json"), 'w', encoding = 'utf8') as file:
+            json.dump(summary, file, indent = 4)
+        log(f"Exported {len(input_files) - summary['failed']} of {len(input_files)} files, {cards} cards in {seconds:.2f}s "
+            f"=> {summary['files_per_second']:.2f} files/s, {summary['cards_per_second']:.0f} cards/s")
+        return summary
+
+    def log_result(self, result: dict[str, any]):
+        if "error" in result:
+            log(f"Failed => {result['input_file']} ({result['error']})")
+        else:
+            log(f"Exported => {result['input_file']} => {result['folder_outputs']} ({result.get('cards', 0)} cards, {result['seconds']:.2f}s)")
+
+def main(argv: list[str] = None):
+    parser = export_argument_parser("Convert many DragonShield exports, each into its own output folder.", is_batch = True)
+    parser.add_argument("inputs", nargs = "+", help = "DragonShield export csv files, or folders of them")
+    parser.add_argument("--workers", type = int, default = 0, help = "export processes, 0 for one per CPU (default: 0)")
+    args = parser.parse_args(argv)
+    config = config_from_args(parser, args)
+    setup_logger(os.path.join("logs", f"batch_{datetime.today().strftime('%Y-%m-%d')}.log"), level = config.log_level, timestamp = False)
+    try:
+        input_files: list[str] = find_input_files(args.inputs)
+        if not input_files:
+            log("No csv files found.")
+            return
+        os.makedirs(config.folder_outputs, exist_ok = True)
+        BatchExporter(config, args.workers).run(input_files)
+
+        # Report where time went
+        log(f"Run summary:\n{metrics.summary()}")
+        if config.file_metrics:
+            metrics.write_json(config.file_metrics)
+
+    except Exception as e:
+        log_err("Error, batch", e)
+
+# Main
+if __name__ == "__main__":
+    main()
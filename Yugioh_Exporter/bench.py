@@ -0,0 +1,172 @@
+# Benchmarks for the exporter.
+# Usage: python bench.py
+
+# Imports
+import io
+import os
+import random
+import sys
+import tracemalloc
+from time import perf_counter
+if not __package__:
+    # Run as a script ('python bench.py'): make the repository root importable, and import as the Yugioh_Exporter package
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    __package__ = "Yugioh_Exporter"
+from .aggregator import CardQtyAggregator
+from .cardtable import CardTable, CardView, global_setcode
+from .main import dump_json_rows
+from .pricing import ListingPricer, MarkupRule, is_numpy_available
+
+# Methods
+def make_rows(count: int, unique_ids: int) -> list[tuple[int, str, int]]:
+    # Synthetic resolved rows: (passcode, name, qty)
+    rng = random.Random(count)
+    rows: list[tuple[int, str, int]] = []
+    for _ in range(count):
+        card_id = rng.randint(1, unique_ids)
+        rows.append((card_id, f"Card {card_id}", rng.randint(1, 3)))
+    return rows
+
+def merge_linear(rows: list[tuple[int, str, int]]) -> list[dict]:
+    # Previous approach: scan the whole list for every row
+    card_conf_list: list[dict] = []
+    for card_id, card_name, qty in rows:
+        is_already_exist = False
+        for x in card_conf_list:
+            if x["id"] and int(x["id"]) == card_id:
+                is_already_exist = True
+                x["qty"] = int(x["qty"]) + qty
+                break
+        if not is_already_exist:
+            card_conf_list.append({ "id": card_id, "name": card_name, "qty": qty })
+    return card_conf_list
+
+def merge_keyed(rows: list[tuple[int, str, int]]) -> list[dict]:
+    aggregator = CardQtyAggregator()
+    for card_id, card_name, qty in rows:
+        aggregator.add(card_id, card_name, qty)
+    return aggregator.to_list()
+
+def timed(func, *args) -> tuple[float, any]:
+    start = perf_counter()
+    result = func(*args)
+    return perf_counter() - start, result
+
+def bench_aggregation(sizes: list[int], linear_limit: int = 10000):
+    print("Quantity merge (rows / linear scan / keyed aggregator)")
+    for size in sizes:
+        # Roughly one unique card per 3 rows, like a collection with playsets
+        rows = make_rows(size, max(1, size // 3))
+        keyed_time, keyed_result = timed(merge_keyed, rows)
+        if size <= linear_limit:
+            linear_time, linear_result = timed(merge_linear, rows)
+            if linear_result != keyed_result:
+                raise Exception(f"Output mismatch for {size} rows")
+            linear_text = f"{linear_time:10.4f}s"
+        else:
+            linear_text = "   skipped"
+        print(f"{size:>8} | {linear_text} | {keyed_time:10.4f}s")
+
+def make_export_rows(count: int) -> list[list[str]]:
+    # Synthetic csv rows: (folder, name, setcode, set name, rarity, printing, qty, trade qty, low, mid, market)
+    rng = random.Random(count)
+    rarities = ["Common", "Rare", "Super Rare", "Ultra Rare", "Secret Rare"]
+    rows: list[list[str]] = []
+    for _ in range(count):
+        set_number = rng.randint(1, 200)
+        card_number = rng.randint(1, 100)
+        rows.append([
+            rng.choice(["Binder", "Deck", "OCG Binder", "AE Binder"]),
+            f"Card {set_number}-{card_number}",
+            f"S{set_number:03d}-EN{card_number:03d}",
+            f"Set {set_number}",
+            rng.choice(rarities),
+            rng.choice(["1st Edition", "Unlimited"]),
+            str(rng.randint(1, 3)), "0",
+            f"{rng.random() * 10:.2f}", f"{rng.random() * 20:.2f}", f"{rng.random() * 30:.2f}"
+        ])
+    return rows
+
+def load_dicts(rows: list[list[str]]) -> list[list[dict]]:
+    # Previous approach: one dict per card, shared by the format lists, and a listing dict with its description
+    cards, cards_tcg, cards_ocg, card_listings = [], [], [], []
+    for folder, name, setcode, set_name, rarity, printing, qty, trade_qty, low, mid, market in rows:
+        card_format = "OCG" if folder.startswith("OCG") else "TCG"
+        card_object = { "name": name, "set": setcode, "set_global": global_setcode(setcode), "qty": int(qty), "trade_qty": int(trade_qty), "format": card_format }
+        cards.append(card_object)
+        (cards_ocg if card_format == "OCG" else cards_tcg).append(card_object)
+        if rarity != "Common":
+            card_listings.append({
+                "name": f"Yu-Gi-Oh! {card_format} {name} ({setcode} {rarity})",
+                "qty": int(qty),
+                "desc": f"Yugioh {card_format} card\n    Name: {name}\n    Set: {set_name}\n    Edition: {printing}\n    Condition: Near Mint\n\n    (Price based on yugiohprices.com)",
+                "price_low": round(float(low) * 55, 2),
+                "price_mid": round(float(mid) * 55, 2),
+                "price_market": round(float(market) * 55, 2),
+                "rarity": rarity
+            })
+    return [cards, cards_tcg, cards_ocg, card_listings]
+
+def load_table(rows: list[list[str]]) -> list[any]:
+    card_table = CardTable()
+    cards, cards_tcg, cards_ocg, card_listings = [CardView(card_table) for _ in range(4)]
+    for folder, name, setcode, set_name, rarity, printing, qty, trade_qty, low, mid, market in rows:
+        card_format = "OCG" if folder.startswith("OCG") else "TCG"
+        card_index = card_table.append(name, setcode, set_name, rarity, printing, card_format, int(qty), int(trade_qty), float(low), float(mid), float(market))
+        cards.append(card_index)
+        (cards_ocg if card_format == "OCG" else cards_tcg).append(card_index)
+        if rarity != "Common":
+            card_listings.append(card_index)
+    return [card_table, cards, cards_tcg, cards_ocg, card_listings]
+
+def measured(func, *args) -> tuple[float, int]:
+    # Seconds and peak traced memory in bytes. The result is kept alive until measured.
+    tracemalloc.start()
+    start = perf_counter()
+    result = func(*args)
+    seconds = perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    del result
+    return seconds, peak
+
+def bench_card_table(sizes: list[int]):
+    print("Card storage (rows / dicts time, peak MB / card table time, peak MB)")
+    for size in sizes:
+        # Rows are built before tracing, so only the stored cards are counted
+        rows = make_export_rows(size)
+        dict_time, dict_peak = measured(load_dicts, rows)
+        table_time, table_peak = measured(load_table, rows)
+        print(f"{size:>8} | {dict_time:8.3f}s {dict_peak / 1048576:8.1f} MB | {table_time:8.3f}s {table_peak / 1048576:8.1f} MB")
+
+def convert_rows(rows: list[list[str]], rate: float) -> list[tuple[float, float, float]]:
+    # Previous approach: convert each row's prices inside the csv loop
+    return [tuple(round(float(x) * rate, 2) if x else 0 for x in row[8:11]) for row in rows]
+
+def bench_listing_prices(sizes: list[int]):
+    currencies = { "PHP": 55.0, "USD": 1.0, "EUR": 0.92 }
+    markup_rules = [MarkupRule("Secret Rare", 0, 1.2, 0), MarkupRule("", 10, 1.1, 0.5)]
+    pricers = [("python", ListingPricer(currencies, markup_rules, is_use_numpy = False))]
+    if is_numpy_available():
+        pricers.append(("numpy", ListingPricer(currencies, markup_rules, is_use_numpy = True)))
+    print(f"Listing prices ({len(currencies)} currencies, {len(markup_rules)} markup rules)")
+    for size in sizes:
+        rows = make_export_rows(size)
+        card_table, card_listings = load_table(rows)[0], load_table(rows)[4]
+        columns = [card_table.prices_low, card_table.prices_mid, card_table.prices_market]
+        row_time, _ = timed(convert_rows, rows, currencies["PHP"])
+        print(f"{size:>8} | row by row, 1 currency {row_time:10.4f}s")
+        results = []
+        for name, pricer in pricers:
+            convert_time, result = timed(pricer.convert, columns, card_listings.indexes, card_table.rarities)
+            results.append(result)
+            stage_time, _ = timed(dump_json_rows, card_listings.listings(pricer), io.StringIO())
+            print(f"{size:>8} | {name:<6} batch convert {convert_time:10.4f}s | listings stage {stage_time:10.4f}s")
+        if any(x != results[0] for x in results):
+            raise Exception(f"Price mismatch for {size} rows")
+
+# Main
+if __name__ == "__main__":
+    bench_aggregation([1000, 10000, 100000])
+    bench_card_table([10000, 100000])
+    bench_listing_prices([100000])
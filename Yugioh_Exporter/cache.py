@@ -0,0 +1,126 @@
+# Single-file setcode cache backed by SQLite.
+# Replaces the old 'setcodes/<setcode>.json' layout, one file per setcode.
+# Setcodes the API has no card for are kept too (negative cache), so they are not requested on every run.
+
+# Imports
+import json
+import os
+import sqlite3
+from time import time
+
+class SetcodeCache:
+    """Setcode -> passcode/name cache, with fetch time for staleness checks.
+    Failed setcodes are kept for negative_ttl_days."""
+
+    def __init__(self, filename: str, ttl_days: float = 30.0, negative_ttl_days: float = 7.0):
+        self.filename = filename
+        self.ttl_seconds = ttl_days * 86400 if ttl_days > 0 else 0
+        self.negative_ttl_seconds = negative_ttl_days * 86400 if negative_ttl_days > 0 else 0
+        # May be used from several threads (export service), callers serialize access
+        self.connection = sqlite3.connect(filename, check_same_thread = False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS setcodes (
+                setcode TEXT PRIMARY KEY,
+                passcode INTEGER NOT NULL,
+                name TEXT NOT NULL,
+                data TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS failures (
+                setcode TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                failed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL
+            );
+        """)
+
+    def is_stale(self, fetched_at: float) -> bool:
+        return self.ttl_seconds > 0 and time() - fetched_at > self.ttl_seconds
+
+    def lookup(self, setcode: str, allow_stale: bool = False) -> dict:
+        # Returns {"id", "name"} or None if missing (or stale)
+        row = self.connection.execute(
+            "SELECT passcode, name, fetched_at FROM setcodes WHERE setcode = ?", (setcode,)
+        ).fetchone()
+        if row is None or (not allow_stale and self.is_stale(row[2])):
+            return None
+        return { "id": row[0], "name": row[1] }
+
+    def load_all(self) -> tuple[dict[str, dict], set[str]]:
+        # Load the whole passcode map in one query.
+        # Returns the map, and the setcodes in it that are stale.
+        passcode_map: dict[str, dict] = {}
+        stale_setcodes: set[str] = set()
+        for setcode, passcode, name, fetched_at in self.connection.execute(
+            "SELECT setcode, passcode, name, fetched_at FROM setcodes"
+        ):
+            passcode_map[setcode] = { "id": passcode, "name": name }
+            if self.is_stale(fetched_at):
+                stale_setcodes.add(setcode)
+        return passcode_map, stale_setcodes
+
+    def load_failures(self) -> dict[str, float]:
+        # Setcode => time of failure, for failures within the negative TTL. Expired ones are deleted.
+        if self.negative_ttl_seconds <= 0:
+            return {}
+        expired_at = time() - self.negative_ttl_seconds
+        with self.connection:
+            self.connection.execute("DELETE FROM failures WHERE failed_at < ?", (expired_at,))
+        return dict(self.connection.execute("SELECT setcode, failed_at FROM failures"))
+
+    def insert_failures(self, entries: dict[str, int], failed_at: float = None) -> int:
+        # Insert or replace setcode -> status code of the failed request
+        if self.negative_ttl_seconds <= 0:
+            return 0
+        failed_at = time() if failed_at is None else failed_at
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO failures (setcode, status, failed_at) VALUES (?, ?, ?)",
+                [(setcode, int(status), failed_at) for setcode, status in entries.items()]
+            )
+        return len(entries)
+
+    def insert_many(self, entries: dict[str, any], fetched_at: float = None) -> int:
+        # Insert or replace setcode -> API response (raw text or parsed dict)
+        fetched_at = time() if fetched_at is None else fetched_at
+        rows: list[tuple] = []
+        for setcode, content in entries.items():
+            data = json.loads(content) if isinstance(content, str) else content
+            rows.append((setcode, int(data["id"]), str(data["name"]), json.dumps(data), fetched_at))
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO setcodes (setcode, passcode, name, data, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                rows
+            )
+            # Resolved now, no longer failed
+            self.connection.executemany("DELETE FROM failures WHERE setcode = ?", [(x[0],) for x in rows])
+        return len(rows)
+
+    def migrate_folder(self, folder: str) -> tuple[int, list[str]]:
+        # One-time import of the old 'setcodes/*.json' cache.
+        # Returns number of imported setcodes, and file names that could not be read.
+        if self.connection.execute("SELECT 1 FROM meta WHERE key = 'migrated_folder'").fetchone():
+            return 0, []
+        imported: int = 0
+        failed: list[str] = []
+        if os.path.isdir(folder):
+            for item in os.listdir(folder):
+                if not item.endswith(".json"):
+                    continue
+                filepath: str = os.path.join(folder, item)
+                try:
+                    with open(filepath, encoding = 'utf8') as file:
+                        content = file.read()
+                    # Keep file age, so old entries still go stale
+                    imported += self.insert_many({ item[:-len(".json")]: content }, os.path.getmtime(filepath))
+                except Exception:
+                    failed.append(item)
+        with self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_folder', ?)", (folder,))
+        return imported, failed
+
+    def close(self):
+        self.connection.close()
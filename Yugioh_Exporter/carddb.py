@@ -0,0 +1,58 @@
+# Full card database dump from the YGOPRODECK API.
+# Downloaded once and cached on disk, then indexed by setcode in memory.
+
+# Imports
+import json
+import os
+from time import time
+from common.httpclient import HttpClient
+
+class CardDatabase:
+    """Setcode -> passcode/name index built from the 'cardinfo.php' dump."""
+
+    def __init__(self, route: str, filename: str, refresh_days: float = 7.0, timeout: float = 120.0, client: HttpClient = None):
+        self.route = route
+        self.filename = filename
+        self.refresh_seconds = refresh_days * 86400
+        self.timeout = timeout
+        self.client = HttpClient(pool_maxsize = 1) if client is None else client
+
+    def age_days(self) -> float:
+        # Age of the cached dump, or -1 if there is none
+        if not os.path.exists(self.filename):
+            return -1
+        return (time() - os.path.getmtime(self.filename)) / 86400
+
+    def is_fresh(self) -> bool:
+        return os.path.exists(self.filename) and time() - os.path.getmtime(self.filename) < self.refresh_seconds
+
+    def download(self):
+        # Stream dump to a temporary file, and replace the cached one only when complete
+        temp_filename: str = f"{self.filename}.tmp"
+        with self.client.get(self.route, stream = True, timeout = self.timeout) as req_object:
+            req_object.raise_for_status()
+            with open(temp_filename, 'wb') as f:
+                for chunk in req_object.iter_content(chunk_size = 1024 * 1024):
+                    f.write(chunk)
+        os.replace(temp_filename, self.filename)
+
+    def refresh(self) -> bool:
+        # Download the dump if missing or older than the refresh interval.
+        # Returns True if a new dump was downloaded.
+        if self.is_fresh():
+            return False
+        self.download()
+        return True
+
+    def load_index(self) -> dict[str, dict]:
+        # Map every set code in the dump to its card. First card listing a set code wins.
+        index: dict[str, dict] = {}
+        with open(self.filename, 'r', encoding = 'utf8') as file:
+            contents = json.load(file)
+        for card in contents.get("data", []):
+            card_info = { "id": int(card["id"]), "name": str(card["name"]) }
+            for card_set in card.get("card_sets") or []:
+                set_code = str(card_set.get("set_code", "")).strip()
+                if set_code and set_code not in index:
+                    index[set_code] = card_info
+        return index
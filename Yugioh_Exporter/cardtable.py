@@ -0,0 +1,124 @@
+# Compact, column-backed storage for the rows of a DragonShield export.
+# Per-format card lists and listings are index views over one table, and
+# their json objects are only built while writing.
+
+# Imports
+import sys
+from array import array
+from math import isnan, nan
+from .pricing import ListingPricer
+
+def global_setcode(card_setcode: str) -> str:
+    # 'LOB-EN001' => 'LOB-001'. Raises IndexError for setcodes without region part.
+    card_setcode_split = card_setcode.split('-')
+    return f"{ card_setcode_split[0] }-{ str(card_setcode_split[1])[2:] }"
+
+def parse_price(value: str) -> float:
+    # Empty price columns are kept as NaN
+    return float(value) if value else nan
+
+class CardTable:
+    """Card rows stored by column. Repeated strings are interned, numbers are kept in arrays."""
+
+    def __init__(self):
+        self.names: list[str] = []
+        self.setcodes: list[str] = []
+        self.set_names: list[str] = []
+        self.rarities: list[str] = []
+        self.printings: list[str] = []
+        self.formats: list[str] = []
+        self.qtys = array('i')
+        self.trade_qtys = array('i')
+        self.prices_low = array('d')
+        self.prices_mid = array('d')
+        self.prices_market = array('d')
+
+    def __len__(self) -> int:
+        return len(self.setcodes)
+
+    def append(self, name: str, setcode: str, set_name: str, rarity: str, printing: str, card_format: str,
+               qty: int, trade_qty: int, price_low: float = nan, price_mid: float = nan, price_market: float = nan) -> int:
+        # Returns the row index
+        self.names.append(sys.intern(name))
+        self.setcodes.append(sys.intern(setcode))
+        self.set_names.append(sys.intern(set_name))
+        self.rarities.append(sys.intern(rarity))
+        self.printings.append(sys.intern(printing))
+        self.formats.append(sys.intern(card_format))
+        self.qtys.append(qty)
+        self.trade_qtys.append(trade_qty)
+        self.prices_low.append(price_low)
+        self.prices_mid.append(price_mid)
+        self.prices_market.append(price_market)
+        return len(self.setcodes) - 1
+
+    def card(self, index: int) -> dict[str, any]:
+        # Card object, as written to the card lists
+        card_setcode = self.setcodes[index]
+        return {
+            "name": self.names[index],
+            "set": card_setcode,
+            "set_global": global_setcode(card_setcode),
+            "qty": self.qtys[index],
+            "trade_qty": self.trade_qtys[index],
+            "format": self.formats[index]
+        }
+
+    def listing(self, index: int, price_low: float, price_mid: float, price_market: float, other_prices: dict[str, dict] = None) -> dict[str, any]:
+        # Shop listing of a card, with converted prices. Missing (NaN) prices are written as 0.
+        card_format = self.formats[index]
+        row_card_name = self.names[index]
+        card_setcode = self.setcodes[index]
+        card_rarity = self.rarities[index]
+        listing = {
+            "name": f"Yu-Gi-Oh! { card_format } { row_card_name } ({ card_setcode } { card_rarity })",
+            "qty": self.qtys[index],
+            "desc": f"Yugioh { card_format } card\n"
+                    f"    Name: { row_card_name }\n"
+                    f"    Set: { self.set_names[index] }\n"
+                    f"    Edition: { self.printings[index] }\n"
+                    f"    Condition: Near Mint\n"
+                    f"\n"
+                    f"    (Price based on yugiohprices.com)",
+            "price_low": 0 if isnan(price_low) else price_low,
+            "price_mid": 0 if isnan(price_mid) else price_mid,
+            "price_market": 0 if isnan(price_market) else price_market,
+            "rarity" : card_rarity
+        }
+        if other_prices:
+            # Other currencies, code => {"low", "mid", "market"}
+            listing["prices"] = { code: { key: 0 if isnan(x) else x for key, x in prices.items() } for code, prices in other_prices.items() }
+        return listing
+
+class CardView:
+    """Subset of CardTable rows, by row index."""
+
+    def __init__(self, table: CardTable):
+        self.table = table
+        self.indexes = array('I')
+
+    def __len__(self) -> int:
+        return len(self.indexes)
+
+    def __iter__(self):
+        return iter(self.indexes)
+
+    def append(self, index: int):
+        self.indexes.append(index)
+
+    def cards(self):
+        # Card objects, built one at a time
+        return (self.table.card(index) for index in self.indexes)
+
+    def listings(self, pricer: ListingPricer):
+        # Listings, with the prices of all rows converted up front
+        table = self.table
+        columns = pricer.convert([table.prices_low, table.prices_mid, table.prices_market], self.indexes, table.rarities)
+        codes: list[str] = list(pricer.currencies)
+        primary, other_codes = codes[0], codes[1:]
+        for position, index in enumerate(self.indexes):
+            other_prices: dict[str, dict] = {
+                code: { "low": columns[0][code][position], "mid": columns[1][code][position], "market": columns[2][code][position] }
+                for code in other_codes
+            }
+            yield table.listing(index, columns[0][primary][position], columns[1][primary][position], columns[2][primary][position], other_prices)
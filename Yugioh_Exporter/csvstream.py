@@ -0,0 +1,47 @@
+# Streaming reader for DragonShield csv exports.
+# Reads rows straight from the export, without intermediate copies of the file.
+
+# Imports
+import codecs
+import csv
+from itertools import chain
+
+# Byte order marks, longest first
+BOM_ENCODINGS: list[tuple[bytes, str]] = [
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16")
+]
+
+def detect_encoding(filename: str) -> str:
+    # Check BOM, then check for utf-16-le without BOM ('s\0e\0p\0')
+    with open(filename, 'rb') as f:
+        head = f.read(4)
+    for bom, encoding in BOM_ENCODINGS:
+        if head.startswith(bom):
+            return encoding
+    if len(head) >= 2 and head[0] != 0 and head[1] == 0:
+        return "utf-16-le"
+    return "utf-8"
+
+def sniff_separator(first_line: str) -> str:
+    # Returns separator from a '"sep=,"' line, or None if it is not a separator line
+    line = first_line.strip('\n').strip().strip('"')
+    line_split = line.split("=")
+    if len(line_split) > 1 and line_split[0].strip().lower() == "sep":
+        return str(line_split[1]).replace("\"", "").strip() or None
+    return None
+
+def read_csv_rows(filename: str, encoding: str = "", default_sep: str = ","):
+    # Yield parsed rows, header first. The 'sep=' line is skipped, and its separator used.
+    # Encoding is detected from the file if not given.
+    encoding = encoding or detect_encoding(filename)
+    with open(filename, 'rt', encoding = encoding, newline='') as csv_file:
+        first_line = csv_file.readline()
+        sep = sniff_separator(first_line)
+        if sep is None:
+            lines = chain([first_line], csv_file)
+            sep = default_sep
+        else:
+            lines = csv_file
+        yield from csv.reader(lines, delimiter=sep)
@@ -0,0 +1,86 @@
+# State of the last export into an output folder, for incremental runs.
+# Rows are keyed by content hash, outputs by a signature of the rows (and settings) they are built from.
+
+# Imports
+import hashlib
+import json
+import os
+from collections import Counter
+from typing import Iterable
+
+# Bump when the state layout or the output content changes
+STATE_VERSION: int = 3
+
+def hash_row(row: list[str]) -> str:
+    return hashlib.blake2b("\x1f".join(row).encode('utf8'), digest_size = 16).hexdigest()
+
+def signature(*parts: Iterable[str]) -> str:
+    # Hash of several string sequences, kept apart by separators
+    digest = hashlib.blake2b(digest_size = 16)
+    for part in parts:
+        digest.update("\x1f".join(part).encode('utf8'))
+        digest.update(b"\x1e")
+    return digest.hexdigest()
+
+class ExportState:
+    """Input hash, row hash counts, resolved setcodes and output signatures of the last export."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.file_hash: str = ""
+        self.settings_hash: str = ""
+        self.row_counts: dict[str, int] = {}
+        self.passcodes: dict[str, dict] = {} # Setcode => {"id", "name"}, resolved setcodes only
+        self.fallbacks: dict[str, list[str]] = {} # Setcode => [fallback name, setcode it resolved as]
+        self.retry_count: int = 0 # Setcodes left unresolved by network errors, 429/5xx or a cache-only run, requested again next run
+        self.outputs: dict[str, str] = {} # Output file name => signature
+        self.summary: dict[str, any] = {} # Counts of the last export
+
+    def load(self) -> bool:
+        # Returns False if there is no usable state. Then every output is written.
+        try:
+            with open(self.filename, encoding = 'utf8') as file:
+                contents = json.load(file)
+            if contents.get("version") != STATE_VERSION:
+                return False
+            self.file_hash = contents["file_hash"]
+            self.settings_hash = contents["settings_hash"]
+            self.row_counts = contents["rows"]
+            self.passcodes = contents["passcodes"]
+            self.fallbacks = contents["fallbacks"]
+            self.retry_count = contents["retry_count"]
+            self.outputs = contents["outputs"]
+            self.summary = contents["summary"]
+            return True
+        except (OSError, ValueError, KeyError):
+            return False
+
+    def save(self):
+        # Write to a temporary file first, so an interrupted run leaves the old state
+        contents = {
+            "version": STATE_VERSION,
+            "file_hash": self.file_hash,
+            "settings_hash": self.settings_hash,
+            "rows": self.row_counts,
+            "passcodes": self.passcodes,
+            "fallbacks": self.fallbacks,
+            "retry_count": self.retry_count,
+            "outputs": self.outputs,
+            "summary": self.summary
+        }
+        with open(self.filename + ".tmp", 'w', encoding = 'utf8') as file:
+            json.dump(contents, file, separators = (",", ":"))
+        os.replace(self.filename + ".tmp", self.filename)
+
+    def clear(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def diff_rows(self, row_hashes: list[str]) -> tuple[int, int]:
+        # Number of added and removed rows since the last export. Changed rows count as both.
+        current = Counter(row_hashes)
+        previous = Counter(self.row_counts)
+        return sum((current - previous).values()), sum((previous - current).values())
+
+    def is_output_current(self, folder_outputs: str, file_name: str, output_signature: str) -> bool:
+        return self.outputs.get(file_name) == output_signature and os.path.exists(os.path.join(folder_outputs, file_name))
@@ -1,60 +1,130 @@
 # Export files with different format
 # Convert DragonShield export to Edopro banlist.
+# Usage: python main.py [--input all-folders.csv] [--output output] [--formats all tcg ocg ae] ..
+# Or import it from the repository root: from Yugioh_Exporter import ExportConfig, run; run(ExportConfig(input_file = "export.csv"))
 
 # Imports
-import requests
-import csv
+# 'resolver', 'carddb', 'common.httpclient' and 'common.imagemirror' pull in requests, so they are imported only when needed
+import argparse
+import io
 import json
 import os
+import re
+import sys
+import threading
+from collections import Counter
+from json.encoder import encode_basestring_ascii
+from math import isfinite
 from pathlib import Path
-from time import sleep
 from datetime import datetime
+from contextlib import closing
+from time import perf_counter, time
+from typing import Callable, Iterable, TextIO
+if not __package__:
+    # Run as a script ('python main.py'): make the repository root importable, and import as the Yugioh_Exporter package
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    __package__ = "Yugioh_Exporter"
+from common.applog import DEBUG, INFO, setup_logger, log, log_debug, log_err
+from common.cardpack import write_cardpack
+from common.hashing import hash_file
+from common.metrics import metrics
+from .aggregator import CardQtyAggregator
+from .cache import SetcodeCache
+from .delta import ExportState, hash_row, signature
+from .cardtable import CardTable, CardView, global_setcode, parse_price
+from .pricing import ListingPricer, MarkupRule
+from .csvstream import detect_encoding, read_csv_rows
+
+# Constants
+# CSV columns
+index_folder_name: int = 0
+index_qty: int = 1
+index_tradeqty: int = 2
+index_cardname: int = 3
+index_set_name: int = 5
+index_cardnumber: int = 6
+index_rarity: int = 7
+index_printing: int = 9
+index_price_low: int = 13
+index_price_mid: int = 14
+index_price_market: int = 15
+# Use for array holders
+index_all: int = 0
+index_tcg: int = 1
+index_ocg: int = 2
+index_ae: int = 3
+card_format_names: list[str] = ["OCG/TCG", "TCG", "OCG", "AE"] # Same order as array holders
+card_format_keys: list[str] = ["all", "tcg", "ocg", "ae"] # Same order as array holders, used by '--formats'
+# Export file names, inside the output folder
+export_json_file_name: list[str] = ["cards.json", "TCG_cards.json", "OCG_cards.json", "AE_cards.json"]
+export_conf_file: list[str] = ["MyCards.lflist.conf", "MyCards_TCG.lflist.conf", "MyCards_OCG.lflist.conf", "MyCards_AE.lflist.conf"]
+jsonfile_cards_with_error: list[str] = ["cards_error.json", "TCG_cards_error.json", "OCG_cards_error.json", "AE_cards_error.json"]
+jsonfile_card_conf_list: list[str] = ["cards_conf.json", "TCG_cards_conf.json", "OCG_cards_conf.json", "AE_cards_conf.json"]
+jsonfile_listings: list[str] = ["listings.json", "TCG_listings.json", "OCG_listings.json", "AE_listings.json"]
+export_cardpack_file: list[str] = ["cards.cardpack", "TCG_cards.cardpack", "OCG_cards.cardpack", "AE_cards.cardpack"] # Card lists with passcodes, read with common.cardpack
+file_export_state: str = "export_state.json" # Inside the output folder, for incremental runs
+jsonfile_setcode_fallbacks: str = "setcode_fallbacks.json" # Setcodes resolved through a fallback form
+folder_skip: list[str] = ['Rush']
+folder_listing: list[str] = ['Binder', 'Gold Binder']
 
 # Methods
-def write_to_log(content: str) -> bool:
+def write_file(filename: str, content: str) -> bool:
     try:
-        Path("logs").mkdir(parents=True, exist_ok=True)
-        filename: str = f"log_{datetime.today().strftime('%Y-%m-%d')}.log"
-        filepath: str = os.path.join("logs", filename)
-        with open(filepath, 'a') as f:
-            f.write(f"{content}\n")
+        with metrics.stage("file_write"), open(filename, 'w', encoding = 'utf8') as f:
+            f.write(content)
         return True
     except Exception as e:
-        #log_err("Error", e)
+        log_err("Error", e)
         return False
 
-def log(content: str):
-    print(f"{content}")
-    write_to_log(content)
-
-def log_err(content: str, err: Exception):
-    to_write: str = f"{content} => {err}"
-    print(to_write)
-    write_to_log(to_write)
-
-def pop_first_line(file: str) -> str:
-    with open(file, 'r+') as f: # open file in read / write mode
-        firstLine = f.readline() # read the first line and throw it out
-        data = f.read() # read the rest
-        f.seek(0) # set the cursor to the top of the file
-        f.write(data) # write the data back
-        f.truncate() # set the file size to the current size
-        return firstLine
-    return ""
+def write_json(filename: str, content: any) -> bool:
+    try:
+        with metrics.stage("json_write"), open(filename, 'w') as f:
+            json.dump(content, f, indent = 4)
+        return True
+    except Exception as e:
+        log_err("Error", e)
+        return False
 
-def write_file(filename: str, content: str) -> bool:
+def format_json_row(row: any) -> str:
+    # json.dumps(row, indent = 4) of a list item. Flat dicts skip the (pure Python) indenting encoder.
+    if type(row) is not dict or not row:
+        return json.dumps(row, indent = 4).replace("\n", "\n    ")
+    items: list[str] = []
+    for key, value in row.items():
+        value_type = type(value)
+        if value_type is str:
+            text = encode_basestring_ascii(value)
+        elif value_type is int or (value_type is float and isfinite(value)):
+            text = repr(value)
+        else:
+            text = json.dumps(value, indent = 4).replace("\n", "\n        ")
+        items.append(f"        {encode_basestring_ascii(str(key))}: {text}")
+    return "{\n" + ",\n".join(items) + "\n    }"
+
+def dump_json_rows(rows: Iterable[any], f: TextIO):
+    # Same output as json.dump(list, indent = 4), without holding all rows in memory
+    separator = "[\n    "
+    for row in rows:
+        f.write(separator)
+        f.write(format_json_row(row))
+        separator = ",\n    "
+    f.write("[]" if separator.startswith("[") else "\n]")
+
+def write_json_rows(filename: str, rows: Iterable[any]) -> bool:
     try:
-        with open(filename, 'w', encoding = 'utf8') as f:
-            f.write(content)
+        with metrics.stage("json_write"), open(filename, 'w') as f:
+            dump_json_rows(rows, f)
         return True
     except Exception as e:
         log_err("Error", e)
         return False
 
-def write_json(filename: str, content: any) -> bool:
+def write_card_pack(filename: str, cards: list[dict[str, any]]) -> bool:
+    # Card pack queried by passcode ('id') or setcode ('set')
     try:
-        with open(filename, 'w') as f:
-            json.dump(content, f, indent = 4)
+        with metrics.stage("cardpack_write", len(cards)):
+            write_cardpack(filename, cards, "id", "set")
         return True
     except Exception as e:
         log_err("Error", e)
@@ -71,303 +141,191 @@ def read_json(filename: str) -> any:
         log_err("Error", e)
         return None
 
-def process_card_list(card_format: str, export_json_file_name: str, jsonfile_card_conf_list: str, jsonfile_cards_with_error: str, export_conf_file: str):
-    # Read from JSON file and request card passcode
-    card_json = read_json(export_json_file_name)
-
-    conf_contents: str = f"#[My Cards {card_format}]\n!My Cards {card_format}\n$whitelist\n"
-    card_conf_list: list[any] = [] # List of all card to be put to conf file.
-    cards_with_error: list[any] = [] # List of all cards with error
-
-    if card_json is not None:
-        log(f"JSON file loaded for {card_format} card list")
-
-        for entry in card_json:
-            card_id: int = 0
-            card_name = str(entry["name"])
-            card_setcode = str(entry["set"])
-            card_qty = int(entry["qty"])
-            card_trade_qty = int(entry["trade_qty"])
-            log(f"\tRequesting passcode for {card_name} with setcode '{card_setcode}'")
-
-            # set filename for json file cache
-            card_setcode = card_setcode.rstrip('r').rstrip('b')
-            jsonfile_setcode: str = os.path.join(folder_setcodes, f"{card_setcode}.json")
-
-            # Write to json file cache, if its not already existing
-            if not os.path.exists(jsonfile_setcode):
-                # GET request to YGOPRODECK API
-                req_object = requests.get(route_setcode.format(card_setcode))
-                #log(f"\tRequest response: {req_object.status_code}")
-
-                if req_object.ok:
-                    temp_object = json.loads(req_object.text)
-                    if "id" in temp_object:
-                        # Write to file
-                        write_file(jsonfile_setcode, req_object.text)
-                        #log(f"\tWrite to cache => {card_setcode}")
-                    else:
-                        cards_with_error.append(entry)
-                        log(f"\tIssue found on saving ({req_object.status_code}) => {card_setcode}")
-                else:
-                    cards_with_error.append(entry)
-                    log(f"\tIssue found on searching ({req_object.status_code}) => {card_setcode}")
-
-                # Toggle variable
-                is_request = True
-            else:
-                log(f"\tUse cached file => {card_setcode}")
-                is_request = False
-            
-            # Sleep for 100 milliseconds, if request is made
-            if is_request:
-                sleep(0.10)
-            
-            #break
-
-            # Read setcode info
-            if os.path.exists(jsonfile_setcode):
-                is_already_exist = False
-                try:
-                    # Measure quantity
-                    total_qty = card_qty
-                    if total_qty <= 0:
-                        total_qty = card_trade_qty
-                    if total_qty > 3:
-                        total_qty = 3
-                    # Read json file from setcode folder
-                    card_json_setcode = read_json(jsonfile_setcode)
-                    card_id = int(card_json_setcode["id"])
-                    card_name = str(card_json_setcode["name"])
-                except Exception as e:
-                    cards_with_error.append(entry)
-                    log_err(f"Issue found on reading => {card_setcode}.json", e)
-                    if os.path.exists(jsonfile_setcode):
-                        os.remove(jsonfile_setcode)
-                
-                try:
-                    # Find item if it already exist, and add quantity
-                    for x in card_conf_list:
-                        if x["id"] and int(x["id"]) == card_id:
-                            is_already_exist = True
-                            x_qty = int(x["qty"]) + total_qty
-                            x_card_id = str(x["id"])
-                            x_cardname = str(x["name"])
-                            x["qty"] = x_qty
-                            log(f"\tCard info updated => [Id: {x_card_id}] [Name: {x_cardname} [Qty: {x_qty}]")
-                            break
-                    
-                    if not is_already_exist:
-                        # Append to list
-                        #log(f"\tCard info => [Id: {card_id}] [Name: {card_name}")
-                        new_card_object = {
-                            "id": card_id,
-                            "name": card_name,
-                            "qty": total_qty
-                        }
-                        card_conf_list.append(new_card_object)
-                    else:
-                        continue
-                except Exception as e:
-                    cards_with_error.append(entry)
-                    log_err(f"\tIssue found on looking up {card_setcode}.json - {card_name}", e)
-                
-        
-        # Dump all cards with combined qty
-        write_json(jsonfile_card_conf_list, card_conf_list)
-
-        for conf_entry in card_conf_list:
-            card_id = int(conf_entry["id"])
-            card_name = str(conf_entry["name"])
-            total_qty = int(conf_entry["qty"])
-            if total_qty > 3:
-                total_qty = 3
-            # Add new line to conf export file.
-            if card_id > 0 and total_qty > 0:
-                conf_contents += f"{card_id} {total_qty} #{card_name}\n"
-
-    # Dump error cards
-    write_json(jsonfile_cards_with_error, cards_with_error)
-
-    # Dump file
-    write_file(export_conf_file, conf_contents)
-
-# Main
-try:
-    # Constants
-    folder_setcodes = "setcodes"
-    folder_outputs = "output"
-    route_setcode = "https://db.ygoprodeck.com/api/v7/cardsetsinfo.php?setcode={0}&includeAliased&num=1&offset=0"
-    route_image = "https://images.ygoprodeck.com/images/cards/{0}.jpg" # card passcode
-    index_folder_name: int = 0
-    index_qty: int = 1
-    index_tradeqty: int = 2
-    index_cardname: int = 3
-    index_set_name: int = 5
-    index_cardnumber: int = 6
-    index_rarity: int = 7
-    index_printing: int = 9
-    index_price_low: int = 13
-    index_price_mid: int = 14
-    index_price_market: int = 15
-    csv_text_encoding: str = "utf-8"
-    price_conversion_php: float = 55.00
-    # Use for array holders
-    index_all: int = 0
-    index_tcg: int = 1
-    index_ocg: int = 2
-    index_ae: int = 3
-
-    # File paths
-    csv_file_name: str = "all-folders-output.csv"
-    csv_file_name_source: str = "all-folders"
-    # Export filepaths
-    export_json_file_name: list[str] = [ 
-        os.path.join(folder_outputs, "cards.json"),
-        os.path.join(folder_outputs, "TCG_cards.json"), 
-        os.path.join(folder_outputs, "OCG_cards.json"),
-        os.path.join(folder_outputs, "AE_cards.json")
-    ]
-    export_conf_file: list[str] = [ 
-        os.path.join(folder_outputs, "MyCards.lflist.conf"),
-        os.path.join(folder_outputs, "MyCards_TCG.lflist.conf"),
-        os.path.join(folder_outputs, "MyCards_OCG.lflist.conf"),
-        os.path.join(folder_outputs, "MyCards_AE.lflist.conf")
-    ]
-    jsonfile_cards_with_error: list[str] = [ 
-        os.path.join(folder_outputs, "cards_error.json"),
-        os.path.join(folder_outputs, "TCG_cards_error.json"),
-        os.path.join(folder_outputs, "OCG_cards_error.json"),
-        os.path.join(folder_outputs, "AE_cards_error.json")
+def normalize_setcode(card_setcode: str) -> str:
+    return str(card_setcode).rstrip('r').rstrip('b')
+
+def split_setcode(card_setcode: str) -> tuple[str, str, str]:
+    # 'LOB-EN001' => ('LOB', 'EN', '001'). None if the setcode does not end with a card number.
+    match = re.fullmatch(r"(.+)-([A-Za-z]*)(\d+)", card_setcode)
+    return match.groups() if match else None
+
+def english_setcode(card_setcode: str) -> str:
+    # 'LOB-DE001' => 'LOB-EN001', 'SDK-E001' => 'SDK-EN001'. The API lists the English prints.
+    parts = split_setcode(card_setcode)
+    if parts is None or parts[1].upper() in ("", "EN"):
+        return ""
+    return f"{parts[0]}-EN{parts[2]}"
+
+def regionless_setcode(card_setcode: str) -> str:
+    # 'LOB-EN001' => 'LOB-001', same as global_setcode. Some sets are listed without region.
+    parts = split_setcode(card_setcode)
+    if parts is None or not parts[1]:
+        return ""
+    return f"{parts[0]}-{parts[2]}"
+
+# Fallback name => other form of a setcode, tried when the setcode does not resolve. Empty if there is none.
+setcode_fallback_forms: dict[str, Callable[[str], str]] = {
+    "region": english_setcode,
+    "global": regionless_setcode
+}
+
+def fallback_rows(passcode_table: dict[str, any], fallbacks: dict[str, tuple[str, str]]) -> list[dict[str, any]]:
+    # Report of the setcodes resolved through a fallback, and the form they resolved as
+    return [
+        { "setcode": card_setcode, "fallback": fallback, "resolved_setcode": resolved_setcode, **passcode_table[card_setcode] }
+        for card_setcode, (fallback, resolved_setcode) in sorted(fallbacks.items()) if passcode_table.get(card_setcode) is not None
     ]
-    jsonfile_card_conf_list: list[str] = [ 
-        os.path.join(folder_outputs, "cards_conf.json"),
-        os.path.join(folder_outputs, "TCG_cards_conf.json"),
-        os.path.join(folder_outputs, "OCG_cards_conf.json"),
-        os.path.join(folder_outputs, "AE_cards_conf.json")
-    ]
-    jsonfile_listings: list[str] = [ 
-        os.path.join(folder_outputs, "listings.json"),
-        os.path.join(folder_outputs, "TCG_listings.json"),
-        os.path.join(folder_outputs, "OCG_listings.json"),
-        os.path.join(folder_outputs, "AE_listings.json")
-    ]
-
-    # Variables
-    card_count: int = 0
-    sep: str = ","
-    folder_skip: list[str] = ['Rush']
-    folder_listing: list[str] = ['Binder', 'Gold Binder']
-
-    cards: list[any] = [] # List of all cards from Imported csv file
-    cards_tcg: list[any] = [] # TCG-only list
-    cards_ocg: list[any] = [] # OCG and AE List
-    cards_ae: list[any] = [] # AE-only List
-    card_listings: list[any] = [] # List of card listings with rarity. For shop use.
-
-    # Dynamic variables for local use
-    jsonfile_setcode: str = ""
-    card_setcode: str = ""
-    card_setname: str = ""
-    card_rarity: str = ""
-    card_printing: str = ""
-    card_format: str = "TCG"
-    row_card_name: str = ""
-    card_folder_name: str = ""
-    contents_decode: str = ""
-    card_qty: int = 0
-    card_setcode_split: any = None
-    card_json: any = None
-    card_json_setcode: any = None
-    req_object: any = None
-    temp_object: any = None
-    is_request: bool = False
-    is_ocg: bool = False
-    is_ae: bool = False
-    is_tcg: bool = False
-
-    # Create necessary folders
-    Path(folder_setcodes).mkdir(parents=True, exist_ok=True)
-    Path(folder_outputs).mkdir(parents=True, exist_ok=True)
-
-    # Ask for export file
-    #csv_file_name = input("DragonShield export file name => ")
-
-    # Verify file
-    if not csv_file_name_source.endswith(".csv"):
-        csv_file_name_source += ".csv"
-
-    #csv_file_name = os.path.join(".", csv_file_name_source)
-    log(f"DragonShield Export File => {csv_file_name_source}")
-
-    if not os.path.exists(csv_file_name_source):
-        log(f"Invalid file => {csv_file_name_source}")
-        raise Exception("File not found")
-
-    # Convert csv encoding from 'utf-16-le' to 'utf-8'
-    try:
-        with open(csv_file_name_source, "r", encoding = "utf-8") as sourceFile:
-            log("Opening source file..")
-            with open(csv_file_name, "w", encoding = csv_text_encoding) as targetFile:
-                log("Reading source file..")
-                contents = sourceFile.read()
-                log("Saving output file..")
-                targetFile.write(contents)
-                log("Saving output file..Done!")
 
-    except Exception as e:
-        log_err("CSV Encoding error", e)
-        raise Exception("CSV Encoding error")
-
-    # Get delimeter from csv file
-    try:
-        #csv_contents: str = ""
-        remove_first_row: bool = False
-        with open(csv_file_name, 'rt', encoding = csv_text_encoding) as f:
-            first_line = f.readline().strip('\n').strip().strip('"')
-            log(f"First line => {str(first_line)}")
-            
-            first_line_split = first_line.split("=")
-            log(f"First line split => {str(first_line_split)}")
-
-            if len(first_line_split) > 1:
-                first_line_right = str(first_line_split[1])
-                sep = first_line_right.replace("\"", "").strip()
-                log(f"Separator => {sep}")
-
-                remove_first_row = True
-
-        #Remove first line
-        if remove_first_row:
-            pop_first_line(csv_file_name)
-            log("Removed first row for separator")
-
-    except Exception as e:
-        sep = ","
-        log_err("CSV delimeter error", e)
-        raise Exception("CSV Delimeter error")
-
-    # Read CSV file
-    try:
-        with open(csv_file_name, 'rt', encoding = csv_text_encoding, newline='') as csv_file:
-            csv_reader = csv.reader(csv_file, delimiter=sep)
-            #csv_reader = csv.DictReader(csv_file)
-            line_count: int = -1
-
-            headers = next(csv_reader)
-            log(f"Headers => {str(headers)}")
-            for row in csv_reader:
-                line_count = line_count + 1
-                if line_count < 0:
-                    log(f"L{line_count}; empty line => {str(row)}")
-                #elif line_count == 1:
-                #    log(f'Column names are {", ".join(row)}')
-                else:
+def selected_format_indexes(formats: list[str]) -> list[int]:
+    # Array holder indexes of the formats to write, from card_format_keys
+    return [index for index, key in enumerate(card_format_keys) if key in formats]
+
+def card_format_indexes(card_format: str) -> list[int]:
+    # Output lists a card belongs to, based on its format
+    if card_format == "AE":
+        return [index_all, index_ocg, index_ae]
+    elif card_format == "OCG":
+        return [index_all, index_ocg]
+    return [index_all, index_tcg]
+
+class CsvFileError(Exception):
+    """The DragonShield export could not be read: bad encoding, or rows missing columns."""
+
+class ExportConfig:
+    """Settings of one export. Any attribute can be set as keyword argument."""
+
+    def __init__(self, **kwargs):
+        self.input_file: str = "all-folders.csv" # DragonShield export
+        self.folder_outputs: str = "output"
+        self.formats: list[str] = list(card_format_keys) # Outputs to write, from card_format_keys
+        self.csv_text_encoding: str = "" # Detect from file (utf-8 or utf-16), if empty
+        self.is_incremental: bool = False # Only rewrite outputs whose rows changed since the last incremental run into the same output folder
+        self.is_write_cardpack: bool = False # Also write each card list, with passcodes, as a compact memory-mapped card pack
+        self.listing_currencies: dict[str, float] = { "PHP": 55.00 } # Currency code => rate from USD. Listing prices use the first, others go to 'prices'.
+        self.listing_markup_rules: list[MarkupRule] = [] # First matching rule adjusts the USD price, before conversion
+        self.folder_setcodes: str = "setcodes" # Old cache layout, migrated to the cache file
+        self.file_setcode_cache: str = "setcodes.db"
+        self.setcode_cache_ttl_days: float = 30.0 # Re-request cached setcodes older than this. 0 to never expire.
+        self.setcode_negative_ttl_days: float = 7.0 # Setcodes the API has no card for are not requested again for this long. 0 to always request.
+        self.setcode_fallbacks: list[str] = list(setcode_fallback_forms) # Forms tried in order for setcodes that do not resolve, from setcode_fallback_forms
+        self.is_cache_only: bool = False # Never request setcodes, report setcodes missing from the cache as errors
+        self.route_api: str = os.environ.get("YGOPRODECK_API", "https://db.ygoprodeck.com/api/v7") # Override to use a local stand-in server
+        self.route_image: str = os.environ.get("YGOPRODECK_IMAGES", "https://images.ygoprodeck.com/images/cards/{0}.jpg") # card passcode
+        self.is_mirror_images: bool = False # Download the image of every resolved card into folder_images
+        self.folder_images: str = "images"
+        self.image_max_workers: int = 8 # concurrent image downloads
+        self.image_thumbnail_size: int = 0 # Longest thumbnail side in pixels (needs Pillow). 0 for no thumbnails.
+        self.is_prefetch_database: bool = False # Resolve setcodes from a full card database dump, instead of one request per setcode
+        self.file_card_database: str = "cardinfo.json"
+        self.card_database_refresh_days: float = 7.0 # Download dump again if older than this
+        self.resolver_max_workers: int = 8 # concurrent setcode requests
+        self.resolver_rate_limit: float = 15.0 # max setcode requests per second
+        self.resolver_retries: int = 3 # retries on 429/5xx responses
+        self.file_http_cache: str = "http_cache.db" # API responses kept between runs, per Cache-Control/ETag. Empty to skip.
+        self.http_cache_max_mb: float = 64.0 # Least recently used responses are evicted past this size
+        self.http_connect_timeout: float = 10.0 # seconds
+        self.http_read_timeout: float = 15.0 # seconds
+        self.file_metrics: str = os.environ.get("METRICS_FILE", "") # Write run metrics here ('.jsonl' appends one line per run). Empty to skip.
+        self.log_level: int = INFO # DEBUG to log every card
+        for key, value in kwargs.items():
+            if not hasattr(self, key):
+                raise ValueError(f"Unknown export setting => {key}")
+            setattr(self, key, value)
+
+    @property
+    def route_setcode(self) -> str:
+        return self.route_api + "/cardsetsinfo.php?setcode={0}&includeAliased&num=1&offset=0"
+
+    @property
+    def route_card_database(self) -> str:
+        return f"{self.route_api}/cardinfo.php"
+
+    @property
+    def format_indexes(self) -> list[int]:
+        return selected_format_indexes(self.formats)
+
+class Exporter:
+    """Convert DragonShield exports. The setcode cache, HTTP client, resolver and card database are opened on first use and kept between exports.
+    Exports can run from several threads, setcode resolving is serialized."""
+
+    def __init__(self, config: ExportConfig):
+        self.config = config
+        self.lock = threading.Lock() # Guards everything below
+        self.setcode_cache: SetcodeCache = None
+        self.http_client = None
+        self.setcode_resolver = None
+        self.card_database = None
+        self.passcode_map: dict[str, dict] = None # Setcode cache, kept in memory after first load
+        self.stale_setcodes: set[str] = set()
+        self.failed_setcodes: dict[str, float] = {} # Setcode => time the API had no card for it
+        self.database_index: dict[str, dict] = None
+
+    def open_cache(self) -> SetcodeCache:
+        # Open setcode cache, and import old cache files once
+        if self.setcode_cache is None:
+            config = self.config
+            self.setcode_cache = SetcodeCache(config.file_setcode_cache, config.setcode_cache_ttl_days, config.setcode_negative_ttl_days)
+            migrated_count, migrate_failed = self.setcode_cache.migrate_folder(config.folder_setcodes)
+            if migrated_count > 0:
+                log(f"Migrated {migrated_count} setcodes from '{config.folder_setcodes}' to '{config.file_setcode_cache}'")
+            for item in migrate_failed:
+                log(f"Issue found on migrating => {item}")
+        return self.setcode_cache
+
+    def open_client(self):
+        # One pooled client for every API request, with the response cache if enabled
+        if self.http_client is None:
+            from common.httpclient import HttpClient, ResponseCache
+            config = self.config
+            response_cache = ResponseCache(config.file_http_cache, int(config.http_cache_max_mb * 1024 * 1024)) if config.file_http_cache else None
+            self.http_client = HttpClient(pool_maxsize = max(config.resolver_max_workers, config.image_max_workers), connect_timeout = config.http_connect_timeout,
+                                          read_timeout = config.http_read_timeout, cache = response_cache)
+        return self.http_client
+
+    def open_resolver(self):
+        if self.setcode_resolver is None:
+            from .resolver import SetcodeResolver
+            config = self.config
+            self.setcode_resolver = SetcodeResolver(config.route_setcode, max_workers = config.resolver_max_workers, rate = config.resolver_rate_limit,
+                                                    retries = config.resolver_retries, timeout = config.http_read_timeout, client = self.open_client())
+        return self.setcode_resolver
+
+    def close(self):
+        with self.lock:
+            if self.setcode_resolver is not None:
+                self.setcode_resolver.close()
+                self.setcode_resolver = None
+            if self.http_client is not None:
+                self.http_client.close()
+                self.http_client = None
+                self.card_database = None # Holds the closed client
+            if self.setcode_cache is not None:
+                self.setcode_cache.close()
+                self.setcode_cache = None
+
+    def read_cards(self, csv_file_name_source: str, row_hashes: list[str] = None) -> tuple[CardTable, list[CardView], CardView]:
+        # Read CSV file, streaming rows from the export into one card table.
+        # Returns the table, views of the card lists (same order as array holders) and the listings view.
+        # Content hash of every row is added to row_hashes, if given.
+        card_table = CardTable()
+        card_lists: list[CardView] = [CardView(card_table) for _ in card_format_names] # All cards, TCG-only, OCG and AE, AE-only
+        card_listings = CardView(card_table) # Card listings with rarity. For shop use.
+        is_tcg: bool = False
+
+        try:
+            log(f"CSV encoding => {self.config.csv_text_encoding or detect_encoding(csv_file_name_source)}")
+            csv_started = perf_counter()
+            with closing(read_csv_rows(csv_file_name_source, self.config.csv_text_encoding)) as csv_reader:
+                line_count: int = -1
+
+                headers = next(csv_reader)
+                log(f"Headers => {str(headers)}")
+                for row in csv_reader:
+                    line_count = line_count + 1
                     card_folder_name = str(row[index_folder_name])
                     row_card_name = str(row[index_cardname])
                     is_ae = card_folder_name.strip().startswith("AE")
                     is_ocg = card_folder_name.strip().startswith("OCG")
-                    card_format = "OCG" if is_ocg else "TCG"
                     if is_ae:
                         card_format = "AE"
                     elif is_ocg:
@@ -375,101 +333,597 @@ try:
                     else:
                         is_tcg = True
                         card_format = "TCG"
-                    
-                    log(f"\tL{line_count}; Processing {row_card_name} with cardset '{row[index_cardnumber]}'")
-                    card_count += 1
-                    # Initialize new card object
+
+                    log_debug(f"\tL{line_count}; Processing {row_card_name} with cardset '{row[index_cardnumber]}'")
+                    if row_hashes is not None:
+                        row_hashes.append(hash_row(row))
                     card_setcode = str(row[index_cardnumber])
-                    card_setname = str(row[index_set_name])
-                    card_setcode_split = card_setcode.split('-')
                     card_rarity = str(row[index_rarity])
-                    card_printing = str(row[index_printing])
-                    card_qty = int(row[index_qty])
-                    new_card_object = {
-                        "name": row_card_name,
-                        "set": card_setcode,
-                        "set_global": f"{ card_setcode_split[0] }-{ str(card_setcode_split[1])[2:] }",
-                        "qty": card_qty,
-                        "trade_qty": int(row[index_tradeqty]),
-                        "format": card_format
-                    }
+                    global_setcode(card_setcode) # Reject setcodes without region part here, not while writing
+                    # Prices are only read for listed cards
+                    is_listing: bool = is_tcg and card_rarity != "Common" # Check condition for listing
+                    #is_listing = card_folder_name in folder_listing
+                    prices: tuple[float, float, float] = (
+                        parse_price(row[index_price_low]),
+                        parse_price(row[index_price_mid]),
+                        parse_price(row[index_price_market])
+                    ) if is_listing else ()
+                    card_index = card_table.append(
+                        row_card_name, card_setcode, str(row[index_set_name]), card_rarity, str(row[index_printing]), card_format,
+                        int(row[index_qty]), int(row[index_tradeqty]), *prices
+                    )
+
                     if card_folder_name not in folder_skip:
-                        cards.append(new_card_object)
+                        card_lists[index_all].append(card_index)
                         if is_ocg:
-                            cards_ocg.append(new_card_object)
+                            card_lists[index_ocg].append(card_index)
                         elif is_ae:
-                            cards_ocg.append(new_card_object)
-                            cards_ae.append(new_card_object)
+                            card_lists[index_ocg].append(card_index)
+                            card_lists[index_ae].append(card_index)
                         else:
-                            cards_tcg.append(new_card_object)
+                            card_lists[index_tcg].append(card_index)
 
                     # Add to listings
-                    #if card_folder_name in folder_listing: # Check condition for listing
-                    if is_tcg and card_rarity != "Common": # Check condition for listing
-                        price_low: float = round(float(row[index_price_low]) * price_conversion_php, 2) if row[index_price_low] else 0
-                        price_mid: float = round(float(row[index_price_mid]) * price_conversion_php, 2) if row[index_price_mid] else 0
-                        price_market: float = round(float(row[index_price_market]) * price_conversion_php, 2) if row[index_price_market] else 0
-                        new_obj_listing = {
-                        "name": f"Yu-Gi-Oh! { card_format } { row_card_name } ({ card_setcode } { card_rarity })",
-                        "qty": card_qty,
-                        "desc": f"""Yugioh { card_format } card
-                            Name: { row_card_name }
-                            Set: { card_setname }
-                            Edition: { card_printing }
-                            Condition: Near Mint
-
-                            (Price based on yugiohprices.com)""".replace('                        ', ''), # looks ugly but necessary to prevent useless whitespaces.
-                        
-                        "price_low": price_low,
-                        "price_mid": price_mid,
-                        "price_market": index_price_market,
-                        "rarity" : card_rarity
-                        }
-                        # Add to list
-                        card_listings.append(new_obj_listing)
-
-    except Exception as e:
-        log_err("CSV file error", e)
-        raise Exception("CSV File error")
-        
-    log(f"Processed {card_count} cards.")
-
-    # Process All cards OCG/TCG
-    write_json(export_json_file_name[index_all], cards)
-    log(f"Exported OCG/TCG card list.")
-
-    write_json(jsonfile_listings[index_all], card_listings)
-    log(f"Exported OCG/TCG listings.")
-
-    process_card_list("OCG/TCG", export_json_file_name[index_all], jsonfile_card_conf_list[index_all], jsonfile_cards_with_error[index_all], export_conf_file[index_all])
-
-    #"""
-    # Process OCG cards
-    write_json(export_json_file_name[index_ocg], cards_ocg)
-    log(f"Exported OCG card list.")
-
-    process_card_list("OCG", export_json_file_name[index_ocg], jsonfile_card_conf_list[index_ocg], jsonfile_cards_with_error[index_ocg], export_conf_file[index_ocg])
-    #"""
-
-    #"""
-    # Process AE cards
-    write_json(export_json_file_name[index_ae], cards_ae)
-    log(f"Exported AE card list.")
-
-    process_card_list("AE", export_json_file_name[index_ae], jsonfile_card_conf_list[index_ae], jsonfile_cards_with_error[index_ae], export_conf_file[index_ae])
-    #"""
+                    if is_listing:
+                        card_listings.append(card_index)
+
+        except Exception as e:
+            log_err("CSV file error", e)
+            raise CsvFileError("CSV File error")
+
+        metrics.add_time("csv_parse", perf_counter() - csv_started, len(card_table))
+        metrics.count("csv_rows", len(card_table))
+        log(f"Processed {len(card_table)} cards.")
+        return card_table, card_lists, card_listings
+
+    def load_card_database(self) -> dict[str, dict]:
+        # Download full card database if needed, and index it by setcode
+        config = self.config
+        if self.card_database is None:
+            from .carddb import CardDatabase
+            self.card_database = CardDatabase(config.route_card_database, config.file_card_database, config.card_database_refresh_days, client = self.open_client())
+        card_database = self.card_database
+
+        if not config.is_cache_only:
+            try:
+                with metrics.stage("card_database_fetch"):
+                    is_downloaded = card_database.refresh()
+                if is_downloaded:
+                    log(f"Downloaded card database => {card_database.filename}")
+                else:
+                    log(f"Use cached card database ({card_database.age_days():.1f} days old) => {card_database.filename}")
+            except Exception as e:
+                log_err("Issue found on downloading card database", e)
+
+        try:
+            with metrics.stage("card_database_load"):
+                database_index = card_database.load_index()
+            log(f"Indexed {len(database_index)} setcodes from card database.")
+            return database_index
+        except Exception as e:
+            log_err("Issue found on reading card database", e)
+            return {}
+
+    def resolve_setcodes(self, setcodes: Iterable[str], fallbacks: dict[str, tuple[str, str]] = None) -> dict[str, any]:
+        # Build passcode table for every unique setcode of the cards.
+        # Each setcode maps to {"id", "name"}, or None if it could not be resolved.
+        # Setcodes resolved through a fallback are added to 'fallbacks', as setcode => (fallback name, setcode it resolved as).
+        with self.lock:
+            return self.resolve_setcodes_locked(setcodes, fallbacks)
+
+    def resolve_setcodes_locked(self, setcodes: Iterable[str], fallbacks: dict[str, tuple[str, str]] = None) -> dict[str, any]:
+        passcode_table: dict[str, any] = self.lookup_setcodes(list(dict.fromkeys(map(normalize_setcode, setcodes))))
+
+        # Other forms of the setcodes that did not resolve, one fallback after the other
+        for fallback in self.config.setcode_fallbacks:
+            fallback_form = setcode_fallback_forms[fallback]
+            candidates: dict[str, str] = {}
+            for card_setcode, card_info in passcode_table.items():
+                if card_info is None:
+                    candidate = fallback_form(card_setcode)
+                    if candidate:
+                        candidates[card_setcode] = candidate
+            if not candidates:
+                continue
+            resolved = self.lookup_setcodes(list(dict.fromkeys(candidates.values())))
+            resolved_count: int = 0
+            for card_setcode, candidate in candidates.items():
+                if resolved[candidate] is not None:
+                    passcode_table[card_setcode] = resolved[candidate]
+                    resolved_count += 1
+                    if fallbacks is not None:
+                        fallbacks[card_setcode] = (fallback, candidate)
+            metrics.count(f"setcode_fallback.{fallback}", resolved_count)
+            log(f"Resolved {resolved_count} of {len(candidates)} setcodes by their {fallback} form.")
+
+        return passcode_table
+
+    def is_failed(self, card_setcode: str) -> bool:
+        # The API had no card for the setcode, within the negative TTL
+        failed_at = self.failed_setcodes.get(card_setcode)
+        ttl_days: float = self.config.setcode_negative_ttl_days
+        return failed_at is not None and ttl_days > 0 and time() - failed_at <= ttl_days * 86400
+
+    def is_retryable(self, card_setcode: str) -> bool:
+        # Unresolved setcode that is worth requesting again: the setcode or one of its fallback forms is not known to fail
+        forms: list[str] = [card_setcode] + [setcode_fallback_forms[x](card_setcode) for x in self.config.setcode_fallbacks]
+        return any(x and not self.is_failed(x) for x in forms)
+
+    def lookup_setcodes(self, setcodes: list[str]) -> dict[str, any]:
+        # Passcodes of unique setcodes, from the cache, the card database dump or requested. None if not found.
+        config = self.config
+        setcode_cache = self.open_cache()
+        passcode_table: dict[str, any] = {}
+        pending_setcodes: list[str] = []
+        failed_count: int = 0
+
+        # Load whole cache in one read, once per exporter
+        if self.passcode_map is None:
+            with metrics.stage("cache_load"):
+                self.passcode_map, self.stale_setcodes = setcode_cache.load_all()
+                self.failed_setcodes = setcode_cache.load_failures()
+            log(f"Loaded {len(self.passcode_map)} cached setcodes, {len(self.failed_setcodes)} failed setcodes.")
+        cached_setcodes: dict[str, dict] = self.passcode_map
+        stale_setcodes: set[str] = self.stale_setcodes
+
+        # Index from full card database dump, if enabled
+        if self.database_index is None:
+            self.database_index = self.load_card_database() if config.is_prefetch_database else {}
+        database_index: dict[str, dict] = self.database_index
+
+        for card_setcode in setcodes:
+            passcode_table[card_setcode] = cached_setcodes.get(card_setcode)
+            is_cached: bool = passcode_table[card_setcode] is not None and card_setcode not in stale_setcodes
+            metrics.cache("setcode_cache", is_cached)
+            if not is_cached:
+                if config.is_prefetch_database:
+                    metrics.cache("card_database", card_setcode in database_index)
+                if card_setcode in database_index:
+                    passcode_table[card_setcode] = database_index[card_setcode]
+                elif self.is_failed(card_setcode):
+                    # Known to fail, not requested again until the negative TTL passes
+                    failed_count += 1
+                else:
+                    pending_setcodes.append(card_setcode)
+
+        if failed_count > 0:
+            metrics.count("setcode_request.skipped_failed", failed_count)
+            log(f"Skipped requesting {failed_count} setcodes that failed within {config.setcode_negative_ttl_days:g} days.")
+
+        if pending_setcodes and config.is_cache_only:
+            log(f"Cache-only run, skipped requesting {len(pending_setcodes)} setcodes.")
+            pending_setcodes = []
+
+        # Request remaining setcodes concurrently
+        if pending_setcodes:
+            log(f"Requesting passcodes for {len(pending_setcodes)} setcodes..")
+            with metrics.stage("http_fetch", len(pending_setcodes)):
+                resolved = self.open_resolver().resolve_all(pending_setcodes)
+            new_entries: dict[str, any] = {}
+            new_failures: dict[str, int] = {}
+            for card_setcode, result in resolved.items():
+                metrics.count("setcode_request.ok" if result.ok else "setcode_request.failed")
+                if result.ok:
+                    new_entries[card_setcode] = result.data
+                    passcode_table[card_setcode] = {
+                        "id": int(result.data["id"]),
+                        "name": str(result.data["name"])
+                    }
+                    cached_setcodes[card_setcode] = passcode_table[card_setcode]
+                    stale_setcodes.discard(card_setcode)
+                    self.failed_setcodes.pop(card_setcode, None)
+                    continue
+                elif result.error is not None:
+                    log_err(f"\tIssue found on searching => {card_setcode}", result.error)
+                elif 200 <= result.status_code < 300:
+                    log(f"\tIssue found on saving ({result.status_code}) => {card_setcode}")
+                else:
+                    log(f"\tIssue found on searching ({result.status_code}) => {card_setcode}")
+                # Remember setcodes the API has no card for. Network errors and 429/5xx are requested again next run.
+                if result.is_missing:
+                    new_failures[card_setcode] = result.status_code
+                    self.failed_setcodes[card_setcode] = time()
+                # Keep stale entry, if request failed
+                if passcode_table[card_setcode] is not None:
+                    log(f"\tUse stale cache => {card_setcode}")
+
+            # Write to cache
+            try:
+                with metrics.stage("cache_write", len(new_entries)):
+                    setcode_cache.insert_many(new_entries)
+                    setcode_cache.insert_failures(new_failures)
+            except Exception as e:
+                log_err("Issue found on saving setcode cache", e)
+
+        return passcode_table
+
+    def mirror_images(self, passcodes: Iterable[dict]) -> dict[str, int]:
+        # Mirror the image of every resolved card. Returns counts per outcome.
+        from common.imagemirror import ImageMirror
+        config = self.config
+        image_urls: list[str] = list(dict.fromkeys(config.route_image.format(x["id"]) for x in passcodes if x is not None))
+        with self.lock:
+            image_mirror = ImageMirror(config.folder_images, self.open_client(), max_workers = config.image_max_workers, thumbnail_size = config.image_thumbnail_size)
+            with metrics.stage("image_mirror", len(image_urls)):
+                result = image_mirror.mirror(image_urls)
+        log(f"Mirrored {len(image_urls)} card images => {result}")
+        return result
+
+    def process_card_list(self, card_list: CardView, passcode_table: dict[str, any], folder_outputs: str, selected_indexes: list[int]):
+        # Derive conf, conf json and error json for every selected format in a single pass
+        card_table: CardTable = card_list.table
+        card_conf_lists: list[CardQtyAggregator] = [CardQtyAggregator() for _ in card_format_names] # List of all card to be put to conf file.
+        cards_with_error: list[CardView] = [CardView(card_table) for _ in card_format_names] # List of all cards with error
+        aggregate_started = perf_counter()
+
+        for card_index in card_list:
+            card_setcode = normalize_setcode(card_table.setcodes[card_index])
+            format_indexes = [index for index in card_format_indexes(card_table.formats[card_index]) if index in selected_indexes]
+            card_info = passcode_table.get(card_setcode)
+
+            if card_info is None:
+                for index in format_indexes:
+                    cards_with_error[index].append(card_index)
+                continue
+
+            # Measure quantity
+            total_qty = card_table.qtys[card_index]
+            if total_qty <= 0:
+                total_qty = card_table.trade_qtys[card_index]
+            if total_qty > 3:
+                total_qty = 3
+            card_id: int = card_info["id"]
+            card_name: str = card_info["name"]
 
-    #"""
-    # Process TCG cards
-    write_json(export_json_file_name[index_tcg], cards_tcg)
-    log(f"Exported TCG card list.")
+            for index in format_indexes:
+                try:
+                    # Add card, or add quantity if it already exist
+                    card_object, is_already_exist = card_conf_lists[index].add(card_id, card_name, total_qty)
+                    if is_already_exist:
+                        log_debug(f"\tCard info updated => [Id: {card_object['id']}] [Name: {card_object['name']} [Qty: {card_object['qty']}]")
+                except Exception as e:
+                    cards_with_error[index].append(card_index)
+                    log_err(f"\tIssue found on looking up {card_setcode}.json - {card_name}", e)
 
-    write_json(jsonfile_listings[index_tcg], card_listings)
-    log(f"Exported TCG listings.")
+        metrics.add_time("aggregate", perf_counter() - aggregate_started, len(card_list))
+
+        for index in selected_indexes:
+            card_format = card_format_names[index]
+            conf_contents: str = f"#[My Cards {card_format}]\n!My Cards {card_format}\n$whitelist\n"
+            card_conf_list: list[any] = card_conf_lists[index].to_list()
+            for conf_entry in card_conf_list:
+                card_id = int(conf_entry["id"])
+                card_name = str(conf_entry["name"])
+                total_qty = int(conf_entry["qty"])
+                if total_qty > 3:
+                    total_qty = 3
+                # Add new line to conf export file.
+                if card_id > 0 and total_qty > 0:
+                    conf_contents += f"{card_id} {total_qty} #{card_name}\n"
+
+            # Dump all cards with combined qty
+            write_json(os.path.join(folder_outputs, jsonfile_card_conf_list[index]), card_conf_list)
+            # Dump error cards
+            write_json_rows(os.path.join(folder_outputs, jsonfile_cards_with_error[index]), cards_with_error[index].cards())
+            # Dump file
+            write_file(os.path.join(folder_outputs, export_conf_file[index]), conf_contents)
+            log(f"Exported {card_format} conf file.")
+
+    def resolved_cards(self, card_list: CardView, passcode_table: dict[str, any]) -> list[dict[str, any]]:
+        # Card objects, with the passcode ('id') of the resolved ones
+        card_table: CardTable = card_list.table
+        cards: list[dict[str, any]] = []
+        for card_index in card_list:
+            card = card_table.card(card_index)
+            card_info = passcode_table.get(normalize_setcode(card_table.setcodes[card_index]))
+            if card_info is not None:
+                card["id"] = card_info["id"]
+            cards.append(card)
+        return cards
+
+    def export_listings(self, card_listings: CardView, filenames: list[str]):
+        # Convert prices of all listings in one batch, and render the listings once for every file
+        if not filenames:
+            return
+        pricer = ListingPricer(self.config.listing_currencies, self.config.listing_markup_rules)
+        with metrics.stage("listings", len(card_listings)):
+            contents = io.StringIO()
+            dump_json_rows(card_listings.listings(pricer), contents)
+        for filename in filenames:
+            write_file(filename, contents.getvalue())
+        log(f"Exported listings.")
+
+    def export(self, input_file: str = "", folder_outputs: str = "", formats: list[str] = None) -> dict[str, any]:
+        # Convert an export into an output folder, returns counts of the run.
+        # Arguments default to the config.
+        config = self.config
+        csv_file_name_source: str = input_file or config.input_file
+        folder_outputs = folder_outputs or config.folder_outputs
+        format_indexes: list[int] = selected_format_indexes(config.formats if formats is None else formats)
+
+        # Verify file
+        if not csv_file_name_source.endswith(".csv") and not os.path.exists(csv_file_name_source):
+            csv_file_name_source += ".csv"
+        log(f"DragonShield Export File => {csv_file_name_source}")
+
+        if not os.path.exists(csv_file_name_source):
+            log(f"Invalid file => {csv_file_name_source}")
+            raise Exception("File not found")
+
+        # Create necessary folders
+        Path(folder_outputs).mkdir(parents=True, exist_ok=True)
+
+        export_state = ExportState(os.path.join(folder_outputs, file_export_state))
+        if not config.is_incremental:
+            # Outputs are rewritten, so the state of an earlier incremental run no longer applies
+            export_state.clear()
+            return self.export_full(csv_file_name_source, folder_outputs, format_indexes)
+        return self.export_incremental(csv_file_name_source, folder_outputs, format_indexes, export_state)
+
+    def export_full(self, csv_file_name_source: str, folder_outputs: str, format_indexes: list[int]) -> dict[str, any]:
+        card_table, card_lists, card_listings = self.read_cards(csv_file_name_source)
+        cards: CardView = card_lists[index_all]
+
+        # Export card lists
+        for index in format_indexes:
+            write_json_rows(os.path.join(folder_outputs, export_json_file_name[index]), card_lists[index].cards())
+        log(f"Exported card lists.")
+
+        self.export_listings(card_listings, [os.path.join(folder_outputs, jsonfile_listings[x]) for x in [index_all, index_tcg] if x in format_indexes])
+
+        # Resolve each unique setcode once, then derive all outputs
+        fallbacks: dict[str, tuple[str, str]] = {}
+        passcode_table = self.resolve_setcodes((card_table.setcodes[x] for x in cards), fallbacks)
+        resolved_count: int = sum(1 for x in passcode_table.values() if x is not None)
+        log(f"Resolved {resolved_count} of {len(passcode_table)} setcodes.")
+
+        self.process_card_list(cards, passcode_table, folder_outputs, format_indexes)
+        write_json_rows(os.path.join(folder_outputs, jsonfile_setcode_fallbacks), fallback_rows(passcode_table, fallbacks))
+        if self.config.is_write_cardpack:
+            for index in format_indexes:
+                write_card_pack(os.path.join(folder_outputs, export_cardpack_file[index]), self.resolved_cards(card_lists[index], passcode_table))
+            log(f"Exported card packs.")
+
+        summary: dict[str, any] = {
+            "input_file": csv_file_name_source,
+            "folder_outputs": folder_outputs,
+            "cards": len(cards),
+            "listings": len(card_listings),
+            "setcodes": len(passcode_table),
+            "setcodes_resolved": resolved_count,
+            "setcodes_fallback": dict(Counter(x[0] for x in fallbacks.values()))
+        }
+        if self.config.is_mirror_images:
+            summary["images"] = self.mirror_images(passcode_table.values())
+        return summary
+
+    def settings_hash(self, format_indexes: list[int]) -> str:
+        # Settings that change output contents
+        config = self.config
+        return signature(
+            [str(x) for x in format_indexes],
+            [f"{code}={rate!r}" for code, rate in config.listing_currencies.items()],
+            [repr(vars(x)) for x in config.listing_markup_rules],
+            [config.csv_text_encoding],
+            config.setcode_fallbacks,
+            [str(config.is_write_cardpack)]
+        )
+
+    def export_incremental(self, csv_file_name_source: str, folder_outputs: str, format_indexes: list[int], export_state: ExportState) -> dict[str, any]:
+        # Compare rows with the last export into the same folder.
+        # Only outputs built from changed rows are written, and only new setcodes are resolved.
+        is_state_loaded = export_state.load()
+        file_hash = hash_file(csv_file_name_source)
+        settings_hash = self.settings_hash(format_indexes)
+        if is_state_loaded and export_state.retry_count > 0:
+            log(f"{export_state.retry_count} setcodes were left unresolved on last export, requesting them again.")
+        elif is_state_loaded and export_state.file_hash == file_hash and export_state.settings_hash == settings_hash \
+            and all(os.path.exists(os.path.join(folder_outputs, x)) for x in export_state.outputs):
+            log(f"No changes since last export, kept {len(export_state.outputs)} outputs.")
+            metrics.count("delta.outputs_kept", len(export_state.outputs))
+            summary = dict(export_state.summary, input_file = csv_file_name_source, folder_outputs = folder_outputs)
+            if self.config.is_mirror_images:
+                # Finishes an interrupted mirror, known images are only revalidated
+                summary["images"] = self.mirror_images(export_state.passcodes.values())
+            return summary
+
+        row_hashes: list[str] = []
+        card_table, card_lists, card_listings = self.read_cards(csv_file_name_source, row_hashes)
+        cards: CardView = card_lists[index_all]
+        if is_state_loaded:
+            rows_added, rows_removed = export_state.diff_rows(row_hashes)
+            log(f"Rows changed since last export => {rows_added} added, {rows_removed} removed")
+            metrics.count("delta.rows_added", rows_added)
+            metrics.count("delta.rows_removed", rows_removed)
+        else:
+            log(f"No previous export state, writing all outputs.")
+
+        # Setcodes resolved on the last export are reused, the rest are resolved as usual.
+        # Setcodes resolved through a fallback that is no longer enabled are resolved again.
+        known_passcodes: dict[str, dict] = export_state.passcodes if is_state_loaded else {}
+        known_fallbacks: dict[str, list[str]] = export_state.fallbacks if is_state_loaded else {}
+        normalized_setcodes: list[str] = [normalize_setcode(x) for x in card_table.setcodes]
+        passcode_table: dict[str, any] = {}
+        fallbacks: dict[str, tuple[str, str]] = {}
+        for card_index in cards:
+            card_setcode = normalized_setcodes[card_index]
+            if card_setcode in known_passcodes and card_setcode not in passcode_table:
+                if card_setcode in known_fallbacks:
+                    fallback, resolved_setcode = known_fallbacks[card_setcode]
+                    if fallback not in self.config.setcode_fallbacks:
+                        continue
+                    fallbacks[card_setcode] = (fallback, resolved_setcode)
+                passcode_table[card_setcode] = known_passcodes[card_setcode]
+        passcode_table.update(self.resolve_setcodes((card_table.setcodes[x] for x in cards if normalized_setcodes[x] not in passcode_table), fallbacks))
+        resolved_count: int = sum(1 for x in passcode_table.values() if x is not None)
+        retry_count: int = sum(1 for k, v in passcode_table.items() if v is None and self.is_retryable(k))
+        log(f"Resolved {resolved_count} of {len(passcode_table)} setcodes.")
+
+        outputs: dict[str, str] = {}
+        outputs_kept: int = 0
+        def is_current(file_names: list[str], output_signature: str) -> bool:
+            for file_name in file_names:
+                outputs[file_name] = output_signature
+            return is_state_loaded and all(export_state.is_output_current(folder_outputs, x, output_signature) for x in file_names)
+
+        # Card lists, built from the rows of their view
+        for index in format_indexes:
+            file_name = export_json_file_name[index]
+            if is_current([file_name], signature([settings_hash, file_name], (row_hashes[x] for x in card_lists[index]))):
+                outputs_kept += 1
+            elif not write_json_rows(os.path.join(folder_outputs, file_name), card_lists[index].cards()):
+                del outputs[file_name] # Write again on next run
+
+        # Listings
+        listing_files: list[str] = [jsonfile_listings[x] for x in [index_all, index_tcg] if x in format_indexes]
+        if listing_files:
+            if is_current(listing_files, signature([settings_hash, "listings"], (row_hashes[x] for x in card_listings))):
+                outputs_kept += len(listing_files)
+            else:
+                self.export_listings(card_listings, [os.path.join(folder_outputs, x) for x in listing_files])
+
+        # Conf, conf json and error json, built from the rows of the card list view and their passcodes
+        conf_indexes: list[int] = []
+        passcode_texts: dict[str, str] = { k: json.dumps(v) for k, v in passcode_table.items() }
+        for index in format_indexes:
+            resolved_rows = (passcode_texts[normalized_setcodes[x]] for x in card_lists[index])
+            output_signature = signature([settings_hash, export_conf_file[index]], (row_hashes[x] for x in card_lists[index]), resolved_rows)
+            if is_current([export_conf_file[index], jsonfile_card_conf_list[index], jsonfile_cards_with_error[index]], output_signature):
+                outputs_kept += 3
+            else:
+                conf_indexes.append(index)
+        self.process_card_list(cards, passcode_table, folder_outputs, conf_indexes)
+
+        # Card packs, built from the same rows and passcodes
+        if self.config.is_write_cardpack:
+            for index in format_indexes:
+                file_name = export_cardpack_file[index]
+                resolved_rows = (passcode_texts[normalized_setcodes[x]] for x in card_lists[index])
+                if is_current([file_name], signature([settings_hash, file_name], (row_hashes[x] for x in card_lists[index]), resolved_rows)):
+                    outputs_kept += 1
+                elif not write_card_pack(os.path.join(folder_outputs, file_name), self.resolved_cards(card_lists[index], passcode_table)):
+                    del outputs[file_name]
+
+        # Fallback report
+        report_rows: list[dict[str, any]] = fallback_rows(passcode_table, fallbacks)
+        if is_current([jsonfile_setcode_fallbacks], signature([settings_hash, jsonfile_setcode_fallbacks], map(json.dumps, report_rows))):
+            outputs_kept += 1
+        elif not write_json_rows(os.path.join(folder_outputs, jsonfile_setcode_fallbacks), report_rows):
+            del outputs[jsonfile_setcode_fallbacks]
+
+        log(f"Kept {outputs_kept} of {len(outputs)} outputs.")
+        metrics.count("delta.outputs_kept", outputs_kept)
+        summary: dict[str, any] = {
+            "cards": len(cards),
+            "listings": len(card_listings),
+            "setcodes": len(passcode_table),
+            "setcodes_resolved": resolved_count,
+            "setcodes_fallback": dict(Counter(x[0] for x in fallbacks.values()))
+        }
+        export_state.file_hash = file_hash
+        export_state.settings_hash = settings_hash
+        export_state.row_counts = dict(Counter(row_hashes))
+        export_state.passcodes = { k: v for k, v in passcode_table.items() if v is not None }
+        export_state.fallbacks = { k: list(v) for k, v in fallbacks.items() if k in export_state.passcodes }
+        export_state.retry_count = retry_count
+        export_state.outputs = outputs
+        export_state.summary = summary
+        export_state.save()
+        summary = dict(summary, input_file = csv_file_name_source, folder_outputs = folder_outputs)
+        if self.config.is_mirror_images:
+            summary["images"] = self.mirror_images(export_state.passcodes.values())
+        return summary
+
+def run(config: ExportConfig = None) -> dict[str, any]:
+    # Export once, closing the setcode cache afterwards
+    exporter = Exporter(config or ExportConfig())
+    try:
+        return exporter.export()
+    finally:
+        exporter.close()
+
+def export_argument_parser(description: str, is_batch: bool = False) -> argparse.ArgumentParser:
+    # Export options, shared with batch mode. Batch mode takes its csv files as arguments, instead of '--input'.
+    defaults = ExportConfig()
+    parser = argparse.ArgumentParser(description = description)
+    if is_batch:
+        parser.add_argument("--output", "-o", default = defaults.folder_outputs, help = f"parent folder of the output folder of each csv (default: {defaults.folder_outputs})")
+    else:
+        parser.add_argument("--input", "-i", default = defaults.input_file, help = f"DragonShield export csv (default: {defaults.input_file})")
+        parser.add_argument("--output", "-o", default = defaults.folder_outputs, help = f"output folder (default: {defaults.folder_outputs})")
+    parser.add_argument("--formats", nargs = "+", choices = card_format_keys, default = defaults.formats, help = "outputs to write (default: all of them)")
+    parser.add_argument("--cache", default = defaults.file_setcode_cache, help = f"setcode cache file (default: {defaults.file_setcode_cache})")
+    parser.add_argument("--incremental", action = "store_true", help = f"only rewrite outputs whose rows changed since the last incremental run (state kept in the output folder as {file_export_state})")
+    parser.add_argument("--cardpack", action = "store_true", help = "also write each card list, with passcodes, as a card pack (memory-mapped, queried by passcode or setcode)")
+    parser.add_argument("--cache-only", action = "store_true", help = "never request setcodes, report setcodes missing from the cache as errors")
+    parser.add_argument("--negative-ttl", type = float, default = defaults.setcode_negative_ttl_days, metavar = "DAYS", help = f"do not request setcodes the API had no card for again within DAYS, 0 to always request (default: {defaults.setcode_negative_ttl_days:g})")
+    parser.add_argument("--fallbacks", nargs = "*", choices = list(setcode_fallback_forms), default = defaults.setcode_fallbacks, help = f"other setcode forms tried in order for setcodes that do not resolve, none to disable (default: {' '.join(defaults.setcode_fallbacks)})")
+    parser.add_argument("--concurrency", type = int, default = defaults.resolver_max_workers, help = f"concurrent setcode requests (default: {defaults.resolver_max_workers})")
+    parser.add_argument("--rate-limit", type = float, default = defaults.resolver_rate_limit, help = f"max setcode requests per second (default: {defaults.resolver_rate_limit})")
+    parser.add_argument("--prefetch-database", action = "store_true", help = "resolve setcodes from the full card database dump")
+    parser.add_argument("--mirror-images", action = "store_true", help = "download the image of every resolved card")
+    parser.add_argument("--images", default = defaults.folder_images, help = f"card image folder (default: {defaults.folder_images})")
+    parser.add_argument("--thumbnails", type = int, default = defaults.image_thumbnail_size, metavar = "SIZE", help = "also make thumbnails of mirrored images, SIZE pixels on the longest side (needs Pillow)")
+    parser.add_argument("--http-cache", default = defaults.file_http_cache, help = f"API response cache file, empty to skip (default: {defaults.file_http_cache})")
+    parser.add_argument("--currency", action = "append", metavar = "CODE=RATE", help = "listing currency and rate from USD, repeat for more currencies. The first one is used for listing prices (default: PHP=55)")
+    parser.add_argument("--markup", action = "append", default = [], metavar = "RARITY,MIN_PRICE,MULTIPLIER,ADDEND", help = "listing price markup on USD prices, repeat for more rules. First matching rule applies. Empty rarity matches any")
+    parser.add_argument("--encoding", default = defaults.csv_text_encoding, help = "csv encoding (default: detect from file)")
+    parser.add_argument("--metrics", default = defaults.file_metrics, help = "write run metrics to this file")
+    parser.add_argument("--verbose", "-v", action = "store_true", help = "log every card")
+    return parser
+
+def config_from_args(parser: argparse.ArgumentParser, args: argparse.Namespace, **kwargs) -> ExportConfig:
+    # Settings from parsed export options. Other settings can be given as keyword arguments.
+    listing_currencies: dict[str, float] = ExportConfig().listing_currencies
+    try:
+        if args.currency:
+            listing_currencies = { code.strip().upper(): float(rate) for code, rate in (x.split("=", 1) for x in args.currency) }
+        listing_markup_rules: list[MarkupRule] = [MarkupRule.parse(x) for x in args.markup]
+    except ValueError as e:
+        parser.error(f"Invalid price option => {e}")
+    return ExportConfig(
+        folder_outputs = args.output,
+        formats = args.formats,
+        file_setcode_cache = args.cache,
+        is_cache_only = args.cache_only,
+        setcode_negative_ttl_days = args.negative_ttl,
+        setcode_fallbacks = args.fallbacks,
+        is_incremental = args.incremental,
+        is_write_cardpack = args.cardpack,
+        resolver_max_workers = args.concurrency,
+        resolver_rate_limit = args.rate_limit,
+        is_prefetch_database = args.prefetch_database,
+        file_http_cache = args.http_cache,
+        is_mirror_images = args.mirror_images,
+        folder_images = args.images,
+        image_thumbnail_size = args.thumbnails,
+        csv_text_encoding = args.encoding,
+        listing_currencies = listing_currencies,
+        listing_markup_rules = listing_markup_rules,
+        file_metrics = args.metrics,
+        log_level = DEBUG if args.verbose else INFO,
+        **kwargs
+    )
+
+def parse_args(argv: list[str] = None) -> ExportConfig:
+    parser = export_argument_parser("Convert a DragonShield export to Edopro banlists (.lflist.conf) and card lists.")
+    args = parser.parse_args(argv)
+    return config_from_args(parser, args, input_file = args.input)
+
+def main(argv: list[str] = None):
+    config = parse_args(argv)
+    setup_logger(os.path.join("logs", f"log_{datetime.today().strftime('%Y-%m-%d')}.log"), level = config.log_level, timestamp = False)
+    try:
+        run(config)
 
-    process_card_list("TCG", export_json_file_name[index_tcg], jsonfile_card_conf_list[index_tcg], jsonfile_cards_with_error[index_tcg], export_conf_file[index_tcg])
-    #"""
+        # Report where time went
+        log(f"Run summary:\n{metrics.summary()}")
+        if config.file_metrics:
+            metrics.write_json(config.file_metrics)
 
+    except Exception as e:
+        log_err("Error, main", e)
 
-except Exception as e:
-    log_err("Error, main", e)
+# Main
+if __name__ == "__main__":
+    main()
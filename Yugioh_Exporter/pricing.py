@@ -0,0 +1,98 @@
+# Batched price conversion for shop listings.
+# Converts a whole price column per call, with NumPy when installed and plain loops otherwise.
+
+# Imports
+from array import array
+from math import isnan
+
+def is_numpy_available() -> bool:
+    try:
+        import numpy
+        return True
+    except ImportError:
+        return False
+
+class MarkupRule:
+    """Price adjustment, price * multiplier + addend, for cards of a rarity (any if empty) priced at least min_price.
+    Prices are in the source currency (USD)."""
+
+    def __init__(self, rarity: str = "", min_price: float = 0.0, multiplier: float = 1.0, addend: float = 0.0):
+        self.rarity = rarity
+        self.min_price = min_price
+        self.multiplier = multiplier
+        self.addend = addend
+
+    @classmethod
+    def parse(cls, text: str) -> "MarkupRule":
+        # 'rarity,min_price,multiplier,addend', e.g. 'Secret Rare,0,1.2,0' or ',10,1.1,0.5'
+        parts = text.split(",")
+        if len(parts) != 4:
+            raise ValueError(f"Invalid markup rule => {text}")
+        return cls(parts[0].strip(), float(parts[1] or 0), float(parts[2] or 1), float(parts[3] or 0))
+
+    def matches(self, rarity: str, price: float) -> bool:
+        return (not self.rarity or self.rarity == rarity) and price >= self.min_price
+
+class ListingPricer:
+    """Convert source prices to one or more currencies. The first matching markup rule applies.
+    Missing prices are NaN, and stay NaN."""
+
+    def __init__(self, currencies: dict[str, float], markup_rules: list[MarkupRule] = None, is_use_numpy: bool = None):
+        self.currencies = currencies # Currency code => rate from source currency. The first is the primary currency.
+        self.markup_rules = markup_rules or []
+        self.is_use_numpy = is_numpy_available() if is_use_numpy is None else is_use_numpy
+
+    def convert(self, columns: list[array], indexes: array, rarities: list[str]) -> list[dict[str, list[float]]]:
+        # Convert column[indexes] of each price column.
+        # Returns, per column, currency code => converted prices rounded to cents.
+        if len(indexes) == 0:
+            return [{ code: [] for code in self.currencies } for _ in columns]
+        if self.is_use_numpy:
+            return self.convert_numpy(columns, indexes, rarities)
+        return [self.convert_python(prices, indexes, rarities) for prices in columns]
+
+    def convert_numpy(self, columns: list[array], indexes: array, rarities: list[str]) -> list[dict[str, list[float]]]:
+        import numpy as np
+        selected = np.frombuffer(indexes, dtype = np.dtype(f"u{indexes.itemsize}"))
+        rarity_values = np.array(rarities, dtype = object)[selected] if any(x.rarity for x in self.markup_rules) else None
+        results: list[dict[str, list[float]]] = []
+        for prices in columns:
+            values = self.apply_markup_numpy(np.frombuffer(prices, dtype = np.float64)[selected], rarity_values)
+            results.append({ code: self.round_cents_numpy(values * rate).tolist() for code, rate in self.currencies.items() })
+        return results
+
+    def round_cents_numpy(self, values):
+        # Same result as round(x, 2). np.round can differ on half cents (14.085 => 14.08),
+        # so values close to a half cent are rounded by Python.
+        import numpy as np
+        scaled = values * 100
+        rounded = np.rint(scaled) / 100
+        for index in np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6):
+            rounded[index] = round(float(values[index]), 2)
+        return rounded
+
+    def apply_markup_numpy(self, values, rarity_values):
+        import numpy as np
+        if self.markup_rules:
+            adjusted = values.copy()
+            is_applied = np.zeros(len(values), dtype = bool)
+            # NaN compares false, so missing prices never match
+            for rule in self.markup_rules:
+                mask = ~is_applied & (values >= rule.min_price)
+                if rule.rarity:
+                    mask &= rarity_values == rule.rarity
+                adjusted[mask] = values[mask] * rule.multiplier + rule.addend
+                is_applied |= mask
+            return adjusted
+        return values
+
+    def convert_python(self, prices: array, indexes: array, rarities: list[str]) -> dict[str, list[float]]:
+        values: list[float] = []
+        for index in indexes:
+            price = prices[index]
+            if self.markup_rules and not isnan(price):
+                rule = next((x for x in self.markup_rules if x.matches(rarities[index], price)), None)
+                if rule is not None:
+                    price = price * rule.multiplier + rule.addend
+            values.append(price)
+        return { code: [round(x * rate, 2) for x in values] for code, rate in self.currencies.items() }
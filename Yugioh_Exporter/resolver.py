@@ -0,0 +1,109 @@
+# Concurrent setcode resolver for the YGOPRODECK API.
+# Fans out setcode lookups over a thread pool, with a token-bucket rate limit.
+# Retries with backoff on 429/5xx responses are left to the HTTP client.
+
+# Imports
+import json
+import threading
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, sleep
+from common.httpclient import RETRY_STATUS, HttpClient
+
+class TokenBucket:
+    """Thread-safe token bucket. Each `acquire` takes one token, blocking until available."""
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = float(rate)
+        self.capacity = max(1, int(capacity))
+        self.tokens = float(self.capacity)
+        self.updated = monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self.lock:
+                now = monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            sleep(wait)
+
+class SetcodeResult:
+    """Outcome of a single setcode lookup."""
+
+    def __init__(self, setcode: str, status_code: int = 0, text: str = "", error: Exception = None):
+        self.setcode = setcode
+        self.status_code = status_code
+        self.text = text
+        self.error = error
+        self.data: any = None
+        if text:
+            try:
+                self.data = json.loads(text)
+            except Exception as e:
+                self.error = e
+
+    @property
+    def requested(self) -> bool:
+        return self.status_code > 0
+
+    @property
+    def ok(self) -> bool:
+        return 200 <= self.status_code < 300 and isinstance(self.data, dict) and "id" in self.data
+
+    @property
+    def is_missing(self) -> bool:
+        # The API answered, but has no card for the setcode (4xx, or an unusable body).
+        # Worth remembering, unlike network errors and 429/5xx that may pass.
+        if not self.requested or self.ok or self.status_code in RETRY_STATUS:
+            return False
+        return 200 <= self.status_code < 300 or 400 <= self.status_code < 500
+
+class SetcodeResolver:
+    """Resolve many setcodes concurrently against `route` (a format string taking the setcode).
+    Requests go through `client`, or a pooled client of its own."""
+
+    def __init__(self, route: str, max_workers: int = 8, rate: float = 10.0, burst: int = 1,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 15.0, client: HttpClient = None):
+        self.route = route
+        self.max_workers = max(1, int(max_workers))
+        self.bucket = TokenBucket(rate, burst)
+        self.retries = max(0, int(retries))
+        self.backoff = backoff
+        self.timeout = timeout
+        self.is_own_client = client is None
+        self.client = HttpClient(pool_maxsize = self.max_workers) if client is None else client
+        self.pool: ThreadPoolExecutor = None # Kept between calls, so worker sessions stay connected
+        self.pool_lock = threading.Lock()
+
+    def fetch(self, setcode: str) -> SetcodeResult:
+        # Every attempt waits for a token of the rate limit
+        try:
+            req_object = self.client.request_with_retries("GET", self.route.format(setcode), retries = self.retries, backoff = self.backoff,
+                                                          wait = self.bucket.acquire, metric = "setcode_request", timeout = self.timeout)
+            return SetcodeResult(setcode, req_object.status_code, req_object.text)
+        except requests.RequestException as e:
+            return SetcodeResult(setcode, error = e)
+
+    def resolve_all(self, setcodes: list[str]) -> dict[str, SetcodeResult]:
+        unique_codes: list[str] = list(dict.fromkeys(setcodes))
+        if not unique_codes:
+            return {}
+        with self.pool_lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(max_workers = self.max_workers, thread_name_prefix = "setcode")
+        return dict(zip(unique_codes, self.pool.map(self.fetch, unique_codes)))
+
+    def close(self):
+        with self.pool_lock:
+            if self.pool is not None:
+                self.pool.shutdown()
+                self.pool = None
+            if self.is_own_client:
+                self.client.close()
@@ -0,0 +1,182 @@
+# Export service. Keeps the setcode cache and HTTP sessions warm between exports.
+# Usage: python service.py [--host 127.0.0.1] [--port 8780]
+# POST /export?formats=tcg,ae with a DragonShield csv as body, returns the .lflist.conf files and listings as json.
+
+# Imports
+import argparse
+import json
+import os
+import sys
+import tempfile
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+if not __package__:
+    # Run as a script ('python service.py'): make the repository root importable, and import as the Yugioh_Exporter package
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+    __package__ = "Yugioh_Exporter"
+from common.applog import DEBUG, INFO, setup_logger, log, log_err
+from common.metrics import metrics
+from .main import CsvFileError, ExportConfig, Exporter, card_format_keys, card_format_names, selected_format_indexes, \
+    export_conf_file, jsonfile_cards_with_error, jsonfile_listings, jsonfile_setcode_fallbacks, index_all, index_tcg, read_json
+
+# Constants
+max_upload_bytes: int = 64 * 1024 * 1024
+
+# Methods
+def read_text(filename: str) -> str:
+    with open(filename, encoding = 'utf8') as file:
+        return file.read()
+
+class ExportHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args):
+        log(f"{self.address_string()} {format % args}")
+
+    def send(self, status: int, content: any, is_close: bool = False):
+        # is_close: the request body was not read. The connection is closed, so the body is never taken for the next request.
+        body = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if is_close:
+            self.send_header("Connection", "close")
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/health":
+            return self.send(200, self.server.export_service.status())
+        if url.path == "/metrics":
+            return self.send(200, metrics.to_dict())
+        self.send(404, { "error": "Not found" })
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/export":
+            return self.send(404, { "error": "Not found" }, is_close = True)
+
+        try:
+            content_length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            return self.send(400, { "error": "Invalid Content-Length" }, is_close = True)
+        if content_length <= 0:
+            return self.send(411, { "error": "Send the csv as request body, with Content-Length" }, is_close = True)
+        if content_length > max_upload_bytes:
+            return self.send(413, { "error": f"Upload is larger than {max_upload_bytes} bytes" }, is_close = True)
+        contents = self.rfile.read(content_length)
+
+        query = parse_qs(url.query)
+        formats: list[str] = [x for item in query.get("formats", []) for x in item.split(",") if x]
+        invalid_formats = [x for x in formats if x not in card_format_keys]
+        if invalid_formats:
+            return self.send(400, { "error": f"Unknown formats {invalid_formats}, use {card_format_keys}" })
+
+        try:
+            self.send(200, self.server.export_service.export(contents, formats or None))
+        except CsvFileError as e:
+            # The upload is not a readable DragonShield export
+            self.send(400, { "error": str(e) })
+        except Exception as e:
+            log_err("Issue found on export request", e)
+            self.send(500, { "error": str(e) })
+
+class ExportService:
+    """Serve exports over HTTP from a single warm Exporter, one thread per request."""
+
+    def __init__(self, config: ExportConfig, host: str = "127.0.0.1", port: int = 8780):
+        self.config = config
+        self.exporter = Exporter(config)
+        self.server = ThreadingHTTPServer((host, port), ExportHandler)
+        self.server.daemon_threads = True
+        self.server.export_service = self
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def status(self) -> dict[str, any]:
+        return {
+            "status": "ok",
+            "exports": metrics.stage_calls("service_export"),
+            "cached_setcodes": len(self.exporter.passcode_map or {}),
+            "failed_setcodes": len(self.exporter.failed_setcodes)
+        }
+
+    def warm_up(self):
+        # Load the setcode cache before the first request
+        with self.exporter.lock:
+            self.exporter.resolve_setcodes_locked([])
+
+    def export(self, contents: bytes, formats: list[str] = None) -> dict[str, any]:
+        # Export an uploaded csv in its own temporary folder, and return the outputs
+        formats = self.config.formats if formats is None else formats
+        format_indexes: list[int] = selected_format_indexes(formats)
+        with tempfile.TemporaryDirectory(prefix = "export_") as folder:
+            input_file = os.path.join(folder, "upload.csv")
+            folder_outputs = os.path.join(folder, "output")
+            with open(input_file, 'wb') as file:
+                file.write(contents)
+
+            with metrics.stage("service_export"):
+                summary = self.exporter.export(input_file, folder_outputs, formats)
+            del summary["input_file"], summary["folder_outputs"]
+
+            listings_indexes: list[int] = [x for x in [index_all, index_tcg] if x in format_indexes]
+            return {
+                "summary": summary,
+                "conf": { export_conf_file[x]: read_text(os.path.join(folder_outputs, export_conf_file[x])) for x in format_indexes },
+                "errors": { card_format_names[x]: read_json(os.path.join(folder_outputs, jsonfile_cards_with_error[x])) for x in format_indexes },
+                "listings": read_json(os.path.join(folder_outputs, jsonfile_listings[listings_indexes[0]])) if listings_indexes else [],
+                "fallbacks": read_json(os.path.join(folder_outputs, jsonfile_setcode_fallbacks))
+            }
+
+    def serve_forever(self):
+        log(f"Export service listening on {self.url}")
+        self.server.serve_forever()
+
+    def shutdown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.exporter.close()
+
+def parse_args(argv: list[str] = None) -> argparse.Namespace:
+    defaults = ExportConfig()
+    parser = argparse.ArgumentParser(description = "Serve DragonShield to Edopro banlist exports over HTTP.")
+    parser.add_argument("--host", default = "127.0.0.1", help = "address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type = int, default = 8780, help = "port to listen on (default: 8780)")
+    parser.add_argument("--cache", default = defaults.file_setcode_cache, help = f"setcode cache file (default: {defaults.file_setcode_cache})")
+    parser.add_argument("--cache-only", action = "store_true", help = "never request setcodes, report setcodes missing from the cache as errors")
+    parser.add_argument("--concurrency", type = int, default = defaults.resolver_max_workers, help = f"concurrent setcode requests (default: {defaults.resolver_max_workers})")
+    parser.add_argument("--rate-limit", type = float, default = defaults.resolver_rate_limit, help = f"max setcode requests per second (default: {defaults.resolver_rate_limit})")
+    parser.add_argument("--prefetch-database", action = "store_true", help = "resolve setcodes from the full card database dump")
+    parser.add_argument("--verbose", "-v", action = "store_true", help = "log every card")
+    return parser.parse_args(argv)
+
+def main(argv: list[str] = None):
+    args = parse_args(argv)
+    config = ExportConfig(
+        file_setcode_cache = args.cache,
+        is_cache_only = args.cache_only,
+        resolver_max_workers = args.concurrency,
+        resolver_rate_limit = args.rate_limit,
+        is_prefetch_database = args.prefetch_database,
+        log_level = DEBUG if args.verbose else INFO
+    )
+    setup_logger(os.path.join("logs", f"service_{datetime.today().strftime('%Y-%m-%d')}.log"), level = config.log_level)
+    export_service = ExportService(config, args.host, args.port)
+    try:
+        export_service.warm_up()
+        export_service.serve_forever()
+    except KeyboardInterrupt:
+        log("Stopping export service..")
+    finally:
+        export_service.shutdown()
+
+# Main
+if __name__ == "__main__":
+    main()
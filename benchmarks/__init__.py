@@ -0,0 +1 @@
+# Benchmark harness for the scripts in this repository.
@@ -0,0 +1,136 @@
+# Compare loading card files written as JSON with card packs (common/cardpack.py).
+# Each file is loaded in its own process, so peak RSS is measured per format.
+# Usage: python benchmarks/cardpack.py [--cards 10000 100000] [--queries 1000]
+
+# Imports
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+from time import perf_counter
+
+folder_root: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(folder_root)
+from benchmarks.fixtures import dragonshield_rows, global_setcode, make_cardlist_html, passcode_for
+from common.cardpack import CardPack, write_cardpack
+
+# Format => file extension
+formats: dict[str, str] = { "json": ".json", "jsonl": ".jsonl", "cardpack": ".cardpack" }
+
+# Methods
+def onepiece_cards(count: int) -> list[dict[str, any]]:
+    # Card database records, as written by the scraper
+    sys.path.insert(0, os.path.join(folder_root, "OnePieceTCG"))
+    from cardparser import parse_cards, resolve_backend
+    from writer import CardWriter
+    card_writer = CardWriter()
+    card_writer.add_many(parse_cards(make_cardlist_html(count), "https://en.onepiece-cardgame.com", resolve_backend("auto")))
+    return [{ "Id": card_id, **card_writer.cards[card_id] } for card_id in sorted(card_writer.cards)]
+
+def exporter_cards(count: int) -> list[dict[str, any]]:
+    # Resolved card list, as written by the exporter
+    cards: list[dict[str, any]] = []
+    for row in dragonshield_rows(count):
+        setcode: str = row[6]
+        card = { "name": row[3], "set": setcode, "set_global": global_setcode(setcode), "qty": int(row[1]), "trade_qty": int(row[2]), "format": "TCG" }
+        if not setcode.startswith("BAD"):
+            card["id"] = passcode_for(setcode)
+        cards.append(card)
+    return cards
+
+def write_files(folder: str, name: str, cards: list[dict[str, any]], id_field: str, set_field: str) -> dict[str, str]:
+    # The same cards in every format. Returns format => file.
+    files: dict[str, str] = { key: os.path.join(folder, name + extension) for key, extension in formats.items() }
+    with open(files["json"], 'w', encoding = 'utf8') as file:
+        json.dump(cards, file, indent = 4)
+    with open(files["jsonl"], 'w', encoding = 'utf8') as file:
+        file.writelines(json.dumps(card, separators = (",", ":")) + "\n" for card in cards)
+    write_cardpack(files["cardpack"], cards, id_field, set_field)
+    return files
+
+def peak_rss_mb() -> float:
+    # Peak RSS of this process. On Linux ru_maxrss carries the parent's peak over fork and exec, VmHWM does not.
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    # ru_maxrss is KB on Linux, bytes on macOS
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+def load_and_query(card_format: str, filename: str, file_keys: str) -> dict[str, any]:
+    # Runs in a child process: load the file ready for lookups, then look up every key
+    with open(file_keys, encoding = 'utf8') as file:
+        keys = json.load(file)
+    id_field, set_field = keys["id_field"], keys["set_field"]
+    baseline_mb = peak_rss_mb()
+
+    started = perf_counter()
+    if card_format == "cardpack":
+        card_pack = CardPack(filename)
+        get_card = card_pack.get
+        find_set = card_pack.find_set
+    else:
+        # What a JSON consumer does: parse everything, then index by ID and set code
+        with open(filename, encoding = 'utf8') as file:
+            cards = json.load(file) if card_format == "json" else [json.loads(line) for line in file]
+        by_id: dict[str, dict] = {}
+        by_set: dict[str, list[dict]] = {}
+        for card in cards:
+            if id_field in card:
+                by_id.setdefault(card[id_field], card)
+            by_set.setdefault(card[set_field], []).append(card)
+        get_card = by_id.get
+        find_set = lambda setcode: by_set.get(setcode, [])
+    load_seconds = perf_counter() - started
+
+    started = perf_counter()
+    found: int = sum(1 for key in keys["ids"] if get_card(key) is not None)
+    found += sum(len(find_set(key)) for key in keys["sets"])
+    query_seconds = perf_counter() - started
+    return { "load": load_seconds, "query": query_seconds, "found": found, "rss_mb": peak_rss_mb() - baseline_mb }
+
+def bench(name: str, cards: list[dict[str, any]], id_field: str, set_field: str, queries: int) -> list[dict[str, any]]:
+    results: list[dict[str, any]] = []
+    folder = tempfile.mkdtemp(prefix = "bench_cardpack_")
+    try:
+        files = write_files(folder, name, cards, id_field, set_field)
+        rng = random.Random(0)
+        sample = [rng.choice(cards) for _ in range(queries)]
+        file_keys: str = os.path.join(folder, "keys.json")
+        with open(file_keys, 'w', encoding = 'utf8') as file:
+            json.dump({ "id_field": id_field, "set_field": set_field, "ids": [x[id_field] for x in sample if id_field in x], "sets": [x[set_field] for x in sample] }, file)
+        for card_format, filename in files.items():
+            output = subprocess.run([sys.executable, __file__, "--load", card_format, filename, file_keys], capture_output = True, text = True, check = True).stdout
+            result = json.loads(output)
+            result.update(name = name, format = card_format, cards = len(cards), size_kb = os.path.getsize(filename) / 1024)
+            results.append(result)
+    finally:
+        shutil.rmtree(folder, ignore_errors = True)
+    return results
+
+def print_results(results: list[dict[str, any]], queries: int):
+    print(f"{'Cards':<22} {'Format':<9} {'Size KB':>9} {'Load s':>8} {f'{queries}+{queries} lookups s':>20} {'RSS +MB':>8} {'Found':>7}")
+    for result in results:
+        print(f"{result['name'] + ' ' + str(result['cards']):<22} {result['format']:<9} {result['size_kb']:>9.0f} {result['load']:>8.4f} "
+              f"{result['query']:>20.4f} {result['rss_mb']:>8.1f} {result['found']:>7}")
+
+# Main
+if __name__ == "__main__":
+    if len(sys.argv) == 5 and sys.argv[1] == "--load":
+        print(json.dumps(load_and_query(*sys.argv[2:])))
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description = "Compare load time and RSS of JSON card files and card packs.")
+    parser.add_argument("--cards", type = int, nargs = "+", default = [10000, 100000], help = "card counts (default: 10000 100000)")
+    parser.add_argument("--queries", type = int, default = 1000, help = "lookups by ID, and by set code (default: 1000)")
+    args = parser.parse_args()
+    results: list[dict[str, any]] = []
+    for count in args.cards:
+        results += bench("onepiece", onepiece_cards(count), "Id", "Set", args.queries)
+        results += bench("exporter", exporter_cards(count), "id", "set", args.queries)
+    print_results(results, args.queries)
@@ -0,0 +1,101 @@
+# Synthetic fixtures for benchmarks: DragonShield csv exports and One Piece card list pages.
+
+# Imports
+import random
+import struct
+import zlib
+
+# DragonShield export columns, matching the indexes used by the exporter
+DRAGONSHIELD_HEADERS: list[str] = [
+    "Folder Name", "Quantity", "Trade Quantity", "Card Name", "Set Code", "Set Name", "Card Number",
+    "Rarity", "Condition", "Printing", "Language", "Price Bought", "Date Bought", "LOW", "MID", "MARKET"
+]
+SET_PREFIXES: list[str] = ["LOB", "MRD", "SRL", "PSV", "LON", "LOD", "PGD", "MFC", "DCR", "IOC", "AST", "SOD", "RDS", "FET", "TLM", "CRV"]
+RARITIES: list[str] = ["Common", "Common", "Common", "Rare", "Super Rare", "Ultra Rare", "Secret Rare"]
+# Folder name => region letters used in set codes
+FOLDERS: list[tuple[str, str]] = [
+    ("Binder", "EN"), ("Gold Binder", "EN"), ("Trunk", "EN"), ("Deck Box", "EN"),
+    ("OCG Binder", "JP"), ("OCG Trunk", "JP"), ("AE Binder", "AE"), ("Rush", "EN")
+]
+
+# Methods
+def global_setcode(setcode: str) -> str:
+    # 'LOB-EN001' => 'LOB-001', same card in every region
+    prefix, number = setcode.split("-", 1)
+    return f"{prefix}-{number[2:]}"
+
+def passcode_for(setcode: str) -> int:
+    # Stable 8-digit passcode per card, shared across regions
+    return 10000000 + zlib.crc32(global_setcode(setcode).encode()) % 89999999
+
+def card_name_for(setcode: str) -> str:
+    return f"Card {global_setcode(setcode)}"
+
+def all_setcodes(numbers_per_set: int = 100, regions: list[str] = ["EN", "JP", "AE"]) -> list[str]:
+    return [f"{prefix}-{region}{number:03d}" for prefix in SET_PREFIXES for region in regions for number in range(1, numbers_per_set + 1)]
+
+def dragonshield_rows(count: int, seed: int = 0, numbers_per_set: int = 100, bad_ratio: float = 0.005):
+    # Yield csv rows for a synthetic collection
+    rng = random.Random(seed)
+    for _ in range(count):
+        folder, region = rng.choice(FOLDERS)
+        prefix: str = rng.choice(SET_PREFIXES)
+        number: int = rng.randint(1, numbers_per_set)
+        if rng.random() < bad_ratio:
+            prefix = "BAD" + prefix
+        setcode: str = f"{prefix}-{region}{number:03d}"
+        yield [
+            folder, str(rng.randint(0, 4)), str(rng.randint(0, 2)), card_name_for(setcode), prefix,
+            f"Set {prefix}", setcode, rng.choice(RARITIES), "NearMint", rng.choice(["1st Edition", "Unlimited"]),
+            "English", "0.00", "2023-01-01",
+            f"{rng.uniform(0.05, 5):.2f}", f"{rng.uniform(0.1, 10):.2f}", rng.choice(["", f"{rng.uniform(0.1, 20):.2f}"])
+        ]
+
+def write_dragonshield_csv(filename: str, count: int, encoding: str = "utf-8", sep: str = ",", seed: int = 0, numbers_per_set: int = 100):
+    # Write export the way DragonShield does: '"sep=,"' line, then header and rows.
+    # 'utf-16' writes a BOM, 'utf-16-le' does not.
+    with open(filename, 'w', encoding = encoding, newline = '') as f:
+        f.write(f"\"sep={sep}\"\r\n")
+        f.write(sep.join(DRAGONSHIELD_HEADERS) + "\r\n")
+        for row in dragonshield_rows(count, seed, numbers_per_set):
+            f.write(sep.join(row) + "\r\n")
+
+def make_card_html(rng: random.Random, index: int, series: int) -> str:
+    card_id: str = f"OP{series:02d}-{index:03d}"
+    return f"""<dl class="modalCol" id="{card_id}">
+<dt><div class="infoCol"><span>{card_id}</span> | <span>{rng.choice(["C", "UC", "R", "SR", "SEC", "L"])}</span> | <span>{rng.choice(["LEADER", "CHARACTER", "EVENT", "STAGE"])}</span></div>
+<div class="cardName">Card &amp; Name {index}</div></dt>
+<dd><div class="frontCol"><img class="lazy" src="../images/cardlist/card/{card_id}.png?240101" alt="{card_id}"></div>
+<div class="backCol">
+<div class="col2"><div class="cost"><h3>Cost</h3>{rng.randint(1, 10)}</div>
+<div class="attribute"><h3>Attribute</h3><img src="../images/cardlist/attribute/ico_type01.png"><i>{rng.choice(["Slash", "Strike", "Special", "Wisdom", "Ranged"])}</i></div></div>
+<div class="col2"><div class="power"><h3>Power</h3>{rng.randint(1, 12)}000</div>
+<div class="counter"><h3>Counter</h3>{rng.choice(["-", "1000", "2000"])}</div></div>
+<div class="color"><h3>Color</h3>{rng.choice(["Red", "Green", "Blue", "Purple", "Black", "Yellow", "Red/Green"])}</div>
+<div class="feature"><h3>Type</h3>{rng.choice(["Straw Hat Crew", "Navy", "Supernovas/Straw Hat Crew", "Animal Kingdom Pirates"])}</div>
+<div class="text"><h3>Effect</h3>[On Play] Draw {rng.randint(1, 2)} card.<br>[Trigger] K.O. up to 1 of your opponent's Characters with a cost of {rng.randint(1, 5)} or less.</div>
+<div class="getInfo"><h3>Card Set(s)</h3>-SERIES {series}- [OP{series:02d}]</div>
+</div></dd></dl>"""
+
+def make_card_image(key: str, width: int = 60, height: int = 84) -> bytes:
+    # Solid colour PNG, colour derived from key
+    crc = zlib.crc32(key.encode())
+    pixels: bytes = b"".join(b"\x00" + bytes([crc & 255, (crc >> 8) & 255, (crc >> 16) & 255]) * width for _ in range(height))
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header: bytes = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(pixels)) + chunk(b"IEND", b"")
+
+def series_option_id(series: int) -> str:
+    return f"5691{series:02d}"
+
+def make_cardlist_html(count: int, series_ids: list[int] = [1, 2, 3], seed: int = 0) -> str:
+    # Card list page with 'count' cards spread across 'series_ids'. Count 0 gives the empty search page.
+    rng = random.Random(seed)
+    options: str = "".join(f'<option value="{series_option_id(x)}">BOOSTER PACK -SERIES {x}- [OP-{x:02d}]</option>' for x in series_ids)
+    cards: str = "\n".join(make_card_html(rng, i, series_ids[i % len(series_ids)]) for i in range(1, count + 1))
+    return f"""<html><head><title>CARD LIST</title></head><body>
+<form><select name="series" id="series"><option value="">ALL</option>{options}</select></form>
+<div class="resultCol">
+{cards}
+</div></body></html>"""
@@ -0,0 +1,146 @@
+# Local stand-in for the YGOPRODECK API and the One Piece card list site.
+
+# Imports
+import gzip
+import hashlib
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from benchmarks.fixtures import all_setcodes, card_name_for, make_card_image, make_cardlist_html, passcode_for, series_option_id
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.mock.count("connections")
+
+    def log_message(self, *args):
+        pass
+
+    def send(self, status: int, body: bytes, headers: dict[str, str] = {}):
+        # Gzip larger bodies if the client accepts it
+        if len(body) > 1024 and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body, compresslevel = 1)
+            headers = { **headers, "Content-Encoding": "gzip" }
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        mock = self.server.mock
+        url = urlparse(self.path)
+        mock.count("requests")
+        if url.path.endswith("/cardsetsinfo.php"):
+            setcode: str = parse_qs(url.query).get("setcode", [""])[0]
+            mock.count_setcode(setcode)
+            region: str = setcode.rsplit("-", 1)[-1].rstrip("0123456789") if "-" in setcode else ""
+            if not setcode or setcode.startswith("BAD") or region not in mock.regions:
+                return self.send(400, b'{"error":"No card matching your query was found in the database."}')
+            body = { "id": passcode_for(setcode), "name": card_name_for(setcode), "set_name": "Set", "set_code": setcode }
+            return self.send(200, json.dumps(body).encode(), { "Cache-Control": f"max-age={mock.max_age}" })
+        if url.path.endswith("/cardinfo.php"):
+            return self.send(200, mock.card_database())
+        if "/images/" in url.path:
+            # Card images. Alternate arts ('_p1') share the image of the card.
+            mock.count("images")
+            body = make_card_image(url.path.rsplit("/", 1)[-1].split(".")[0].split("_p")[0])
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                mock.count("not_modified")
+                return self.send(304, b"", { "ETag": etag })
+            return self.send(200, body, { "ETag": etag, "Content-Type": "image/png" })
+        if url.path.startswith("/cardlist"):
+            body = mock.cardlist_page(None)
+            etag = '"' + hashlib.md5(body).hexdigest() + '"'
+            if self.headers.get("If-None-Match") == etag:
+                mock.count("not_modified")
+                return self.send(304, b"", { "ETag": etag })
+            return self.send(200, body, { "ETag": etag, "Cache-Control": "no-cache" })
+        self.send(404, b"")
+
+    def do_POST(self):
+        mock = self.server.mock
+        mock.count("requests")
+        contents = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        try:
+            series_id = str(json.loads(contents).get("series", ""))
+        except Exception:
+            series_id = ""
+        body = mock.cardlist_page(series_id)
+        etag = '"' + hashlib.md5(body).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            return self.send(304, b"", { "ETag": etag })
+        self.send(200, body, { "ETag": etag })
+
+class MockServer:
+    """Serve both APIs on 127.0.0.1 from a background thread, counting requests and connections.
+    Setcode lookups are cacheable for max_age seconds, the card list page is revalidated by ETag.
+    Setcodes of other regions than 'regions', and setcodes starting with 'BAD', are not found."""
+
+    def __init__(self, cards_per_series: int = 1000, series_ids: list[int] = [1, 2, 3], numbers_per_set: int = 100, max_age: int = 3600,
+                 regions: list[str] = ["EN", "JP", "AE"]):
+        self.cards_per_series = cards_per_series
+        self.max_age = max_age
+        self.regions = regions
+        self.series_ids = series_ids
+        self.numbers_per_set = numbers_per_set
+        self.stats: dict[str, int] = {}
+        self.setcode_requests: Counter = Counter() # Setcode => lookups
+        self.lock = threading.Lock()
+        self.pages: dict[str, bytes] = {}
+        self.database: bytes = None
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), MockHandler)
+        self.server.daemon_threads = True
+        self.server.mock = self
+        self.thread = threading.Thread(target = self.server.serve_forever, daemon = True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def count(self, name: str):
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def count_setcode(self, setcode: str):
+        with self.lock:
+            self.setcode_requests[setcode] += 1
+
+    def card_database(self) -> bytes:
+        # 'cardinfo.php' dump, TCG set codes only
+        if self.database is None:
+            cards: dict[int, dict] = {}
+            for setcode in all_setcodes(self.numbers_per_set, ["EN"]):
+                card = cards.setdefault(passcode_for(setcode), { "id": passcode_for(setcode), "name": card_name_for(setcode), "card_sets": [] })
+                card["card_sets"].append({ "set_code": setcode })
+            self.database = json.dumps({ "data": list(cards.values()) }).encode()
+        return self.database
+
+    def cardlist_page(self, series_id: str) -> bytes:
+        # None: search page only. '': every series. Otherwise one series.
+        key = "page" if series_id is None else series_id
+        with self.lock:
+            if key not in self.pages:
+                if series_id is None:
+                    html = make_cardlist_html(0, self.series_ids)
+                elif series_id == "":
+                    html = make_cardlist_html(self.cards_per_series * len(self.series_ids), self.series_ids)
+                else:
+                    series = next((x for x in self.series_ids if series_option_id(x) == series_id), self.series_ids[0])
+                    html = make_cardlist_html(self.cards_per_series, [series], seed = series)
+                self.pages[key] = html.encode()
+            return self.pages[key]
+
+    def start(self) -> "MockServer":
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
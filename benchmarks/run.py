@@ -0,0 +1,202 @@
+# Run both pipelines end to end against a local stand-in server.
+# Reports wall time, peak RSS and per-stage timings for each scenario.
+# Usage: python benchmarks/run.py [--rows 1000 10000 200000] [--encodings utf-8 utf-16] [--cards 3000] [--prefetch-rows 1000]
+
+# Imports
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+from time import perf_counter
+
+folder_root: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.append(folder_root)
+from benchmarks.fixtures import all_setcodes, card_name_for, dragonshield_rows, passcode_for, write_dragonshield_csv
+from benchmarks.mockserver import MockServer
+
+script_exporter: str = os.path.join(folder_root, "Yugioh_Exporter", "main.py")
+script_scraper: str = os.path.join(folder_root, "OnePieceTCG", "main.py")
+
+# Methods
+def run_script(script: str, cwd: str, env: dict[str, str], args: list[str] = []) -> dict[str, any]:
+    # Run a script in 'cwd', returning wall time, peak RSS and metrics written by the script
+    file_metrics: str = os.path.join(cwd, "bench_metrics.json")
+    if os.path.exists(file_metrics):
+        os.remove(file_metrics)
+    run_env = { **os.environ, **env, "METRICS_FILE": file_metrics }
+    started = perf_counter()
+    with open(os.path.join(cwd, "bench_stdout.txt"), 'w') as stdout:
+        process = subprocess.Popen([sys.executable, script, *args], cwd = cwd, env = run_env, stdout = stdout, stderr = subprocess.STDOUT)
+        _, status, rusage = os.wait4(process.pid, 0)
+        process.returncode = os.waitstatus_to_exitcode(status)
+    wall = perf_counter() - started
+    # ru_maxrss is KB on Linux, bytes on macOS
+    peak_rss_mb = rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    metrics: dict[str, any] = {}
+    if os.path.exists(file_metrics):
+        with open(file_metrics, encoding = 'utf8') as f:
+            metrics = json.load(f)
+    return { "returncode": process.returncode, "wall_seconds": wall, "peak_rss_mb": peak_rss_mb, "metrics": metrics }
+
+def seed_setcode_cache(folder: str, numbers_per_set: int):
+    # Pre-fill exporter cache with every setcode of the fixture universe
+    from Yugioh_Exporter.cache import SetcodeCache
+    cache = SetcodeCache(os.path.join(folder, "setcodes.db"))
+    cache.insert_many({ x: { "id": passcode_for(x), "name": card_name_for(x) } for x in all_setcodes(numbers_per_set) })
+    cache.close()
+
+def bench_exporter(server: MockServer, rows: int, encoding: str, is_cold: bool, keep: bool) -> list[dict[str, any]]:
+    results: list[dict[str, any]] = []
+    folder = tempfile.mkdtemp(prefix = "bench_exporter_")
+    try:
+        write_dragonshield_csv(os.path.join(folder, "all-folders.csv"), rows, encoding, numbers_per_set = server.numbers_per_set)
+        env = { "YGOPRODECK_API": f"{server.url}/api/v7" }
+        if not is_cold:
+            seed_setcode_cache(folder, server.numbers_per_set)
+        for run in (["cold", "warm"] if is_cold else ["warm"]):
+            requests_before, connections_before = server.stats.get("requests", 0), server.stats.get("connections", 0)
+            result = run_script(script_exporter, folder, env)
+            result["name"] = f"exporter {rows} rows {encoding} ({run})"
+            result["requests"] = server.stats.get("requests", 0) - requests_before
+            result["connections"] = server.stats.get("connections", 0) - connections_before
+            results.append(result)
+    finally:
+        if keep:
+            print(f"Kept {folder}")
+        else:
+            shutil.rmtree(folder, ignore_errors = True)
+    return results
+
+def differing_files(folder_a: str, folder_b: str) -> list[str]:
+    # Relative paths of files that are missing from either folder, or differ in content
+    def files(folder: str) -> set[str]:
+        return { os.path.relpath(os.path.join(root, name), folder) for root, _, names in os.walk(folder) for name in names }
+    differing: list[str] = []
+    for name in sorted(files(folder_a) | files(folder_b)):
+        file_a, file_b = os.path.join(folder_a, name), os.path.join(folder_b, name)
+        if not (os.path.exists(file_a) and os.path.exists(file_b)):
+            differing.append(name)
+            continue
+        with open(file_a, 'rb') as a, open(file_b, 'rb') as b:
+            if a.read() != b.read():
+                differing.append(name)
+    return differing
+
+def bench_prefetch(server: MockServer, rows: int, keep: bool) -> tuple[list[dict[str, any]], list[str]]:
+    # Export the same csv with an empty cache, once requesting each setcode and once with --prefetch-database.
+    # Returns the results, and the problems found: differing outputs, setcodes of the dump that were requested anyway,
+    # and setcodes missing from the dump that were not requested.
+    results: list[dict[str, any]] = []
+    problems: list[str] = []
+    folders: dict[str, str] = {}
+    requested: dict[str, Counter] = {}
+    try:
+        env = { "YGOPRODECK_API": f"{server.url}/api/v7" }
+        for run, args in [("per setcode", []), ("prefetch database", ["--prefetch-database"])]:
+            folder = folders[run] = tempfile.mkdtemp(prefix = "bench_prefetch_")
+            write_dragonshield_csv(os.path.join(folder, "all-folders.csv"), rows, "utf-8", numbers_per_set = server.numbers_per_set)
+            requests_before, connections_before = server.stats.get("requests", 0), server.stats.get("connections", 0)
+            setcodes_before = Counter(server.setcode_requests)
+            # Unlimited request rate, both runs start from an empty cache
+            result = run_script(script_exporter, folder, env, ["--rate-limit", "0", *args])
+            requested[run] = server.setcode_requests - setcodes_before
+            if result["returncode"] != 0:
+                problems.append(f"{run} run exited with {result['returncode']}")
+            result["name"] = f"exporter {rows} rows ({run})"
+            result["requests"] = server.stats.get("requests", 0) - requests_before
+            result["connections"] = server.stats.get("connections", 0) - connections_before
+            results.append(result)
+        differing = differing_files(*[os.path.join(x, "output") for x in folders.values()])
+        if differing:
+            problems.append(f"outputs differ from the per-setcode run => {', '.join(differing)}")
+
+        # Checked against the lookups the server saw. Rows of skipped folders are not resolved.
+        indexed: set[str] = set(all_setcodes(server.numbers_per_set, ["EN"]))
+        used: set[str] = { row[6] for row in dragonshield_rows(rows, numbers_per_set = server.numbers_per_set) if row[0] != "Rush" }
+        requested_indexed = sorted(set(requested["prefetch database"]) & indexed)
+        if requested_indexed:
+            problems.append(f"{len(requested_indexed)} setcodes of the card database were requested one by one, e.g. {requested_indexed[:5]}")
+        not_requested = sorted(used - indexed - set(requested["prefetch database"]))
+        if not_requested:
+            problems.append(f"{len(not_requested)} setcodes missing from the card database were not requested, e.g. {not_requested[:5]}")
+        if not used - indexed:
+            problems.append("no setcodes missing from the card database, the fallback to per-setcode requests was not exercised")
+    finally:
+        for folder in folders.values():
+            if keep:
+                print(f"Kept {folder}")
+            else:
+                shutil.rmtree(folder, ignore_errors = True)
+    return results, problems
+
+def bench_scraper(server: MockServer, keep: bool) -> list[dict[str, any]]:
+    results: list[dict[str, any]] = []
+    folder = tempfile.mkdtemp(prefix = "bench_scraper_")
+    try:
+        env = { "ONEPIECE_HOME": server.url, "ONEPIECE_CRAWLER_DELAY": "0" }
+        for run in ["full", "incremental"]:
+            requests_before, connections_before = server.stats.get("requests", 0), server.stats.get("connections", 0)
+            result = run_script(script_scraper, folder, env)
+            result["name"] = f"scraper {server.cards_per_series * len(server.series_ids)} cards ({run})"
+            result["requests"] = server.stats.get("requests", 0) - requests_before
+            result["connections"] = server.stats.get("connections", 0) - connections_before
+            results.append(result)
+    finally:
+        if keep:
+            print(f"Kept {folder}")
+        else:
+            shutil.rmtree(folder, ignore_errors = True)
+    return results
+
+def print_results(results: list[dict[str, any]]):
+    print(f"{'Scenario':<44} {'Exit':>4} {'Wall s':>8} {'RSS MB':>8} {'Reqs':>6} {'Conns':>6}  Stages (s)")
+    for result in results:
+        stages = result["metrics"].get("stages", {})
+        stage_text = " ".join(f"{name}={stage['seconds']:.3f}" for name, stage in stages.items())
+        print(f"{result['name']:<44} {result['returncode']:>4} {result['wall_seconds']:>8.2f} {result['peak_rss_mb']:>8.1f} {result['requests']:>6} {result['connections']:>6}  {stage_text}")
+
+# Main
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark the exporter and scraper pipelines against a local mock server.")
+    parser.add_argument("--rows", type = int, nargs = "*", default = [1000, 10000, 50000], help = "DragonShield export sizes")
+    parser.add_argument("--encodings", nargs = "*", default = ["utf-8", "utf-16"], help = "utf-8, utf-16 (with BOM) or utf-16-le")
+    parser.add_argument("--cards", type = int, default = 3000, help = "One Piece cards across all series, 0 to skip")
+    parser.add_argument("--series", type = int, default = 6, help = "One Piece series count")
+    parser.add_argument("--prefetch-rows", type = int, default = 1000, help = "Rows of the --prefetch-database run, compared with the per-setcode run. 0 to skip")
+    parser.add_argument("--cold", action = "store_true", help = "Also run exporter with an empty setcode cache (rate limited requests)")
+    parser.add_argument("--keep", action = "store_true", help = "Keep temporary working folders")
+    parser.add_argument("--json", default = "", help = "Write results to this file")
+    args = parser.parse_args()
+
+    series_ids = list(range(1, args.series + 1))
+    server = MockServer(cards_per_series = max(1, args.cards // max(1, args.series)), series_ids = series_ids).start()
+    results: list[dict[str, any]] = []
+    prefetch_problems: list[str] = None
+    try:
+        for rows in args.rows:
+            for encoding in args.encodings:
+                results += bench_exporter(server, rows, encoding, args.cold, args.keep)
+        if args.prefetch_rows > 0:
+            prefetch_results, prefetch_problems = bench_prefetch(server, args.prefetch_rows, args.keep)
+            results += prefetch_results
+        if args.cards > 0:
+            results += bench_scraper(server, args.keep)
+    finally:
+        server.stop()
+
+    print_results(results)
+    if prefetch_problems is not None:
+        for problem in prefetch_problems:
+            print(f"Prefetch database: FAILED, {problem}")
+        if not prefetch_problems:
+            print("Prefetch database: outputs identical to per-setcode outputs, only setcodes missing from the dump were requested")
+    print(f"Server: {server.stats}")
+    if args.json:
+        with open(args.json, 'w', encoding = 'utf8') as f:
+            json.dump(results, f, indent = 4)
+    if prefetch_problems:
+        sys.exit(1)
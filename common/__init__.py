@@ -0,0 +1 @@
+# Shared components for the scripts in this repository.
@@ -0,0 +1,148 @@
+# Asynchronous, buffered logger shared by the scripts.
+# Log lines are queued and written by a background thread, in batches, through a single
+# open file handle. Log file is rotated once it grows past 'max_bytes'.
+
+# Imports
+import atexit
+import os
+import queue
+import sys
+import threading
+from datetime import datetime
+
+# Log levels
+DEBUG: int = 10
+INFO: int = 20
+WARNING: int = 30
+ERROR: int = 40
+
+class AppLogger:
+    """Log to console and file from a background writer thread."""
+
+    def __init__(self, filepath: str, level: int = INFO, timestamp: bool = True, console: bool = True,
+                 max_bytes: int = 5 * 1024 * 1024, backup_count: int = 3, batch_size: int = 512):
+        self.filepath = filepath
+        self.level = level
+        self.timestamp = timestamp
+        self.console = console
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = max(1, batch_size)
+        self.queue: queue.Queue = queue.Queue()
+        self.file = None
+        self.thread = threading.Thread(target = self.run, name = "applog", daemon = True)
+        self.thread.start()
+
+    def is_enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def log(self, content: str, level: int = INFO):
+        if level < self.level:
+            return
+        if self.timestamp:
+            currentdate: str = datetime.today().strftime('%Y-%m-%d %H:%M:%S')
+            self.queue.put((content, f"[{currentdate}] {content}\n"))
+        else:
+            self.queue.put((content, f"{content}\n"))
+
+    def open(self):
+        if self.file is None:
+            folder = os.path.dirname(self.filepath)
+            if folder:
+                os.makedirs(folder, exist_ok = True)
+            self.file = open(self.filepath, 'a', encoding = 'utf8')
+
+    def rotate(self):
+        # log.log => log.log.1 => log.log.2 ..
+        self.file.close()
+        self.file = None
+        for index in range(self.backup_count - 1, 0, -1):
+            source: str = f"{self.filepath}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.filepath}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.filepath, f"{self.filepath}.1")
+        else:
+            os.remove(self.filepath)
+
+    def write(self, batch: list[tuple[str, str]]):
+        try:
+            if self.console:
+                sys.stdout.write("".join(f"{content}\n" for content, _ in batch))
+                sys.stdout.flush()
+            self.open()
+            self.file.write("".join(line for _, line in batch))
+            self.file.flush()
+            if self.max_bytes > 0 and self.file.tell() >= self.max_bytes:
+                self.rotate()
+        except Exception:
+            # Logging must never break the script
+            pass
+
+    def run(self):
+        is_running: bool = True
+        while is_running:
+            batch: list[tuple[str, str]] = []
+            item = self.queue.get()
+            while True:
+                if item is None:
+                    is_running = False
+                else:
+                    batch.append(item)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self.write(batch)
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def close(self):
+        # Write remaining lines, and stop the writer thread
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+# Shared logger, set by 'setup_logger'
+logger: AppLogger = None
+
+def setup_logger(filepath: str, **kwargs) -> AppLogger:
+    global logger
+    if logger is not None:
+        logger.close()
+    logger = AppLogger(filepath, **kwargs)
+    return logger
+
+def close_logger():
+    global logger
+    if logger is not None:
+        logger.close()
+        logger = None
+
+atexit.register(close_logger)
+
+def clear_logs(folder: str = "logs"):
+    # Delete old log files. Call before 'setup_logger'.
+    if not os.path.isdir(folder):
+        return
+    for item in os.listdir(folder):
+        logfile: str = os.path.join(folder, item)
+        if ".log" in item and os.path.isfile(logfile):
+            os.remove(logfile)
+
+def log(content: str, level: int = INFO):
+    if logger is None:
+        if level >= INFO:
+            print(f"{content}")
+        return
+    logger.log(content, level)
+
+def log_debug(content: str):
+    log(content, DEBUG)
+
+def log_err(content: str, err: Exception):
+    log(f"{content} => {err}", ERROR)
@@ -0,0 +1,263 @@
+# Compact card file shared by the scripts ('.cardpack').
+# Cards are stored by column, with one table of unique strings, and sorted indexes on the card ID and
+# set code. The file is memory-mapped by the reader, so opening it reads only the header, and a lookup
+# decodes only the strings and records it touches.
+#
+# Layout, little-endian, every section aligned to 8 bytes:
+#   magic 'CPAK', u32 version, u32 header length, header (JSON: counts, fields, section offsets)
+#   string offsets: u64 x (strings + 1), string data: utf-8
+#   columns: per field, u32 string number ('s' and 'j' fields) or i64 ('i' fields) per card
+#   indexes: per indexed field, u32 key string numbers (sorted by key), u32 posting starts (keys + 1), u32 card numbers
+
+# Imports
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Iterable
+
+MAGIC: bytes = b"CPAK"
+# Bump when the layout changes
+VERSION: int = 1
+# Missing values
+NO_STRING: int = 0xFFFFFFFF
+NO_INT: int = -2 ** 63
+# Field types. 's' text, 'i' integer, 'j' anything else as JSON text.
+TYPE_CODES: dict[str, str] = { "s": "I", "j": "I", "i": "q" }
+
+def field_type(values: list[any]) -> str:
+    # Type of a column, from the values of the cards that have the field
+    if all(isinstance(x, int) and not isinstance(x, bool) and NO_INT < x < 2 ** 63 for x in values):
+        return "i"
+    if all(isinstance(x, str) for x in values):
+        return "s"
+    return "j"
+
+def little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+def padding(size: int) -> bytes:
+    return b"\0" * (-size % 8)
+
+def write_cardpack(filename: str, cards: list[dict[str, any]], id_field: str, set_field: str = "") -> int:
+    # Write cards to 'filename', indexed on id_field and set_field. Returns file size.
+    # Written to a temporary file first, so readers never see a partial file.
+    fields: list[str] = list(dict.fromkeys(name for card in cards for name in card))
+    types: dict[str, str] = { name: field_type([card[name] for card in cards if name in card]) for name in fields }
+    strings: dict[str, int] = {} # String => string number
+    def string_number(value: str) -> int:
+        number = strings.get(value)
+        if number is None:
+            number = strings[value] = len(strings)
+        return number
+
+    #-- Columns
+    columns: list[array] = []
+    for name in fields:
+        column = array(TYPE_CODES[types[name]])
+        for card in cards:
+            if name not in card:
+                column.append(NO_INT if types[name] == "i" else NO_STRING)
+            elif types[name] == "i":
+                column.append(card[name])
+            elif types[name] == "s":
+                column.append(string_number(card[name]))
+            else:
+                column.append(string_number(json.dumps(card[name], separators = (",", ":"))))
+        columns.append(column)
+
+    #-- Indexes: keys sorted as text, each with the cards that have it
+    index_fields: list[str] = [name for name in dict.fromkeys([id_field, set_field]) if name]
+    indexes: list[tuple[array, array, array]] = []
+    for name in index_fields:
+        postings: dict[str, list[int]] = {}
+        for number, card in enumerate(cards):
+            if name in card:
+                postings.setdefault(str(card[name]), []).append(number)
+        keys, starts, numbers = array("I"), array("I", [0]), array("I")
+        for key in sorted(postings):
+            keys.append(string_number(key))
+            numbers.extend(postings[key])
+            starts.append(len(numbers))
+        indexes.append((keys, starts, numbers))
+
+    #-- String table
+    string_data = bytearray()
+    string_offsets = array("Q", [0])
+    for value in strings:
+        string_data += value.encode('utf8')
+        string_offsets.append(len(string_data))
+
+    #-- Sections, placed after the header
+    sections: list[bytes] = [little_endian(string_offsets), bytes(string_data)]
+    sections += [little_endian(x) for x in columns]
+    sections += [little_endian(x) for index in indexes for x in index]
+    def header_bytes(start: int) -> tuple[bytes, list[int]]:
+        offsets: list[int] = []
+        position = start
+        for section in sections:
+            offsets.append(position)
+            position += len(section) + len(padding(len(section)))
+        header = {
+            "cards": len(cards),
+            "strings": len(strings),
+            "id_field": id_field,
+            "set_field": set_field,
+            "fields": [{ "name": name, "type": types[name], "offset": offsets[2 + i] } for i, name in enumerate(fields)],
+            "indexes": [{ "field": name, "keys": len(index[0]), "offsets": offsets[2 + len(fields) + 3 * i:5 + len(fields) + 3 * i] } for i, (name, index) in enumerate(zip(index_fields, indexes))],
+            "string_offsets": offsets[0],
+            "string_data": offsets[1]
+        }
+        return json.dumps(header, separators = (",", ":")).encode('utf8'), offsets
+    # Offsets are part of the header, so its length is settled first
+    start: int = 0
+    while True:
+        header, offsets = header_bytes(start)
+        header_end = 12 + len(header)
+        if header_end + len(padding(header_end)) == start:
+            break
+        start = header_end + len(padding(header_end))
+
+    with open(filename + ".tmp", 'wb') as file:
+        file.write(MAGIC + struct.pack("<II", VERSION, len(header)) + header)
+        file.write(padding(header_end))
+        for section in sections:
+            file.write(section)
+            file.write(padding(len(section)))
+        size: int = file.tell()
+    os.replace(filename + ".tmp", filename)
+    return size
+
+class CardPack:
+    """Memory-mapped card file, written by write_cardpack. Cards are decoded on access.
+    Use as a context manager, or close() it, to release the file."""
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        with open(filename, 'rb') as file:
+            self.mmap = mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ)
+        try:
+            version, header_length = struct.unpack_from("<II", self.mmap, 4)
+            if self.mmap[:4] != MAGIC or version != VERSION:
+                raise ValueError(f"Not a card pack (version {VERSION}) => {filename}")
+            if sys.byteorder != "little":
+                raise ValueError("Card packs are read on little-endian machines only")
+            self.header: dict[str, any] = json.loads(self.mmap[12:12 + header_length])
+        except Exception:
+            self.mmap.close()
+            raise
+        self.view = memoryview(self.mmap)
+        self.card_count: int = self.header["cards"]
+        self.id_field: str = self.header["id_field"]
+        self.set_field: str = self.header["set_field"]
+        strings: int = self.header["strings"]
+        self.string_offsets = self.section(self.header["string_offsets"], strings + 1, "Q")
+        self.string_data = self.view[self.header["string_data"]:]
+        self.types: dict[str, str] = {}
+        self.columns: dict[str, memoryview] = {}
+        for field in self.header["fields"]:
+            self.types[field["name"]] = field["type"]
+            self.columns[field["name"]] = self.section(field["offset"], self.card_count, TYPE_CODES[field["type"]])
+        self.indexes: dict[str, tuple[memoryview, memoryview, memoryview]] = {}
+        for index in self.header["indexes"]:
+            keys_offset, starts_offset, numbers_offset = index["offsets"]
+            starts = self.section(starts_offset, index["keys"] + 1, "I")
+            self.indexes[index["field"]] = (self.section(keys_offset, index["keys"], "I"), starts, self.section(numbers_offset, starts[-1], "I"))
+
+    def section(self, offset: int, count: int, code: str) -> memoryview:
+        return self.view[offset:offset + count * struct.calcsize(code)].cast(code)
+
+    def __len__(self) -> int:
+        return self.card_count
+
+    def __enter__(self) -> "CardPack":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def fields(self) -> list[str]:
+        return list(self.columns)
+
+    def string(self, number: int) -> str:
+        return str(self.string_data[self.string_offsets[number]:self.string_offsets[number + 1]], 'utf8')
+
+    def is_missing(self, field: str, raw: int) -> bool:
+        return raw == (NO_INT if self.types[field] == "i" else NO_STRING)
+
+    def decode(self, field: str, raw: int) -> any:
+        field_type = self.types[field]
+        if field_type == "i":
+            return raw
+        return self.string(raw) if field_type == "s" else json.loads(self.string(raw))
+
+    def value(self, field: str, number: int) -> any:
+        # Field of card 'number', None if the card has no such field
+        raw = self.columns[field][number]
+        return None if self.is_missing(field, raw) else self.decode(field, raw)
+
+    def card(self, number: int) -> dict[str, any]:
+        # Fields the card was written with
+        card: dict[str, any] = {}
+        for field, column in self.columns.items():
+            raw = column[number]
+            if not self.is_missing(field, raw):
+                card[field] = self.decode(field, raw)
+        return card
+
+    def cards(self, numbers: Iterable[int] = None) -> Iterable[dict[str, any]]:
+        # Cards by number, or all of them, decoded one at a time
+        return map(self.card, range(self.card_count) if numbers is None else numbers)
+
+    def lookup(self, field: str, key: any) -> list[int]:
+        # Numbers of the cards whose 'field' is 'key'. The field must be indexed.
+        # Binary search on the utf-8 bytes of the keys, which sort the same as the strings.
+        keys, starts, numbers = self.indexes[field]
+        key_bytes: bytes = str(key).encode('utf8')
+        string_offsets, data, start = self.string_offsets, self.mmap, self.header["string_data"]
+        low, high = 0, len(keys)
+        while low < high:
+            middle = (low + high) // 2
+            number = keys[middle]
+            if data[start + string_offsets[number]:start + string_offsets[number + 1]] < key_bytes:
+                low = middle + 1
+            else:
+                high = middle
+        if low == len(keys):
+            return []
+        number = keys[low]
+        if data[start + string_offsets[number]:start + string_offsets[number + 1]] != key_bytes:
+            return []
+        return list(numbers[starts[low]:starts[low + 1]])
+
+    def find(self, field: str, key: any) -> list[dict[str, any]]:
+        return list(self.cards(self.lookup(field, key)))
+
+    def get(self, card_id: any) -> dict[str, any]:
+        # Card by ID, None if missing
+        numbers = self.lookup(self.id_field, card_id)
+        return self.card(numbers[0]) if numbers else None
+
+    def find_set(self, setcode: str) -> list[dict[str, any]]:
+        # Cards with the set code
+        return self.find(self.set_field, setcode)
+
+    def close(self):
+        if self.mmap.closed:
+            return
+        # Views into the map have to be released before closing it
+        for index in self.indexes.values():
+            for view in index:
+                view.release()
+        for view in self.columns.values():
+            view.release()
+        self.string_offsets.release()
+        self.string_data.release()
+        self.view.release()
+        self.mmap.close()
@@ -0,0 +1,12 @@
+# Content hashes shared by the scripts.
+
+# Imports
+import hashlib
+
+def hash_file(filename: str) -> str:
+    # Digest of the file contents, read in 1 MB chunks
+    digest = hashlib.blake2b(digest_size = 16)
+    with open(filename, 'rb') as file:
+        for chunk in iter(lambda: file.read(1048576), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
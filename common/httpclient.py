@@ -0,0 +1,301 @@
+# Shared HTTP client for the scripts.
+# Pooled keep-alive connections shared by all worker threads, gzip responses, connect/read timeouts,
+# retries with backoff on 429/5xx and connection errors, and an optional on-disk response cache that
+# honors Cache-Control, Expires, ETag and Last-Modified.
+
+# Imports
+import hashlib
+import json
+import sqlite3
+import threading
+import requests
+from email.utils import parsedate_to_datetime
+from time import perf_counter, sleep, time
+from typing import Callable
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from common.metrics import metrics
+
+# Status codes that are worth retrying
+RETRY_STATUS: tuple[int, ...] = (429, 500, 502, 503, 504)
+# Only these methods are cached, unless a request asks otherwise
+CACHE_METHODS: tuple[str, ...] = ("GET", "HEAD")
+# Not kept with cached responses, the body is stored decoded
+SKIP_HEADERS: tuple[str, ...] = ("content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive")
+
+def parse_cache_control(value: str) -> dict[str, str]:
+    # 'max-age=60, no-cache' => {"max-age": "60", "no-cache": ""}
+    directives: dict[str, str] = {}
+    for part in value.split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip().strip('"')
+    return directives
+
+def parse_http_date(value: str) -> float:
+    # Timestamp of an HTTP date, or 0 if invalid
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return 0.0
+
+def freshness_lifetime(headers: CaseInsensitiveDict) -> float:
+    # Seconds a response can be reused without revalidating, from max-age or Expires
+    directives = parse_cache_control(headers.get("Cache-Control", ""))
+    if "no-cache" in directives or "no-store" in directives:
+        return 0.0
+    try:
+        age = float(headers.get("Age", 0))
+    except ValueError:
+        age = 0.0
+    if "max-age" in directives:
+        try:
+            return max(0.0, float(directives["max-age"]) - age)
+        except ValueError:
+            return 0.0
+    if "Expires" in headers:
+        date = parse_http_date(headers.get("Date", "")) or time()
+        return max(0.0, parse_http_date(headers["Expires"]) - date - age)
+    return 0.0
+
+def is_storable(headers: CaseInsensitiveDict) -> bool:
+    # Worth storing if it is either fresh for a while, or can be revalidated
+    if "no-store" in parse_cache_control(headers.get("Cache-Control", "")):
+        return False
+    return freshness_lifetime(headers) > 0 or "ETag" in headers or "Last-Modified" in headers
+
+class CachedResponse:
+    """Response stored in the cache."""
+
+    def __init__(self, key: str, url: str, status_code: int, headers: dict[str, str], body: bytes, expires_at: float):
+        self.key = key
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.body = body
+        self.expires_at = expires_at
+
+    def is_fresh(self) -> bool:
+        return time() < self.expires_at
+
+    def to_response(self) -> requests.Response:
+        response = requests.Response()
+        response.status_code = self.status_code
+        response.headers = CaseInsensitiveDict(self.headers)
+        response._content = self.body
+        response.url = self.url
+        response.encoding = requests.utils.get_encoding_from_headers(response.headers)
+        response.from_cache = True
+        return response
+
+class ResponseCache:
+    """Responses on disk in one SQLite file. Least recently used responses are evicted once the bodies exceed max_bytes."""
+
+    def __init__(self, filename: str, max_bytes: int = 64 * 1024 * 1024):
+        self.filename = filename
+        self.max_bytes = max(0, int(max_bytes))
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(filename, check_same_thread = False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_used_at ON responses (used_at);
+        """)
+        self.total_bytes: int = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> CachedResponse:
+        # Returns None if missing. Marks the response as used.
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT url, status, headers, body, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            with self.connection:
+                self.connection.execute("UPDATE responses SET used_at = ? WHERE key = ?", (time(), key))
+        return CachedResponse(key, row[0], row[1], json.loads(row[2]), row[3], row[4])
+
+    def put(self, key: str, url: str, status_code: int, headers: CaseInsensitiveDict, body: bytes, expires_at: float) -> bool:
+        # Returns False if the body alone is over the size limit
+        size = len(body)
+        if size > self.max_bytes:
+            return False
+        stored_headers = { name: value for name, value in headers.items() if name.lower() not in SKIP_HEADERS }
+        with self.lock:
+            with self.connection:
+                row = self.connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO responses (key, url, status, headers, body, size, expires_at, used_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, url, status_code, json.dumps(stored_headers), body, size, expires_at, time())
+                )
+                self.total_bytes += size - (row[0] if row else 0)
+            self.evict()
+        return True
+
+    def refresh(self, key: str, headers: CaseInsensitiveDict, expires_at: float):
+        # Revalidated (304) response: keep the body, take new validators and freshness
+        with self.lock:
+            row = self.connection.execute("SELECT headers FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+            stored_headers = CaseInsensitiveDict(json.loads(row[0]))
+            for name in ("Cache-Control", "Expires", "Date", "ETag", "Last-Modified"):
+                if name in headers:
+                    stored_headers[name] = headers[name]
+            with self.connection:
+                self.connection.execute(
+                    "UPDATE responses SET headers = ?, expires_at = ?, used_at = ? WHERE key = ?",
+                    (json.dumps(dict(stored_headers)), expires_at, time(), key)
+                )
+
+    def evict(self) -> int:
+        # Delete least recently used responses until under the size limit. Caller holds the lock.
+        if self.total_bytes <= self.max_bytes:
+            return 0
+        evicted: list[str] = []
+        for key, size in self.connection.execute("SELECT key, size FROM responses ORDER BY used_at"):
+            if self.total_bytes <= self.max_bytes:
+                break
+            evicted.append(key)
+            self.total_bytes -= size
+        with self.connection:
+            self.connection.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in evicted])
+        metrics.count("http_cache.evicted", len(evicted))
+        return len(evicted)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+class HttpClient:
+    """Pooled HTTP client, safe to use from several threads.
+    Each thread gets its own session (sessions are not thread-safe), all sharing one connection pool."""
+
+    def __init__(self, pool_maxsize: int = 8, connect_timeout: float = 10.0, read_timeout: float = 60.0,
+                 cache: ResponseCache = None, headers: dict[str, str] = None, max_retry_delay: float = 30.0):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retry_delay = max_retry_delay # Cap on backoff and Retry-After, in seconds
+        self.cache = cache
+        self.headers: dict[str, str] = { "Accept-Encoding": "gzip, deflate", **(headers or {}) }
+        # Connections are kept alive, up to pool_maxsize per host
+        self.adapter = HTTPAdapter(pool_connections = 4, pool_maxsize = max(1, int(pool_maxsize)))
+        self.local = threading.local()
+
+    def session(self) -> requests.Session:
+        if not hasattr(self.local, "session"):
+            session = requests.Session()
+            session.headers.update(self.headers)
+            session.mount("http://", self.adapter)
+            session.mount("https://", self.adapter)
+            self.local.session = session
+        return self.local.session
+
+    def timeouts(self, timeout: any = None) -> tuple[float, float]:
+        # A single number is the read timeout
+        if timeout is None:
+            return self.connect_timeout, self.read_timeout
+        if isinstance(timeout, tuple):
+            return timeout
+        return self.connect_timeout, float(timeout)
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(self, method: str, url: str, headers: dict[str, str] = None, timeout: any = None, is_cached: bool = None, **kwargs) -> requests.Response:
+        # Same arguments as requests. Responses are cached for CACHE_METHODS, or if is_cached is set.
+        # Streamed responses, and requests with their own conditional headers, bypass the cache.
+        method = method.upper()
+        headers = CaseInsensitiveDict(headers or {})
+        timeout = self.timeouts(timeout)
+        is_conditional = "If-None-Match" in headers or "If-Modified-Since" in headers
+        if is_cached is None:
+            is_cached = method in CACHE_METHODS
+        if self.cache is None or not is_cached or is_conditional or kwargs.get("stream"):
+            return self.send(method, url, headers, timeout, **kwargs)
+
+        # Key on the final url and body, so query params and json bodies are part of it
+        prepared = requests.Request(method, url, params = kwargs.get("params"), data = kwargs.get("data"), json = kwargs.get("json")).prepare()
+        body = prepared.body.encode('utf8') if isinstance(prepared.body, str) else (prepared.body or b"")
+        key = hashlib.sha256(method.encode() + b" " + prepared.url.encode('utf8') + b"\n" + body).hexdigest()
+        cached = self.cache.get(key)
+        if cached is not None:
+            if cached.is_fresh():
+                metrics.cache("http_cache", True)
+                return cached.to_response()
+            if "ETag" in cached.headers:
+                headers["If-None-Match"] = cached.headers["ETag"]
+            if "Last-Modified" in cached.headers:
+                headers["If-Modified-Since"] = cached.headers["Last-Modified"]
+
+        response = self.send(method, url, headers, timeout, **kwargs)
+        if response.status_code == 304 and cached is not None:
+            metrics.cache("http_cache", True)
+            metrics.count("http_cache.revalidated")
+            self.cache.refresh(key, response.headers, time() + freshness_lifetime(response.headers))
+            return (self.cache.get(key) or cached).to_response()
+        metrics.cache("http_cache", False)
+        if response.status_code == 200 and is_storable(response.headers):
+            self.cache.put(key, response.url, response.status_code, response.headers, response.content, time() + freshness_lifetime(response.headers))
+        return response
+
+    def retry_delay(self, attempt: int, backoff: float, response: requests.Response = None) -> float:
+        # Seconds before retrying: Retry-After (seconds or HTTP date) if the server sent one, else exponential backoff.
+        # Capped, so one bad header cannot stall a worker.
+        delay: float = backoff * (2 ** attempt)
+        retry_after: str = response.headers.get("Retry-After", "").strip() if response is not None else ""
+        if retry_after.isdigit():
+            delay = float(retry_after)
+        elif retry_after:
+            retry_at = parse_http_date(retry_after)
+            if retry_at > 0:
+                delay = max(0.0, retry_at - time())
+        return min(delay, self.max_retry_delay)
+
+    def request_with_retries(self, method: str, url: str, retries: int = 3, backoff: float = 0.5, wait: Callable[[], None] = None,
+                             metric: str = "", **kwargs) -> requests.Response:
+        # Same arguments as request. Retries RETRY_STATUS responses and connection errors, up to 'retries' times.
+        # 'wait' is called before every attempt (rate limit, politeness delay). 'metric' names the latency and retry metrics.
+        # Returns the response of the last attempt, or raises its error.
+        for attempt in range(retries + 1):
+            if wait is not None:
+                wait()
+            response: requests.Response = None
+            try:
+                started = perf_counter()
+                response = self.request(method, url, **kwargs)
+                if metric:
+                    metrics.observe(metric, perf_counter() - started)
+                if response.status_code not in RETRY_STATUS or attempt == retries:
+                    return response
+            except requests.RequestException:
+                if attempt == retries:
+                    raise
+            if metric:
+                metrics.count(f"{metric}.retry")
+            sleep(self.retry_delay(attempt, backoff, response))
+
+    def send(self, method: str, url: str, headers: CaseInsensitiveDict, timeout: tuple[float, float], **kwargs) -> requests.Response:
+        response = self.session().request(method, url, headers = headers, timeout = timeout, **kwargs)
+        response.from_cache = False
+        return response
+
+    def close(self):
+        self.adapter.close()
+        if self.cache is not None:
+            self.cache.close()
@@ -0,0 +1,186 @@
+# Card image mirror shared by the scripts.
+# Downloads image urls concurrently over a pooled client into content-addressed files, so identical
+# images are stored once. A manifest lets interrupted runs resume, and known images are revalidated
+# with conditional requests. Thumbnails are optional (needs Pillow), and made in a process pool.
+
+# Imports
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urlparse
+from common.httpclient import HttpClient
+from common.metrics import metrics
+
+# Bump when the manifest layout changes
+MANIFEST_VERSION: int = 1
+
+def is_pillow_available() -> bool:
+    try:
+        import PIL
+        return True
+    except ImportError:
+        return False
+
+def make_thumbnail(task: tuple[str, str, int]) -> bool:
+    # Shrink 'source' to fit in size x size, keeping aspect ratio. Runs in a worker process.
+    source, target, size = task
+    from PIL import Image
+    try:
+        with Image.open(source) as image:
+            image.thumbnail((size, size))
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.save(target + ".tmp", "JPEG", quality = 85)
+        os.replace(target + ".tmp", target)
+        return True
+    except OSError:
+        return False
+
+class ImageMirror:
+    """Mirror image urls into 'folder/objects/<ab>/<sha256><ext>'.
+    'folder/manifest.json' maps each url to its object file, ETag and Last-Modified."""
+
+    def __init__(self, folder: str, client: HttpClient = None, max_workers: int = 8, is_revalidate: bool = True,
+                 thumbnail_size: int = 0, thumbnail_workers: int = 0, save_every: int = 100):
+        self.folder = folder
+        self.max_workers = max(1, int(max_workers))
+        self.is_own_client = client is None
+        self.client = HttpClient(pool_maxsize = self.max_workers) if client is None else client
+        self.is_revalidate = is_revalidate # False to trust the manifest, without any request for known images
+        self.thumbnail_size = thumbnail_size # Longest side in pixels, 0 for no thumbnails
+        self.thumbnail_workers = thumbnail_workers # 0 for one per CPU
+        self.save_every = max(1, save_every) # Save the manifest after this many downloads, for resuming
+        self.filename = os.path.join(folder, "manifest.json")
+        self.lock = threading.Lock()
+        self.manifest: dict[str, dict] = {}
+        self.unsaved: int = 0
+
+    def load_manifest(self):
+        try:
+            with open(self.filename, encoding = 'utf8') as file:
+                contents = json.load(file)
+            if contents.get("version") == MANIFEST_VERSION:
+                self.manifest = contents["images"]
+        except (OSError, ValueError, KeyError):
+            self.manifest = {}
+
+    def save_manifest(self):
+        # Caller holds the lock. Written to a temporary file first, so an interrupted run leaves the old manifest.
+        with open(self.filename + ".tmp", 'w', encoding = 'utf8') as file:
+            json.dump({ "version": MANIFEST_VERSION, "images": self.manifest }, file, indent = 1)
+        os.replace(self.filename + ".tmp", self.filename)
+        self.unsaved = 0
+
+    def object_path(self, digest: str, extension: str) -> str:
+        # Relative to the mirror folder
+        return os.path.join("objects", digest[:2], digest + extension)
+
+    def thumbnail_path(self, digest: str) -> str:
+        return os.path.join("thumbnails", digest[:2], f"{digest}_{self.thumbnail_size}.jpg")
+
+    def fetch(self, url: str) -> str:
+        # Download one image. Returns 'downloaded', 'deduplicated', 'not_modified', 'kept' or 'failed'.
+        with self.lock:
+            entry = self.manifest.get(url)
+        headers: dict[str, str] = {}
+        if entry is not None and os.path.exists(os.path.join(self.folder, entry["path"])):
+            if not self.is_revalidate:
+                return "kept"
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        # Partial download, named after the url. Restarted if a run was interrupted.
+        partial_file: str = os.path.join(self.folder, "partial", hashlib.sha256(url.encode('utf8')).hexdigest())
+        digest = hashlib.sha256()
+        size: int = 0
+        try:
+            with self.client.get(url, headers = headers, stream = True) as response:
+                if response.status_code != 200:
+                    response.content # Read the (empty) body, so the connection goes back to the pool
+                    if response.status_code == 304:
+                        return "not_modified"
+                    metrics.count(f"images.status_{response.status_code}")
+                    return "failed"
+                with open(partial_file, 'wb') as file:
+                    for chunk in response.iter_content(chunk_size = 65536):
+                        digest.update(chunk)
+                        file.write(chunk)
+                        size += len(chunk)
+                etag: str = response.headers.get("ETag", "")
+                last_modified: str = response.headers.get("Last-Modified", "")
+        except Exception:
+            metrics.count("images.error")
+            if os.path.exists(partial_file):
+                os.remove(partial_file)
+            return "failed"
+
+        extension: str = os.path.splitext(urlparse(url).path)[1].lower() or ".img"
+        path = self.object_path(digest.hexdigest(), extension)
+        target_file: str = os.path.join(self.folder, path)
+        status: str = "downloaded"
+        if os.path.exists(target_file):
+            os.remove(partial_file)
+            status = "deduplicated"
+        else:
+            os.makedirs(os.path.dirname(target_file), exist_ok = True)
+            os.replace(partial_file, target_file)
+            metrics.count("images.bytes", size)
+
+        with self.lock:
+            self.manifest[url] = { "path": path, "etag": etag, "last_modified": last_modified, "size": size }
+            self.unsaved += 1
+            if self.unsaved >= self.save_every:
+                self.save_manifest()
+        return status
+
+    def make_thumbnails(self, urls: list[str]) -> int:
+        # Thumbnail of every mirrored image that has none yet. Returns number of thumbnails made.
+        pending: dict[str, tuple[str, str, int]] = {} # Target file => task. Duplicate images share a thumbnail.
+        for url in urls:
+            entry = self.manifest.get(url)
+            if entry is None:
+                continue
+            digest = os.path.splitext(os.path.basename(entry["path"]))[0]
+            entry["thumbnail"] = self.thumbnail_path(digest)
+            target_file: str = os.path.join(self.folder, entry["thumbnail"])
+            if target_file not in pending and not os.path.exists(target_file):
+                os.makedirs(os.path.dirname(target_file), exist_ok = True)
+                pending[target_file] = (os.path.join(self.folder, entry["path"]), target_file, self.thumbnail_size)
+        tasks: list[tuple[str, str, int]] = list(pending.values())
+        if not tasks:
+            return 0
+        workers: int = self.thumbnail_workers or os.cpu_count() or 1
+        if workers <= 1 or len(tasks) == 1:
+            return sum(map(make_thumbnail, tasks))
+        with ProcessPoolExecutor(max_workers = workers) as pool:
+            return sum(pool.map(make_thumbnail, tasks, chunksize = max(1, len(tasks) // (workers * 4))))
+
+    def mirror(self, urls: list[str]) -> dict[str, int]:
+        # Mirror every url, returns counts per outcome
+        unique_urls: list[str] = [x for x in dict.fromkeys(urls) if x]
+        os.makedirs(os.path.join(self.folder, "partial"), exist_ok = True)
+        self.load_manifest()
+        with ThreadPoolExecutor(max_workers = self.max_workers, thread_name_prefix = "image") as pool:
+            counts = Counter(pool.map(self.fetch, unique_urls))
+        for status, value in counts.items():
+            metrics.count(f"images.{status}", value)
+
+        result: dict[str, int] = { x: counts.get(x, 0) for x in ["downloaded", "deduplicated", "not_modified", "kept", "failed"] }
+        if self.thumbnail_size > 0:
+            if is_pillow_available():
+                with metrics.stage("image_thumbnails"):
+                    result["thumbnails"] = self.make_thumbnails(unique_urls)
+            else:
+                metrics.count("images.thumbnails_skipped")
+        with self.lock:
+            self.save_manifest()
+        return result
+
+    def close(self):
+        if self.is_own_client:
+            self.client.close()
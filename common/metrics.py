@@ -0,0 +1,142 @@
+# Lightweight run instrumentation shared by the scripts.
+# Stage timers, counters, cache hit/miss ratios and latency histograms,
+# with a summary table and an optional machine-readable dump.
+
+# Imports
+import json
+import os
+import random
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS: tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# Latency samples kept per name for percentiles. Past that, a uniform random sample of all of them is kept (reservoir sampling),
+# so a long-running process uses the same memory, and the same time per summary, however many requests it serves.
+RESERVOIR_SIZE: int = 1024
+
+class Metrics:
+    """Thread-safe collection of stage timings, counters and latency histograms."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = perf_counter()
+        self.stages: dict[str, dict[str, float]] = {}
+        self.counters: dict[str, int] = {}
+        self.histograms: dict[str, list[int]] = {}
+        self.latencies: dict[str, dict[str, any]] = {} # Name => count, total, max and reservoir of samples
+        self.random = random.Random(0)
+
+    def reset(self):
+        with self.lock:
+            self.started = perf_counter()
+            self.stages.clear()
+            self.counters.clear()
+            self.histograms.clear()
+            self.latencies.clear()
+
+    def add_time(self, name: str, seconds: float, items: int = 0):
+        with self.lock:
+            stage = self.stages.setdefault(name, { "calls": 0, "seconds": 0.0, "items": 0 })
+            stage["calls"] += 1
+            stage["seconds"] += seconds
+            stage["items"] += items
+
+    @contextmanager
+    def stage(self, name: str, items: int = 0):
+        # with metrics.stage("csv_parse"): ...
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, perf_counter() - start, items)
+
+    def count(self, name: str, value: int = 1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def stage_calls(self, name: str) -> int:
+        with self.lock:
+            return self.stages.get(name, {}).get("calls", 0)
+
+    def cache(self, name: str, is_hit: bool, value: int = 1):
+        self.count(f"{name}.{'hit' if is_hit else 'miss'}", value)
+
+    def cache_ratio(self, name: str) -> float:
+        hits = self.counters.get(f"{name}.hit", 0)
+        total = hits + self.counters.get(f"{name}.miss", 0)
+        return hits / total if total > 0 else 0.0
+
+    def observe(self, name: str, seconds: float):
+        # Record a latency sample
+        with self.lock:
+            buckets = self.histograms.setdefault(name, [0] * (len(LATENCY_BUCKETS) + 1))
+            index = next((i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound), len(LATENCY_BUCKETS))
+            buckets[index] += 1
+            latency = self.latencies.setdefault(name, { "count": 0, "total": 0.0, "max": 0.0, "samples": [] })
+            latency["count"] += 1
+            latency["total"] += seconds
+            latency["max"] = max(latency["max"], seconds)
+            samples: list[float] = latency["samples"]
+            if len(samples) < RESERVOIR_SIZE:
+                samples.append(seconds)
+            else:
+                slot = self.random.randrange(latency["count"])
+                if slot < RESERVOIR_SIZE:
+                    samples[slot] = seconds
+
+    def to_dict(self) -> dict[str, any]:
+        with self.lock:
+            caches = sorted({ x.rsplit(".", 1)[0] for x in self.counters if x.endswith((".hit", ".miss")) })
+            latencies: dict[str, any] = {}
+            for name, latency in self.latencies.items():
+                # Percentiles from the reservoir, exact count, mean and max
+                ordered = sorted(latency["samples"])
+                latencies[name] = {
+                    "count": latency["count"],
+                    "mean": latency["total"] / latency["count"],
+                    "p50": ordered[len(ordered) // 2],
+                    "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                    "max": latency["max"],
+                    "buckets": dict(zip([f"<={x}" for x in LATENCY_BUCKETS] + ["inf"], self.histograms[name]))
+                }
+            return {
+                "timestamp": datetime.now().isoformat(timespec = 'seconds'),
+                "wall_seconds": perf_counter() - self.started,
+                "stages": { name: dict(stage) for name, stage in self.stages.items() },
+                "counters": dict(self.counters),
+                "cache_hit_ratio": { name: self.cache_ratio(name) for name in caches },
+                "latency": latencies
+            }
+
+    def summary(self) -> str:
+        data = self.to_dict()
+        lines: list[str] = [f"{'Stage':<24} {'Calls':>7} {'Seconds':>10} {'Items':>9} {'Items/s':>11}"]
+        for name, stage in data["stages"].items():
+            rate = stage["items"] / stage["seconds"] if stage["items"] and stage["seconds"] > 0 else 0
+            lines.append(f"{name:<24} {stage['calls']:>7} {stage['seconds']:>10.3f} {stage['items']:>9} {rate:>11.1f}")
+        for name, value in data["counters"].items():
+            lines.append(f"{name:<24} {value:>7}")
+        for name, ratio in data["cache_hit_ratio"].items():
+            lines.append(f"{name + ' hit ratio':<24} {ratio:>7.1%}")
+        for name, latency in data["latency"].items():
+            lines.append(f"{name + ' latency':<24} n={latency['count']} mean={latency['mean']:.3f}s p50={latency['p50']:.3f}s p95={latency['p95']:.3f}s max={latency['max']:.3f}s")
+        lines.append(f"{'Total':<24} {'':>7} {data['wall_seconds']:>10.3f}")
+        return "\n".join(lines)
+
+    def write_json(self, filename: str):
+        # '.jsonl' files get one line appended per run, for trends across runs. Others are overwritten.
+        folder = os.path.dirname(filename)
+        if folder:
+            os.makedirs(folder, exist_ok = True)
+        if filename.endswith(".jsonl"):
+            with open(filename, 'a', encoding = 'utf8') as f:
+                f.write(json.dumps(self.to_dict(), separators = (",", ":")) + "\n")
+        else:
+            with open(filename, 'w', encoding = 'utf8') as f:
+                json.dump(self.to_dict(), f, indent = 4)
+
+# Shared metrics for the current run
+metrics: Metrics = Metrics()